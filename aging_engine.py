@@ -0,0 +1,173 @@
+"""
+Portfolio-at-risk (PAR) aging engine.
+
+Once a day (`python db_admin.py aging`) every loan being repaid is aged
+against its installment schedule:
+
+  * arrears          - installments due so far minus everything paid
+  * days past due    - days since the oldest installment that is not yet covered
+  * aging bucket     - Current, 1-30, 31-60, 61-90 or 90+ days past due
+
+Schedules for the whole book come back from MongoDB grouped per loan in one
+aggregation. The per-loan figures are then computed with NumPy over flat
+arrays, and the results are written back to the loans with a single
+bulk_write. The Reports screen and the PDF report read the bucket totals
+stored on the loans.
+"""
+import datetime
+from itertools import chain
+
+import numpy as np
+from pymongo import UpdateOne
+
+import database
+
+# Upper day limits of the buckets below; anything past the last one is 90+
+AGING_EDGES = [0, 30, 60, 90]
+AGING_BUCKETS = ['Current', '1-30', '31-60', '61-90', '90+']
+# (ratio, index of the first bucket it counts): PAR30 is the outstanding
+# balance of loans more than 30 days past due
+PAR_RATIOS = [('PAR1', 1), ('PAR30', 2), ('PAR60', 3), ('PAR90', 4)]
+
+# Payments within this many RWF of an installment count as covering it
+COVER_TOLERANCE = 0.005
+
+LOAN_PROJECTION = {'total_paid': 1, 'remaining_balance': 1, 'next_payment': 1,
+                   'days_past_due': 1, 'arrears_amount': 1, 'aging_bucket': 1}
+
+
+def compute_aging(as_of, total_paid, counts, due, amount, next_payment):
+    """
+    Vectorized core, one entry per loan in total_paid, counts and next_payment.
+
+    counts[i] installments of loan i have fallen due by as_of; their due dates
+    (datetime64[D]) and amounts are in due and amount, loan by loan in
+    installment order. Loans without a schedule (counts 0) are aged from
+    next_payment instead (NaT when there is none). Returns (days_past_due,
+    arrears, bucket_index) arrays.
+    """
+    as_of = np.datetime64(as_of, 'D')
+    paid = np.asarray(total_paid, dtype=float)
+    counts = np.asarray(counts, dtype=np.int64)
+    due = np.asarray(due, dtype='datetime64[D]')
+    amount = np.asarray(amount, dtype=float)
+    next_payment = np.asarray(next_payment, dtype='datetime64[D]')
+
+    days_past_due = np.zeros(counts.size, dtype=np.int64)
+    arrears = np.zeros(counts.size, dtype=float)
+
+    scheduled = np.flatnonzero(counts > 0)
+    if scheduled.size:
+        n = counts[scheduled]
+        first = np.concatenate(([0], np.cumsum(n)[:-1]))
+        last = first + n - 1
+        loan = np.repeat(np.arange(n.size), n)
+
+        # Amount due up to and including each installment, per loan
+        running = np.cumsum(amount)
+        due_so_far = running - (running[first] - amount[first])[loan]
+        loan_paid = paid[scheduled]
+        arrears[scheduled] = np.maximum(due_so_far[last] - loan_paid, 0.0)
+
+        # Oldest installment the payments do not cover yet
+        uncovered = due_so_far > loan_paid[loan] + COVER_TOLERANCE
+        position = np.where(uncovered, np.arange(due.size), due.size)
+        oldest = np.minimum.reduceat(position, first)
+        late = oldest < due.size
+        days_past_due[scheduled[late]] = (as_of - due[oldest[late]]).astype(np.int64)
+
+    # Loans approved before schedules existed: fall back to their next payment date
+    unscheduled = (counts == 0) & ~np.isnat(next_payment)
+    overdue = np.where(unscheduled, (as_of - next_payment).astype(np.int64), 0)
+    days_past_due = np.where(unscheduled & (overdue > 0), overdue, days_past_due)
+
+    bucket = np.searchsorted(AGING_EDGES, days_past_due, side='left')
+    return days_past_due, arrears, bucket
+
+
+def _load_book(as_of):
+    """Active loans and the installments they owe by as_of, as arrays for compute_aging()."""
+    db = database.db
+    loans = list(db['loans'].find({'status': {'$in': database.REPAYING_STATUSES},
+                                   'is_deleted': database.NOT_DELETED}, LOAN_PROJECTION))
+    position = {loan['_id']: i for i, loan in enumerate(loans)}
+
+    # One document per loan; dates come back as epoch milliseconds for a cheap conversion
+    pipeline = [
+        {'$match': {'due_date': {'$lte': as_of}}},
+        {'$group': {
+            '_id': '$loan_id',
+            'number': {'$push': '$number'},
+            'due': {'$push': {'$toLong': '$due_date'}},
+            'amount': {'$push': '$amount'},
+        }},
+    ]
+    schedules = [row for row in db[database.INSTALLMENT_COLLECTION].aggregate(pipeline, allowDiskUse=True)
+                 if row['_id'] in position]
+
+    counts = np.zeros(len(loans), dtype=np.int64)
+    owner = np.array([position[row['_id']] for row in schedules], dtype=np.int64)
+    sizes = np.array([len(row['number']) for row in schedules], dtype=np.int64)
+    counts[owner] = sizes
+    number = np.fromiter(chain.from_iterable(row['number'] for row in schedules), dtype=np.int64, count=sizes.sum())
+    due = np.fromiter(chain.from_iterable(row['due'] for row in schedules), dtype=np.int64, count=sizes.sum())
+    amount = np.fromiter(chain.from_iterable(row['amount'] for row in schedules), dtype=float, count=sizes.sum())
+
+    # Reorder to loan order (as in `loans`), installments ascending within each loan
+    order = np.lexsort((number, np.repeat(owner, sizes)))
+    due = due[order].astype('datetime64[ms]').astype('datetime64[D]')
+    amount = amount[order]
+
+    total_paid = np.fromiter((float(loan.get('total_paid') or 0) for loan in loans), dtype=float, count=len(loans))
+    next_payment = np.array([loan['next_payment'] if isinstance(loan.get('next_payment'), datetime.datetime) else None
+                             for loan in loans], dtype='datetime64[D]')
+    return loans, total_paid, counts, due, amount, next_payment
+
+
+def run_aging(as_of=None):
+    """
+    Ages every active loan as of as_of (default today) and stores
+    days_past_due, arrears_amount and aging_bucket on the loans. Returns
+    (loans aged, loans whose figures changed).
+    """
+    as_of = as_of or datetime.datetime.combine(datetime.date.today(), datetime.time())
+    loans, total_paid, counts, due, amount, next_payment = _load_book(as_of)
+    days_past_due, arrears, bucket = compute_aging(as_of, total_paid, counts, due, amount, next_payment)
+
+    ops = []
+    for loan, days, owed, index in zip(loans, days_past_due.tolist(), np.round(arrears, 2).tolist(), bucket.tolist()):
+        label = AGING_BUCKETS[index]
+        if (loan.get('days_past_due'), loan.get('arrears_amount'), loan.get('aging_bucket')) == (days, owed, label):
+            continue
+        ops.append(UpdateOne({'_id': loan['_id']}, {'$set': {
+            'days_past_due': days, 'arrears_amount': owed, 'aging_bucket': label}}))
+    if ops:
+        database.db['loans'].bulk_write(ops, ordered=False)
+        database.loan_cache.invalidate()
+    database.record_job_run('aging', as_of=as_of, loans=len(loans))
+    return len(loans), len(ops)
+
+
+def aging_report():
+    """
+    Bucket and PAR totals from the figures stored by the last run_aging():
+    {'buckets': [(bucket, loans, outstanding, arrears)], 'par': [(name, amount, share)],
+     'outstanding': total, 'as_of': date of the last run or None}.
+    """
+    rows = {row['_id']: row for row in database.get_aging_totals()}
+    # Loans approved since the last run have no bucket yet; nothing is due on them
+    unaged = rows.pop(None, {})
+    current = rows.setdefault(AGING_BUCKETS[0], {})
+    for key in ('loans', 'outstanding'):
+        current[key] = current.get(key, 0) + unaged.get(key, 0)
+
+    buckets = [(label, rows.get(label, {}).get('loans', 0), rows.get(label, {}).get('outstanding', 0.0),
+                rows.get(label, {}).get('arrears', 0.0)) for label in AGING_BUCKETS]
+
+    total = sum(b[2] for b in buckets)
+    par = []
+    for name, start in PAR_RATIOS:
+        at_risk = sum(b[2] for b in buckets[start:])
+        par.append((name, at_risk, at_risk / total if total else 0.0))
+    last_run = database.get_job_run('aging') or {}
+    return {'buckets': buckets, 'par': par, 'outstanding': total, 'as_of': last_run.get('as_of')}
@@ -0,0 +1,228 @@
+"""
+Word loan agreements: pre-sized images, the document layout and batch rendering.
+
+Images are downscaled to the size they are printed at (PRINT_DPI) and
+recompressed before python-docx embeds them, instead of embedding the 2 MB
+logo and full-resolution camera photos in every file. Prepared images are
+cached in ASSET_CACHE_DIR, keyed like the photo thumbnails, so a photo or the
+logo is only resized once.
+
+Batch mode renders agreements for many loans from a prebuilt template (the
+document with the logo and heading already laid out) in a process pool:
+
+    python db_admin.py agreements --out agreements              # every approved loan
+    python db_admin.py agreements --out agreements <loan_id>...
+"""
+import datetime
+import functools
+import io
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from docx import Document
+from docx.shared import Pt, Inches
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from PIL import Image, ImageOps
+
+import database
+import schedule_engine
+import thumbnails
+
+LOGO_PATH = "bu logo.png"
+LOGO_WIDTH_IN = 1.2
+PHOTO_WIDTH_IN = 3.5
+# Resolution images are resized to; plenty for office printers
+PRINT_DPI = 200
+JPEG_QUALITY = 85
+
+ASSET_CACHE_DIR = "print_assets"
+ASSET_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+
+def prepare_image(path, width_in, cache_dir=ASSET_CACHE_DIR):
+    """
+    Returns the path of a copy of `path` resized to width_in inches at
+    PRINT_DPI: a JPEG for photos, a PNG when the image has transparency.
+    Images that are already small enough are still recompressed once.
+    """
+    width_px = int(width_in * PRINT_DPI)
+    box = (width_px, width_px * 3)
+    key = thumbnails.cache_key(path, box)
+    for ext in (".jpg", ".png"):
+        cached = os.path.join(cache_dir, key + ext)
+        if os.path.exists(cached):
+            os.utime(cached)
+            return cached
+
+    img = Image.open(path)
+    img.draft('RGB', box)
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail(box, Image.LANCZOS)
+    has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = os.path.join(cache_dir, key + (".png" if has_alpha else ".jpg"))
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=cache_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if has_alpha:
+                img.convert('RGBA').save(f, format='PNG', optimize=True, dpi=(PRINT_DPI, PRINT_DPI))
+            else:
+                img.convert('RGB').save(f, format='JPEG', quality=JPEG_QUALITY, optimize=True,
+                                        dpi=(PRINT_DPI, PRINT_DPI))
+        os.replace(tmp, cached)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    thumbnails.evict(cache_dir, ASSET_CACHE_MAX_BYTES)
+    return cached
+
+
+@functools.lru_cache(maxsize=1)
+def build_template():
+    """The part shared by every agreement (logo and title), as .docx bytes. Built once per process."""
+    doc = Document()
+    try:
+        doc.add_picture(prepare_image(LOGO_PATH, LOGO_WIDTH_IN), width=Inches(LOGO_WIDTH_IN))
+        doc.paragraphs[-1].alignment = WD_ALIGN_PARAGRAPH.CENTER
+    except Exception: pass
+
+    title = doc.add_paragraph()
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    run = title.add_run("OFFICIAL LOAN APPLICATION FORM")
+    run.bold = True
+    run.font.size = Pt(20)
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def application_from_loan(loan):
+    """The fields render_application() needs, taken from a stored loan document."""
+    rate = loan.get('interest_rate')
+    rate = schedule_engine.DEFAULT_ANNUAL_RATE if rate in (None, '') else rate
+    return {
+        'app_id': loan.get('loan_id') or str(loan['_id']),
+        'date': database.format_date(loan.get('application_date'), datetime.date.today().strftime('%Y-%m-%d')),
+        'customer_name': loan.get('customer_name', ''),
+        'nin_number': loan.get('nin_number', ''),
+        'loan_amount': f"{float(loan.get('loan_amount') or 0):,.0f}",
+        'loan_type': loan.get('loan_type', ''),
+        'duration': loan.get('duration', ''),
+        'collateral': loan.get('collateral', ''),
+        'payment_plan': loan.get('payment_plan', ''),
+        'interest': f"{float(rate):g}% Per Annum ({loan.get('interest_method') or schedule_engine.INTEREST_FLAT})",
+        'total_repayment': f"{float(loan.get('return_amount') or 0):,.2f} RWF",
+        'purpose': loan.get('purpose', ''),
+        'photos': list(loan.get('security_photos') or []),
+    }
+
+
+def render_application(application, file_path, template=None):
+    """Writes the agreement for `application` (see application_from_loan) to file_path."""
+    doc = Document(io.BytesIO(template or build_template()))
+
+    ref_p = doc.add_paragraph()
+    ref_p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    ref_p.add_run(f"Reference ID: {application['app_id']} | Date: {application['date']}")
+    doc.add_paragraph("_" * 75)
+
+    doc.add_heading('I. APPLICANT INFORMATION', level=2)
+    p1 = doc.add_paragraph()
+    p1.add_run("Full Name: ").bold = True; p1.add_run(application['customer_name'].upper())
+    p2 = doc.add_paragraph()
+    p2.add_run("National ID (NIN): ").bold = True; p2.add_run(application['nin_number'])
+
+    doc.add_heading('II. LOAN SPECIFICATIONS', level=2)
+    table = doc.add_table(rows=0, cols=2)
+    specs = [
+        ("Requested Amount:", f"{application['loan_amount']} RWF"),
+        ("Loan Category:", application['loan_type']),
+        ("Repayment Term:", application['duration']),
+        ("Collateral Provided:", application['collateral']),
+        ("Repayment Cycle:", application['payment_plan']),
+        ("Interest Rate:", application['interest'])
+    ]
+
+    for label, val in specs:
+        row_cells = table.add_row().cells
+        row_cells[0].text = label; row_cells[0].paragraphs[0].runs[0].bold = True
+        row_cells[1].text = val
+
+    doc.add_paragraph()
+    summary = doc.add_paragraph()
+    res_run = summary.add_run(f"TOTAL ESTIMATED REPAYMENT: {application['total_repayment']}")
+    res_run.bold = True; res_run.font.size = Pt(13)
+
+    doc.add_heading('III. PURPOSE OF LOAN', level=2)
+    doc.add_paragraph(application['purpose'])
+
+    if application['photos']:
+        doc.add_heading('IV. SECURITY ATTACHMENTS', level=2)
+        for photo_path in application['photos']:
+            if os.path.exists(photo_path):
+                try:
+                    doc.add_picture(prepare_image(photo_path, PHOTO_WIDTH_IN), width=Inches(PHOTO_WIDTH_IN))
+                    p = doc.add_paragraph(f"Attachment: {os.path.basename(photo_path)}")
+                    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                except Exception:
+                    doc.add_paragraph(f"[Error loading image: {os.path.basename(photo_path)}]")
+
+    doc.add_paragraph("\n" * 2)
+    sig_table = doc.add_table(rows=1, cols=2)
+    sig_table.width = doc.sections[0].page_width
+    sig_table.cell(0,0).paragraphs[0].add_run("__________________________\nAPPLICANT SIGNATURE")
+    right_cell = sig_table.cell(0,1).paragraphs[0]
+    right_cell.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+    right_cell.add_run("__________________________\nOFFICER APPROVAL / DATE")
+
+    doc.save(file_path)
+    return file_path
+
+
+# --- BATCH MODE ---
+# Worker processes receive the template once, through the pool initializer.
+
+_worker_template = None
+
+
+def _init_worker(template):
+    global _worker_template
+    _worker_template = template
+
+
+def _render_in_worker(application, file_path):
+    return render_application(application, file_path, _worker_template)
+
+
+def render_agreements(loan_ids=None, out_dir="agreements", max_workers=None, progress=None):
+    """
+    Renders Loan_App_<loan number>.docx into out_dir for each loan id, or
+    for every approved loan when loan_ids is None. Returns (written paths,
+    {loan id: error message}). progress(done, total) is called as files finish.
+    """
+    query = {'status': {'$in': schedule_engine.SCHEDULED_STATUSES}, 'is_deleted': database.NOT_DELETED}
+    if loan_ids is not None:
+        query = {'_id': {'$in': [v for lid in loan_ids for v in database.loan_id_variants(lid)]}}
+    loans = list(database.db['loans'].find(query))
+
+    os.makedirs(out_dir, exist_ok=True)
+    template = build_template()
+    written, failed = [], {}
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(template,)) as pool:
+        futures = {}
+        for loan in loans:
+            application = application_from_loan(loan)
+            file_path = os.path.join(out_dir, f"Loan_App_{application['app_id']}.docx")
+            futures[pool.submit(_render_in_worker, application, file_path)] = str(loan['_id'])
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                written.append(future.result())
+            except Exception as e:
+                failed[futures[future]] = str(e)
+            if progress:
+                progress(done, len(futures))
+    return written, failed
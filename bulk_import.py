@@ -0,0 +1,363 @@
+"""
+Headless bulk import of legacy loans and payments from CSV or XLSX files.
+
+    python db_admin.py import loans legacy_loans.xlsx
+    python db_admin.py import payments legacy_payments.csv [--chunk 5000] [--ordered] [--restart]
+
+Rows are streamed from the file (XLSX in openpyxl's read-only mode), checked
+with the same rules as the application and repayment screens (loan_rules)
+and written with one bulk_write per chunk instead of a find_one and an
+insert_one per record. The first row holds the column names:
+
+  loans     customer_name, nin_number, loan_amount; optionally loan_id,
+            loan_type, duration, collateral, payment_plan, interest_method,
+            purpose, status (default Approved), application_date, approved_date
+  payments  loan_id (LOAN-YYYY-XXXX or the loan's _id), payment_amount,
+            payment_date; optionally payment_method, received_by, reference
+
+Re-running an import never duplicates records: loans are upserted on
+loan_id, and payments carry an import_key (the reference column, or a hash
+of the row's contents) with a unique index behind it. After every chunk the
+last row written is stored in <file>.checkpoint.json, so an interrupted run
+continues where it stopped; --restart ignores the checkpoint. Rejected rows
+are appended to <file>.rejected.csv with the reason.
+
+Imported approved loans get their installment schedules. Payments are posted
+through database.post_payments(), the batched path the statement reconciler
+uses, which also moves each loan's balance and next_payment forward. Run `python db_admin.py aging` afterwards to age the new book.
+"""
+import csv
+import datetime
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+import database
+import loan_rules
+import schedule_engine
+
+CHUNK_SIZE = 5000
+DUPLICATE_KEY = 11000
+IMPORT_KINDS = ('loans', 'payments')
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+REJECTED_SUFFIX = ".rejected.csv"
+
+REQUIRED_COLUMNS = {
+    'loans': ('customer_name', 'nin_number', 'loan_amount'),
+    'payments': ('loan_id', 'payment_amount', 'payment_date'),
+}
+# Columns that make two rows the same record when the file has no id for it
+LOAN_KEY_COLUMNS = ('customer_name', 'nin_number', 'loan_amount', 'application_date', 'duration')
+PAYMENT_KEY_COLUMNS = ('loan_id', 'payment_date', 'payment_amount', 'payment_method', 'received_by')
+
+
+# --- READING ---
+
+def _column_name(value):
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+def cell_text(row, column):
+    """A cell as text: blank for None, whole numbers without '.0' (Excel stores NINs as numbers)."""
+    value = row.get(column)
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return database.format_date(value)
+    return str(value).strip()
+
+
+def read_rows(path):
+    """Yields (row number, {column: value}) for each non-empty data row of a CSV or XLSX file."""
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [_column_name(v) for v in next(rows, ())]
+            for number, values in enumerate(rows, start=2):
+                if any(v not in (None, '') for v in values):
+                    yield number, dict(dict.fromkeys(header), **dict(zip(header, values)))
+        finally:
+            workbook.close()
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            rows = csv.reader(f)
+            header = [_column_name(v) for v in next(rows, [])]
+            for number, values in enumerate(rows, start=2):
+                if any(v.strip() for v in values):
+                    yield number, dict(dict.fromkeys(header), **dict(zip(header, values)))
+
+
+def file_digest(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_key(row, columns, occurrences):
+    """
+    Stable id for a row without one: a hash of its key columns plus how many
+    identical rows came before it, so genuine repeats stay separate records.
+    """
+    content = hashlib.blake2b("|".join(cell_text(row, c).lower() for c in columns).encode(), digest_size=12).digest()
+    occurrences[content] += 1
+    return hashlib.blake2b(content + str(occurrences[content]).encode(), digest_size=12).hexdigest()
+
+
+# --- CHECKPOINTS ---
+
+def load_checkpoint(path, kind, digest):
+    """The saved progress for this exact file, or None to start from the top."""
+    try:
+        with open(path + CHECKPOINT_SUFFIX, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get('kind') != kind or state.get('file_digest') != digest:
+        return None
+    return state
+
+
+def save_checkpoint(path, state):
+    tmp = path + CHECKPOINT_SUFFIX + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp, path + CHECKPOINT_SUFFIX)
+
+
+# --- PREPARING CHUNKS ---
+# Each returns (records to write, the loans they touch - documents for loans,
+# _ids for payments - and [(row number, row, reason)] rejected).
+
+def _prepare_loans(chunk, customers):
+    """customers maps NIN -> (registered name, customer _id) and grows as the import goes."""
+    nins = list({cell_text(row, 'nin_number') for _, row, _ in chunk} - set(customers))
+    for customer in database.db[database.CUSTOMER_COLLECTION].find({'nin_number': {'$in': nins}}, {'nin_number': 1, 'name': 1}):
+        customers[customer['nin_number']] = (customer.get('name'), customer['_id'])
+
+    loans, rejected = [], []
+    for number, row, key in chunk:
+        try:
+            status = cell_text(row, 'status') or 'Approved'
+            application_date = cell_text(row, 'application_date') or None
+            year = (database.parse_date(application_date) or datetime.datetime.now()).year
+            loan = loan_rules.build_loan(
+                loan_id=cell_text(row, 'loan_id') or f"LOAN-{year}-{key[:8].upper()}",
+                customer_name=cell_text(row, 'customer_name'),
+                nin_number=cell_text(row, 'nin_number'),
+                loan_amount=cell_text(row, 'loan_amount'),
+                loan_type=cell_text(row, 'loan_type'),
+                duration=cell_text(row, 'duration'),
+                collateral=cell_text(row, 'collateral'),
+                payment_plan=cell_text(row, 'payment_plan') or 'Monthly',
+                interest_method=cell_text(row, 'interest_method') or schedule_engine.INTEREST_FLAT,
+                purpose=cell_text(row, 'purpose'),
+                status=status,
+                application_date=application_date,
+            )
+            if status in schedule_engine.SCHEDULED_STATUSES:
+                loan['approved_date'] = database.parse_date(cell_text(row, 'approved_date')) or loan['application_date']
+
+            stored_name = customers.setdefault(loan['nin_number'], (loan['customer_name'], None))[0]
+            if not loan_rules.same_customer(stored_name, loan['customer_name']):
+                raise loan_rules.ValidationError(
+                    f"NIN {loan['nin_number']} is already associated with a different name: '{stored_name}'.")
+        except loan_rules.ValidationError as e:
+            rejected.append((number, row, str(e)))
+            continue
+        loans.append(loan)
+
+    # Register the customers first seen in this chunk, then link every loan to its customer
+    new_nins = {loan['nin_number'] for loan in loans if customers[loan['nin_number']][1] is None}
+    if new_nins:
+        first_names = {}
+        for loan in loans:
+            first_names.setdefault(loan['nin_number'], loan['customer_name'])
+        now = datetime.datetime.now()
+        database.db[database.CUSTOMER_COLLECTION].bulk_write([
+            UpdateOne({'nin_number': nin}, {'$setOnInsert': {
+                'name': first_names[nin], 'name_key': database.normalize_name_key(first_names[nin]),
+                'created_date': now}}, upsert=True)
+            for nin in new_nins], ordered=False)
+        for customer in database.db[database.CUSTOMER_COLLECTION].find({'nin_number': {'$in': list(new_nins)}},
+                                                                       {'nin_number': 1, 'name': 1}):
+            customers[customer['nin_number']] = (customer.get('name'), customer['_id'])
+    for loan in loans:
+        loan['customer_id'] = customers[loan['nin_number']][1]
+
+    ops = [UpdateOne({'loan_id': loan['loan_id']}, {'$setOnInsert': loan}, upsert=True) for loan in loans]
+    return ops, loans, rejected
+
+
+def _prepare_payments(chunk):
+    refs = {cell_text(row, 'loan_id') for _, row, _ in chunk}
+    numbers = [ref.upper() for ref in refs if not database.is_valid_object_id(ref)]
+    object_ids = [ObjectId(ref) for ref in refs if database.is_valid_object_id(ref)]
+    loans = {}
+    for loan in database.db['loans'].find({'$or': [{'loan_id': {'$in': numbers}}, {'_id': {'$in': object_ids}}]},
+                                          {'loan_id': 1, 'customer_name': 1}):
+        loans[str(loan['_id'])] = loans[str(loan.get('loan_id', '')).upper()] = loan
+
+    recorded = datetime.datetime.now()
+    payments, loan_ids, rejected = [], set(), []
+    for number, row, key in chunk:
+        try:
+            loan = loans.get(cell_text(row, 'loan_id').upper()) or loans.get(cell_text(row, 'loan_id'))
+            if loan is None:
+                raise loan_rules.ValidationError(f"Loan '{cell_text(row, 'loan_id')}' does not exist.")
+            amount = loan_rules.parse_amount(cell_text(row, 'payment_amount'), "Payment amount")
+            payment_date = database.parse_date(cell_text(row, 'payment_date'))
+            if payment_date is None:
+                raise loan_rules.ValidationError("Payment date must be YYYY-MM-DD.")
+        except loan_rules.ValidationError as e:
+            rejected.append((number, row, str(e)))
+            continue
+        reference = cell_text(row, 'reference')
+        payments.append({
+            'loan_id': loan['_id'],
+            'customer_name': loan.get('customer_name'),
+            'payment_amount': amount,
+            'payment_date': database.format_date(payment_date),
+            'next_payment_date': None,
+            'payment_method': cell_text(row, 'payment_method') or 'Imported',
+            'received_by': cell_text(row, 'received_by') or 'Bulk Import',
+            'recorded_date': recorded,
+            'import_key': f"ref:{reference}" if reference else key,
+        })
+        loan_ids.add(loan['_id'])
+    return payments, list(loan_ids), rejected
+
+
+# --- WRITING ---
+
+def _bulk_write(collection, ops, ordered):
+    """
+    Runs ops and returns (records written, records already present). Duplicate
+    key errors are what a re-run produces and are counted, not raised; an
+    ordered write resumes after the duplicate it stopped at.
+    """
+    written = present = 0
+    while ops:
+        try:
+            result = collection.bulk_write(ops, ordered=ordered)
+            return (written + result.inserted_count + result.upserted_count,
+                    present + result.matched_count)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if any(err.get('code') != DUPLICATE_KEY for err in errors):
+                raise
+            written += e.details.get('nInserted', 0) + e.details.get('nUpserted', 0)
+            present += len(errors) + e.details.get('nMatched', 0)
+            if not ordered or not errors:
+                break
+            ops = ops[errors[-1]['index'] + 1:]
+    return written, present
+
+
+def _write_loans(ops, loans, ordered):
+    written, present = _bulk_write(database.db['loans'], ops, ordered)
+    database.record_customer_loans(loans)
+    # Approved loans without a schedule yet, including any an interrupted run left behind
+    scheduled = [loan['_id'] for loan in database.db['loans'].find(
+        {'loan_id': {'$in': [loan['loan_id'] for loan in loans]}, 'status': {'$in': schedule_engine.SCHEDULED_STATUSES},
+         'term_months': {'$exists': False}}, {'_id': 1})]
+    if scheduled:
+        schedule_engine.recompute_schedules(scheduled)
+    database.loan_cache.invalidate()
+    return written, present
+
+
+def _write_payments(payments, loan_ids, ordered):
+    result = database.post_payments(payments, ordered)
+    if result is None:
+        raise RuntimeError("Failed to post payments.")
+    written, present, loan_ids = result
+    schedule_engine.refresh_next_payments(loan_ids)
+    return written, present
+
+
+def _write_rejected(path, rejected, truncate):
+    with open(path + REJECTED_SUFFIX, 'w' if truncate else 'a', newline='', encoding='utf-8') as f:
+        out = csv.writer(f)
+        if truncate:
+            out.writerow(['row', 'reason', 'data'])
+        for number, row, reason in rejected:
+            out.writerow([number, reason, json.dumps({k: cell_text(row, k) for k in row})])
+
+
+def run_import(kind, path, chunk_size=CHUNK_SIZE, ordered=False, restart=False, report=print):
+    """
+    Imports a file of loans or payments (see the module docstring). Returns
+    {'rows', 'written', 'present', 'rejected', 'seconds'} for this run.
+    """
+    if kind not in IMPORT_KINDS:
+        raise ValueError(f"Unknown import kind '{kind}'.")
+    digest = file_digest(path)
+    state = None if restart else load_checkpoint(path, kind, digest)
+    resume_after = state['row'] if state else 0
+    if state:
+        report(f"Resuming {path} after row {resume_after}.")
+    _write_rejected(path, [], truncate=not state)
+
+    prepare = _prepare_loans if kind == 'loans' else _prepare_payments
+    write = _write_loans if kind == 'loans' else _write_payments
+    key_columns = LOAN_KEY_COLUMNS if kind == 'loans' else PAYMENT_KEY_COLUMNS
+    customers = {}
+    occurrences = Counter()
+    totals = {'rows': 0, 'written': 0, 'present': 0, 'rejected': 0}
+    started = time.perf_counter()
+
+    def flush(chunk):
+        ops, touched, rejected = prepare(chunk, customers) if kind == 'loans' else prepare(chunk)
+        written, present = write(ops, touched, ordered) if ops else (0, 0)
+        _write_rejected(path, rejected, truncate=False)
+        totals['rows'] += len(chunk)
+        totals['written'] += written
+        totals['present'] += present
+        totals['rejected'] += len(rejected)
+        save_checkpoint(path, {'kind': kind, 'file_digest': digest, 'row': chunk[-1][0],
+                               'updated_at': datetime.datetime.now().isoformat()})
+        elapsed = time.perf_counter() - started
+        report(f"  row {chunk[-1][0]:,}: {totals['written']:,} written, {totals['present']:,} already present, "
+               f"{totals['rejected']:,} rejected ({totals['rows'] / elapsed if elapsed else 0:,.0f} rows/s)")
+
+    chunk = []
+    checked_columns = False
+    for number, row in read_rows(path):
+        if not checked_columns:
+            missing = [c for c in REQUIRED_COLUMNS[kind] if c not in row]
+            if missing:
+                raise ValueError(f"{path} is missing the column(s): {', '.join(missing)}.")
+            checked_columns = True
+        # Keys depend on every earlier row, so rows before the checkpoint are still hashed
+        key = content_key(row, key_columns, occurrences)
+        if number <= resume_after:
+            continue
+        chunk.append((number, row, key))
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    # Finished: a later run of the same file starts over (and finds everything present)
+    if os.path.exists(path + CHECKPOINT_SUFFIX):
+        os.remove(path + CHECKPOINT_SUFFIX)
+    if not totals['rejected'] and not state:
+        os.remove(path + REJECTED_SUFFIX)
+    totals['seconds'] = time.perf_counter() - started
+    database.log_activity("System", "Bulk Import",
+                          f"Imported {totals['written']} {kind} from {os.path.basename(path)} "
+                          f"({totals['present']} already present, {totals['rejected']} rejected)")
+    return totals
@@ -0,0 +1,185 @@
+import tkinter as tk
+from tkinter import messagebox, ttk
+import database
+import bcrypt
+
+# THEME COLORS
+PRIMARY_GREEN = "#2ecc71"
+DARK_GREEN = "#27ae60"
+BG_COLOR = "#f4f7f6"
+WHITE = "#ffffff"
+TEXT_COLOR = "#2c3e50"
+SOFT_GREY = "#dcdde1"
+DANGER_RED = "#e74c3c"
+
+
+class CreateAccountWindow(tk.Toplevel):
+    """Registration dialog opened from User Management on top of the main window."""
+
+    def __init__(self, parent, admin_name="Administrator", on_created=None):
+        super().__init__(parent)
+        # Capturing the admin who is creating the account
+        self.admin_name = admin_name
+        self.on_created = on_created
+        # The main application window owns the shared task runner
+        self.controller = parent.winfo_toplevel()
+
+        self.title("Register New System User")
+        self.geometry("600x850")
+        self.configure(bg=BG_COLOR)
+        self.transient(parent.winfo_toplevel())
+        self.grab_set()
+
+        # Custom Style for Combobox
+        style = ttk.Style()
+        style.configure("TCombobox", fieldbackground=WHITE, bordercolor=SOFT_GREY, padding=5)
+
+        # MAIN CARD
+        card = tk.Frame(self, bg=WHITE, highlightthickness=1, highlightbackground=SOFT_GREY)
+        card.place(relx=0.5, rely=0.5, anchor=tk.CENTER, width=480, height=750)
+
+        # CARD HEADER
+        header_frame = tk.Frame(card, bg=PRIMARY_GREEN, height=80)
+        header_frame.pack(fill="x", side="top")
+        header_frame.pack_propagate(False)
+
+        tk.Label(header_frame, text="CREATE NEW ACCOUNT", font=("Segoe UI", 16, "bold"),
+                  bg=PRIMARY_GREEN, fg=WHITE).pack(pady=25)
+
+        # FORM CONTENT
+        self.form_container = tk.Frame(card, bg=WHITE, padx=40, pady=20)
+        self.form_container.pack(fill="both", expand=True)
+
+        # 1. Full Name
+        self.create_label("FULL NAME").pack(anchor="w", pady=(10, 2))
+        self.fullname_entry = self.create_entry()
+        self.fullname_entry.pack(fill="x", ipady=7, pady=(0, 12))
+
+        # 2. Email
+        self.create_label("EMAIL ADDRESS").pack(anchor="w", pady=(5, 2))
+        self.email_entry = self.create_entry()
+        self.email_entry.pack(fill="x", ipady=7, pady=(0, 12))
+
+        # 3. Username
+        self.create_label("USERNAME").pack(anchor="w", pady=(5, 2))
+        self.username_entry = self.create_entry()
+        self.username_entry.pack(fill="x", ipady=7, pady=(0, 12))
+
+        # 4. Access Role
+        self.create_label("ACCESS LEVEL").pack(anchor="w", pady=(5, 2))
+        self.role_combobox = ttk.Combobox(self.form_container, font=("Segoe UI", 11), state="readonly")
+        self.role_combobox['values'] = ("Staff", "Admin")
+        self.role_combobox.set("Staff")
+        self.role_combobox.pack(fill="x", ipady=4, pady=(0, 12))
+
+        # 5. Password
+        self.create_label("PASSWORD").pack(anchor="w", pady=(5, 2))
+        self.password_entry = self.create_entry(show="*")
+        self.password_entry.pack(fill="x", ipady=7, pady=(0, 12))
+
+        # 6. Confirm Password
+        self.create_label("CONFIRM PASSWORD").pack(anchor="w", pady=(5, 2))
+        self.confirm_entry = self.create_entry(show="*")
+        self.confirm_entry.pack(fill="x", ipady=7, pady=(0, 25))
+
+        # BUTTONS
+        register_btn = tk.Button(
+            self.form_container, text="REGISTER USER", command=self.create_account,
+            font=("Segoe UI", 12, "bold"), bg=PRIMARY_GREEN, fg=WHITE,
+            activebackground=DARK_GREEN, activeforeground=WHITE,
+            bd=0, cursor="hand2"
+        )
+        register_btn.pack(fill="x", ipady=12)
+
+        cancel_btn = tk.Button(
+            self.form_container, text="Back to Management", command=self.close_window,
+            font=("Segoe UI", 10, "underline"), bg=WHITE, fg=DANGER_RED,
+            activebackground=WHITE, activeforeground=TEXT_COLOR,
+            bd=0, cursor="hand2"
+        )
+        cancel_btn.pack(pady=10)
+
+    def create_label(self, text):
+        return tk.Label(self.form_container, text=text, font=("Segoe UI", 9, "bold"),
+                        bg=WHITE, fg=TEXT_COLOR)
+
+    def create_entry(self, show=None):
+        return tk.Entry(self.form_container, font=("Segoe UI", 11), bg=BG_COLOR,
+                        fg=TEXT_COLOR, bd=0, highlightthickness=1,
+                        highlightbackground=SOFT_GREY, highlightcolor=PRIMARY_GREEN, show=show)
+
+    def close_window(self):
+        """Returns to the user management screen."""
+        self.grab_release()
+        self.destroy()
+
+    def create_account(self):
+        # Retrieve all inputs
+        full_name = self.fullname_entry.get().strip()
+        email = self.email_entry.get().strip()
+        username = self.username_entry.get().strip()
+        password = self.password_entry.get()
+        confirm_password = self.confirm_entry.get()
+        role = self.role_combobox.get()
+
+        # Validation
+        if not all([full_name, email, username, password, confirm_password]):
+            messagebox.showerror("Error", "Please fill in all fields.", parent=self)
+            return
+
+        if "@" not in email or "." not in email:
+            messagebox.showerror("Error", "Please enter a valid email address.", parent=self)
+            return
+
+        if password != confirm_password:
+            messagebox.showerror("Error", "Passwords do not match.", parent=self)
+            return
+
+        # Duplicate checks, hashing and the insert run on the task runner; bcrypt is slow by design
+        self.controller.tasks.submit(self._register, full_name, email, username, password, role,
+                                     on_done=lambda error: self._on_registered(error, full_name, username, role),
+                                     on_error=lambda e: messagebox.showerror("Database Error", f"An error occurred: {e}", parent=self),
+                                     owner=self)
+
+    @staticmethod
+    def _register(full_name, email, username, password, role):
+        """Creates the account and returns None, or an error message for the user. Runs on a worker thread."""
+        # Check for existing username OR email
+        if database.db['users'].find_one({"username": username}):
+            return f"Username '{username}' is already taken."
+
+        if database.db['users'].find_one({"email": email}):
+            return f"Email '{email}' is already registered."
+
+        # Password Hashing
+        salt = bcrypt.gensalt()
+        hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
+
+        # Data dictionary matching user_management.py expectations
+        user_data = {
+            "full_name": full_name,
+            "email": email,
+            "username": username,
+            "password_hash": hashed_password.decode('utf-8'),
+            "role": role
+        }
+
+        result = database.db['users'].insert_one(user_data)
+        return None if result.inserted_id else "The account could not be saved."
+
+    def _on_registered(self, error, full_name, username, role):
+        if error:
+            messagebox.showerror("Error", error, parent=self)
+            return
+
+        # LOG THE ACTIVITY
+        database.log_activity(
+            self.admin_name,
+            "Account Creation",
+            f"Created new {role} account for {full_name} ({username})"
+        )
+
+        messagebox.showinfo("Success", f"User {full_name} registered successfully!", parent=self)
+        self.close_window()
+        if self.on_created:
+            self.on_created()
@@ -1,14 +1,21 @@
 import datetime
 import sys
-from collections import defaultdict
+import os
+import re
+import atexit
+import queue
+import threading
+import time
+from collections import defaultdict, OrderedDict
 
 # --- Import and Configuration ---
 
 # import pymongo and essential BSON classes
 try:
-    from pymongo import MongoClient
+    from pymongo import MongoClient, ReturnDocument
     from bson.objectid import ObjectId
-    from pymongo.errors import ConnectionFailure, OperationFailure, ServerSelectionTimeoutError
+    from bson import json_util
+    from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError, BulkWriteError, DuplicateKeyError
     # Set this flag only if all necessary imports succeed
     MONGO_AVAILABLE = True 
 except ImportError:
@@ -22,43 +29,194 @@ def is_valid_object_id(oid):
     """Checks if a string is a valid MongoDB ObjectId."""
     return ObjectId.is_valid(oid)
 
+def loan_id_variants(loan_id):
+    """
+    Returns every form a loan reference may take in the 'payments' collection.
+    Older screens stored the loan's ObjectId, others its string form.
+    """
+    if is_valid_object_id(loan_id):
+        return [ObjectId(loan_id), str(loan_id)]
+    return [loan_id]
+
+def parse_date(value):
+    """Converts a 'YYYY-MM-DD' string (or date) to a datetime; returns None if it cannot."""
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime(value.year, value.month, value.day)
+    try:
+        return datetime.datetime.strptime(str(value)[:10], "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+def format_date(value, default="N/A"):
+    """Formats a stored date (datetime or legacy string) as 'YYYY-MM-DD' for display."""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.strftime("%Y-%m-%d")
+    return value if value else default
+
 # --- CONFIGURATION ---
 MONGO_URI = "mongodb://localhost:27017/"
 DATABASE_NAME = "LoanManagementDB"
 DB_TIMEOUT_MS = 5000
 
+# Schema version this code expects. Collections and indexes are created by the
+# migrations in db_admin.py, which must end at this version.
+SCHEMA_VERSION = 14
+SCHEMA_COLLECTION = "schema_info"
+
+# Daily portfolio figures written by `db_admin.py snapshot`. Each day has one
+# document per loan type plus one for SNAPSHOT_ALL_TYPES.
+SNAPSHOT_COLLECTION = "portfolio_snapshots"
+SNAPSHOT_ALL_TYPES = "All"
+
+# Customer registry, one document per NIN (unique). Loans point at it with customer_id.
+CUSTOMER_COLLECTION = "customers"
+
+# Repayment schedules built by schedule_engine.py, one document per installment
+INSTALLMENT_COLLECTION = "installments"
+
+# Audit log writer settings. Entries are queued by log_activity() and written
+# in insert_many batches by a background thread.
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 200
+LOG_FLUSH_INTERVAL = 2.0   # seconds between timed flushes
+LOG_RETRY_MAX_DELAY = 30.0  # seconds, cap for the backoff while the server is down
+LOG_SPOOL_FILE = "pending_logs.jsonl"  # entries that could not be written before exit
+
+# Client-side loan cache used by get_loan_by_id(). Other workstations' changes
+# become visible after at most LOAN_CACHE_TTL seconds.
+LOAN_CACHE_SIZE = 2000
+LOAN_CACHE_TTL = 30.0
+
+# Newest payments returned with a loan file; older ones are counted but not fetched
+LOAN_FILE_PAYMENT_LIMIT = 500
+
+# Filtered log counts stop at this many matches and are shown as "N+"
+LOG_COUNT_LIMIT = 100000
+
+# Audit log retention (log_retention.py): raw entries older than this many days
+# are rolled up into daily per-user/per-action counts, archived and removed.
+LOG_RETENTION_DAYS = 180
+LOG_ROLLUP_COLLECTION = "log_rollups"
+LOG_ARCHIVE_DIR = "log_archive"
+
+# Statement lines statement_reconciler.py could not match to a loan, and the
+# payer phone/account numbers learned when a teller matches one by hand
+STATEMENT_REVIEW_COLLECTION = "statement_review"
+PAYER_COLLECTION = "statement_payers"
+
+# Named sequences (one document per sequence) handed out by reserve_sequence()
+COUNTER_COLLECTION = "counters"
+
 # Global variable to hold the database connection object
 db = None
 
 
-def initialize_collections():
-    """Ensures that the primary collections (tables) exist and sets up non-_id indexes."""
+def get_schema_version():
+    """Returns the schema version recorded in the database (0 if never migrated)."""
     global db
-    if db is not None:
-        try:
-            # 1. Check/Create Collections
-            for name in ['loans', 'users', 'payments', 'logs']:
-                if name not in db.list_collection_names():
-                    # This implicitly creates the collection and the mandatory unique _id index
-                    db.create_collection(name)
-                    print(f"Collection '{name}' created.")
-
-            # 2. Create Indexes for performance
-            
-            db['loans'].create_index([("customer_name", 1)])
-            db['loans'].create_index([("status", 1)])
-            db['payments'].create_index([("loan_id", 1)])
-            db['payments'].create_index([("payment_date", -1)])
-            
-            # Index for logs to ensure fast sorting in the Analytics/Reports window
-            db['logs'].create_index([("timestamp", -1)])
-            
-            print("All collections and required indexes initialized successfully.")
-        except OperationFailure as e:
-            # Catch specific pymongo operation errors (e.g., if index creation fails)
-            print(f"Error initializing collections/indexes: {e}")
-        except Exception as e:
-            print(f"Unexpected error during initialization: {e}")
+    if db is None: return 0
+
+    try:
+        info = db[SCHEMA_COLLECTION].find_one({'_id': 'schema'}, {'version': 1})
+        return int(info.get('version', 0)) if info else 0
+    except Exception as e:
+        print(f"Database Error: Failed to read schema version: {e}")
+        return 0
+
+
+def record_job_run(job, **details):
+    """Records when a scheduled job (e.g. 'aging') last ran, next to the schema version."""
+    global db
+    if db is None: return
+
+    try:
+        db[SCHEMA_COLLECTION].update_one({'_id': job}, {'$set': dict(details, last_run=datetime.datetime.now())},
+                                         upsert=True)
+    except Exception as e:
+        print(f"Database Error: Failed to record {job} run: {e}")
+
+def get_job_run(job):
+    """The record written by record_job_run(), or None if the job never ran."""
+    global db
+    if db is None: return None
+
+    try:
+        return db[SCHEMA_COLLECTION].find_one({'_id': job})
+    except Exception as e:
+        print(f"Database Error: Failed to read {job} run: {e}")
+        return None
+
+def check_schema_version():
+    """Single cheap startup check that the database has been migrated to SCHEMA_VERSION."""
+    version = get_schema_version()
+    if version < SCHEMA_VERSION:
+        print(f"Database schema is at version {version}, expected {SCHEMA_VERSION}.")
+        print("Run 'python db_admin.py migrate' to create collections and indexes.")
+        return False
+    if version > SCHEMA_VERSION:
+        print(f"Database schema version {version} is newer than this application ({SCHEMA_VERSION}).")
+    return True
+
+
+class LoanCache:
+    """
+    Bounded identity map of loan documents keyed by the string form of _id.
+
+    Entries expire after `ttl` seconds and the least recently used entry is
+    evicted beyond `max_size`. Documents seeded from list queries are partial
+    (projected); they only answer lookups that ask for a subset of their fields.
+    Every loan write made through this module invalidates the entry.
+    """
+
+    def __init__(self, max_size=LOAN_CACHE_SIZE, ttl=LOAN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, doc, fields or None when complete)
+        self._lock = threading.Lock()
+
+    def get(self, loan_id, fields=None):
+        key = str(loan_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, doc, cached_fields = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            if cached_fields is not None and (fields is None or not set(fields) <= cached_fields):
+                return None
+            self._entries.move_to_end(key)
+            return dict(doc)
+
+    def put(self, doc, fields=None):
+        key = str(doc['_id'])
+        fields = set(fields) if fields is not None else None
+        with self._lock:
+            existing = self._entries.get(key)
+            if fields is not None and existing and existing[2] is None and existing[0] >= time.monotonic():
+                return  # keep the complete document rather than a projection of it
+            self._entries[key] = (time.monotonic() + self.ttl, dict(doc), fields)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def put_many(self, docs, fields=None):
+        for doc in docs:
+            self.put(doc, fields)
+
+    def invalidate(self, loan_id=None):
+        """Drops one loan, or every loan when loan_id is None."""
+        with self._lock:
+            if loan_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(loan_id), None)
+
+
+loan_cache = LoanCache()
 
 
 def connect_to_db():
@@ -72,7 +230,7 @@ def connect_to_db():
         client.admin.command('ping') 
         db = client[DATABASE_NAME]
         print(f"Successfully connected to MongoDB: {DATABASE_NAME}")
-        initialize_collections()
+        check_schema_version()
         return True
     except ServerSelectionTimeoutError:
         print(f"Error connecting to MongoDB: Connection timed out after {DB_TIMEOUT_MS}ms.")
@@ -91,30 +249,166 @@ def connect_to_db():
         
 # --- Database Functions Required by GUI ---
 
+class AuditLogWriter:
+    """
+    Background writer for the 'logs' collection.
+
+    Entries are queued without touching the network and grouped into
+    insert_many batches, flushed every LOG_FLUSH_INTERVAL seconds or as soon as
+    LOG_BATCH_SIZE entries are waiting. Every entry gets its _id on the client,
+    so a batch that is retried after a partial failure cannot be stored twice.
+    Batches that fail are kept and retried with backoff; anything still unsent
+    at exit (or that overflows the queue) is spooled to LOG_SPOOL_FILE and
+    replayed on the next successful flush.
+    """
+
+    def __init__(self, batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL,
+                 max_queue=LOG_QUEUE_SIZE, spool_file=LOG_SPOOL_FILE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_file = spool_file
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._retry = []  # entries from batches that failed to write
+        self._retry_delay = flush_interval
+        self._spool_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="AuditLogWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, entry):
+        """Queues an entry; never blocks the caller (the Tk thread)."""
+        entry.setdefault('_id', ObjectId())
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self._spool([entry])
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stop.is_set():
+            # Wake up early when a full batch is waiting
+            waited = time.monotonic() - last_flush
+            if waited < self._retry_delay and (self._retry or self._queue.qsize() < self.batch_size):
+                self._stop.wait(min(0.2, self._retry_delay - waited))
+                continue
+            self.flush()
+            last_flush = time.monotonic()
+
+    def flush(self):
+        """Writes everything currently queued. Returns True if nothing is left pending."""
+        global db
+        if db is None:
+            return False
+
+        self._replay_spool()
+        while True:
+            batch = self._retry or self._drain(self.batch_size)
+            self._retry = []
+            if not batch:
+                self._retry_delay = self.flush_interval
+                return True
+            if not self._write(batch):
+                self._retry = batch
+                self._retry_delay = min(self._retry_delay * 2, LOG_RETRY_MAX_DELAY)
+                return False
+
+    def _write(self, batch):
+        try:
+            db['logs'].insert_many(batch, ordered=False)
+            return True
+        except BulkWriteError as e:
+            # Duplicate keys mean part of a retried batch was already stored
+            errors = e.details.get('writeErrors', [])
+            if errors and all(err.get('code') == 11000 for err in errors):
+                return True
+            print(f"Failed to log activity: {e}")
+            return False
+        except Exception as e:
+            print(f"Failed to log activity: {e}")
+            return False
+
+    def _spool(self, entries):
+        with self._spool_lock:
+            try:
+                with open(self.spool_file, "a", encoding="utf-8") as f:
+                    for entry in entries:
+                        f.write(json_util.dumps(entry) + "\n")
+            except OSError as e:
+                print(f"Failed to spool activity logs: {e}")
+
+    def _replay_spool(self):
+        with self._spool_lock:
+            if not os.path.exists(self.spool_file):
+                return
+            try:
+                with open(self.spool_file, encoding="utf-8") as f:
+                    entries = [json_util.loads(line) for line in f if line.strip()]
+            except (OSError, ValueError) as e:
+                print(f"Failed to read spooled activity logs: {e}")
+                return
+            for i in range(0, len(entries), self.batch_size):
+                if not self._write(entries[i:i + self.batch_size]):
+                    return  # keep the file for the next attempt
+            os.remove(self.spool_file)
+
+    def close(self, timeout=5.0):
+        """Stops the thread, makes a last flush attempt and spools whatever is left."""
+        self._stop.set()
+        self._thread.join(timeout)
+        self._retry_delay = self.flush_interval
+        if not self.flush():
+            self._spool(self._retry + self._drain(self._queue.qsize() + 1))
+            self._retry = []
+
+
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+
+def get_log_writer():
+    """Returns the process-wide audit writer, starting it on first use."""
+    global _log_writer
+    with _log_writer_lock:
+        if _log_writer is None:
+            _log_writer = AuditLogWriter()
+            atexit.register(_log_writer.close)
+        return _log_writer
+
+
 def log_activity(user, action, details):
     """
     Saves a user action to the 'logs' collection for auditing.
-    This can be called from anywhere in the project.
+    This can be called from anywhere in the project. The entry is queued and
+    written in the background, so the caller never waits on the database.
     """
-    global db
-    if db is None: 
-        return False
-    
     try:
         log_entry = {
-            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": datetime.datetime.now(),
             "user": user,
             "action": action,
             "details": details
         }
-        db['logs'].insert_one(log_entry)
+        get_log_writer().submit(log_entry)
         return True
     except Exception as e:
         print(f"Failed to log activity: {e}")
         return False
 
 def save_payment(payment_data):
-    """Saves a new payment record using the 'payments' collection."""
+    """
+    Saves a new payment record using the 'payments' collection and updates the
+    running balance kept on the loan (total_paid, remaining_balance,
+    payment_count, last_payment_date) in the same call.
+    """
     global db
     if db is None: return None
     
@@ -128,6 +422,8 @@ def save_payment(payment_data):
             raise ValueError("Payment data is missing 'loan_id'.")
             
         result = db['payments'].insert_one(payment_data)
+        apply_payment_to_loan(payment_data['loan_id'], payment_data['payment_amount'],
+                              payment_data.get('payment_date'))
         
         return str(result.inserted_id)
         
@@ -135,6 +431,178 @@ def save_payment(payment_data):
         print(f"Database Error: Failed to save payment: {e}")
         return None
 
+def post_payments(payments, ordered=False):
+    """
+    Inserts many payments in one batch and applies them to their loans'
+    balance fields with one bulk update, closing loans that are paid off.
+    Payments whose import_key is already stored are skipped, so posting the
+    same batch twice changes nothing. The loans of skipped payments have their
+    balances rebuilt from the stored payments: a run that stopped between the
+    insert and the balance update left those payments uncounted. Returns
+    (posted, already present, _ids of the loans that received payments), or
+    None on failure.
+    """
+    global db
+    if db is None: return None
+
+    try:
+        from pymongo import UpdateOne
+
+        recorded = datetime.datetime.now()
+        for payment in payments:
+            payment.setdefault('recorded_date', recorded)
+            payment['payment_amount'] = float(payment['payment_amount'])
+
+        # Indexes of the payments that hit a duplicate import_key
+        skipped = set()
+        start = 0
+        while start < len(payments):
+            try:
+                db['payments'].insert_many(payments[start:], ordered=ordered)
+                break
+            except BulkWriteError as e:
+                errors = e.details.get('writeErrors', [])
+                if not errors or any(err.get('code') != 11000 for err in errors):
+                    raise
+                skipped.update(start + err['index'] for err in errors)
+                if not ordered:
+                    break
+                start += errors[-1]['index'] + 1
+
+        totals = {}
+        for i, payment in enumerate(payments):
+            if i in skipped:
+                continue
+            paid_on = parse_date(payment.get('payment_date')) or recorded
+            amount, count, last = totals.get(payment['loan_id'], (0.0, 0, paid_on))
+            totals[payment['loan_id']] = (amount + payment['payment_amount'], count + 1, max(last, paid_on))
+
+        # Loans with a payment that was already stored are rebuilt from their payments
+        rebuild = list({payments[i]['loan_id'] for i in skipped})
+        loan_ids = list(totals) + [loan_id for loan_id in rebuild if loan_id not in totals]
+        if totals:
+            result = db['loans'].bulk_write([
+                UpdateOne({'_id': loan_id, 'remaining_balance': {'$exists': True}},
+                          {'$inc': {'total_paid': amount, 'remaining_balance': -amount, 'payment_count': count},
+                           '$max': {'last_payment_date': last}})
+                for loan_id, (amount, count, last) in totals.items()], ordered=False)
+            if result.matched_count < len(totals):
+                # Loans that predate the balance fields are rebuilt from their payments instead
+                rebuild += [loan['_id'] for loan in db['loans'].find(
+                    {'_id': {'$in': list(totals)}, 'remaining_balance': {'$exists': False}}, {'_id': 1})]
+        if rebuild:
+            reconcile_loan_balances(rebuild)
+        if loan_ids:
+            db['loans'].update_many(
+                {'_id': {'$in': loan_ids}, 'status': {'$in': REPAYING_STATUSES},
+                 'remaining_balance': {'$lte': 0.01}},
+                {'$set': {'status': 'Fully Paid'}})
+            for loan_id in loan_ids:
+                loan_cache.invalidate(loan_id)
+        return len(payments) - len(skipped), len(skipped), loan_ids
+
+    except Exception as e:
+        print(f"Database Error: Failed to post payments: {e}")
+        return None
+
+def apply_payment_to_loan(loan_id, amount, payment_date=None):
+    """Atomically adds one payment to the loan's denormalized balance fields."""
+    global db
+    if db is None: return False
+
+    try:
+        query_id = ObjectId(loan_id) if is_valid_object_id(loan_id) else loan_id
+        update = {'$inc': {'total_paid': amount,
+                           'remaining_balance': -amount,
+                           'payment_count': 1}}
+        paid_on = parse_date(payment_date) or datetime.datetime.now()
+        update['$max'] = {'last_payment_date': paid_on}
+
+        result = db['loans'].update_one({'_id': query_id, 'remaining_balance': {'$exists': True}}, update)
+        loan_cache.invalidate(loan_id)
+        if result.matched_count == 0:
+            # Loan predates the balance fields: rebuild them from its payments instead
+            reconcile_loan_balances([loan_id])
+        return True
+
+    except Exception as e:
+        print(f"Database Error: Failed to update balance for loan {loan_id}: {e}")
+        return False
+
+def reconcile_loan_balances(loan_ids=None, batch_size=1000):
+    """
+    Rebuilds total_paid, remaining_balance, payment_count and last_payment_date
+    from the 'payments' collection. Pass loan_ids to limit the work to those
+    loans, or None to reconcile the whole book. Returns the number of loans updated.
+    """
+    global db
+    if db is None: return 0
+
+    try:
+        from pymongo import UpdateOne
+
+        payment_match = {}
+        loan_match = {}
+        if loan_ids is not None:
+            variants = [v for lid in loan_ids for v in loan_id_variants(lid)]
+            payment_match = {'loan_id': {'$in': variants}}
+            loan_match = {'_id': {'$in': [v for v in variants if isinstance(v, ObjectId)] or variants}}
+
+        # One aggregation for all payment totals, keyed by the string form of the loan id
+        totals = {}
+        pipeline = [
+            {'$match': payment_match},
+            {'$group': {
+                '_id': {'$toString': '$loan_id'},
+                'total': {'$sum': '$payment_amount'},
+                'count': {'$sum': 1},
+                'last': {'$max': {'$dateFromString': {
+                    'dateString': {'$substrBytes': [{'$toString': '$payment_date'}, 0, 10]},
+                    'format': '%Y-%m-%d', 'onError': '$recorded_date', 'onNull': '$recorded_date'}}}
+            }}
+        ]
+        for row in db['payments'].aggregate(pipeline, allowDiskUse=True):
+            totals[row['_id']] = row
+
+        if loan_ids is None:
+            loan_cache.invalidate()
+        else:
+            for lid in loan_ids:
+                loan_cache.invalidate(lid)
+        updated = 0
+        ops = []
+        for loan in db['loans'].find(loan_match, {'loan_amount': 1}):
+            row = totals.get(str(loan['_id']), {})
+            total_paid = float(row.get('total', 0.0))
+            ops.append(UpdateOne({'_id': loan['_id']}, {'$set': {
+                'total_paid': total_paid,
+                'remaining_balance': float(loan.get('loan_amount', 0) or 0) - total_paid,
+                'payment_count': int(row.get('count', 0)),
+                'last_payment_date': row.get('last'),
+            }}))
+            if len(ops) >= batch_size:
+                updated += db['loans'].bulk_write(ops, ordered=False).matched_count
+                ops = []
+        if ops:
+            updated += db['loans'].bulk_write(ops, ordered=False).matched_count
+        return updated
+
+    except Exception as e:
+        print(f"Database Error: Failed to reconcile loan balances: {e}")
+        return 0
+
+def get_loan_balance(loan):
+    """
+    Returns (total_paid, remaining_balance) for a loan document, reading the
+    denormalized fields and only aggregating payments for unreconciled loans.
+    """
+    loan_amount = float(loan.get('loan_amount', 0) or 0)
+    if 'total_paid' in loan:
+        total_paid = float(loan.get('total_paid') or 0)
+    else:
+        total_paid = get_total_paid_for_loan(loan.get('_id'))
+    return total_paid, loan_amount - total_paid
+
 def get_total_paid_for_loan(loan_id):
     """Calculates the sum of all payments for a specific loan using aggregation."""
     global db
@@ -142,11 +610,11 @@ def get_total_paid_for_loan(loan_id):
     
     try:
         pipeline = [
-            # Match documents for the specific loan ID (stored as string in payments)
-            {'$match': {'loan_id': loan_id}}, 
+            # Match documents for the specific loan ID (stored as string or ObjectId in payments)
+            {'$match': {'loan_id': {'$in': loan_id_variants(loan_id)}}}, 
             # Group all matched documents and sum the payment_amount field
             {'$group': {
-                '_id': '$loan_id',
+                '_id': None,
                 'total': {'$sum': '$payment_amount'}
             }}
         ]
@@ -169,7 +637,7 @@ def get_payments_by_loan(loan_id):
     
     try:
         # Find all payments matching the loan_id, sort descending by date
-        payments = list(db['payments'].find({'loan_id': loan_id})
+        payments = list(db['payments'].find({'loan_id': {'$in': loan_id_variants(loan_id)}})
                                      .sort([('payment_date', -1), ('recorded_date', -1)]))
         return payments
         
@@ -177,6 +645,560 @@ def get_payments_by_loan(loan_id):
         print(f"Database Error: Failed to retrieve payments: {e}")
         return []
 
+def get_loan_file(loan_id, payment_limit=None):
+    """
+    Fetches everything a loan screen shows in one aggregation round trip.
+
+    Returns a dict with 'loan', 'payments' (newest first, at most
+    `payment_limit`), 'payment_count', 'total_paid' and 'remaining_balance',
+    or None when the loan does not exist or the query fails.
+    """
+    global db
+    if db is None: return None
+    if payment_limit is None: payment_limit = LOAN_FILE_PAYMENT_LIMIT
+
+    try:
+        query_id = ObjectId(loan_id) if is_valid_object_id(loan_id) else loan_id
+        pipeline = [
+            {'$match': {'_id': query_id}},
+            {'$lookup': {
+                'from': 'payments',
+                # Uncorrelated sub-pipeline so the match can use the loan_id index
+                'pipeline': [
+                    {'$match': {'loan_id': {'$in': loan_id_variants(loan_id)}}},
+                    {'$facet': {
+                        'recent': [
+                            {'$sort': {'payment_date': -1, 'recorded_date': -1}},
+                            {'$limit': payment_limit}
+                        ],
+                        'totals': [
+                            {'$group': {'_id': None,
+                                        'count': {'$sum': 1},
+                                        'total': {'$sum': '$payment_amount'}}}
+                        ]
+                    }}
+                ],
+                'as': 'payment_file'
+            }}
+        ]
+        results = list(db['loans'].aggregate(pipeline))
+        if not results:
+            return None
+
+        loan = results[0]
+        payment_file = loan.pop('payment_file')[0]
+        totals = payment_file['totals'][0] if payment_file['totals'] else {}
+        total_paid = float(totals.get('total', 0) or 0)
+
+        loan_cache.put(loan)
+        loan['_id'] = str(loan['_id'])
+        return {
+            'loan': loan,
+            'payments': payment_file['recent'],
+            'payment_count': totals.get('count', 0),
+            'total_paid': total_paid,
+            'remaining_balance': float(loan.get('loan_amount', 0) or 0) - total_paid
+        }
+
+    except Exception as e:
+        print(f"Database Error: Failed to load loan file {loan_id}: {e}")
+        return None
+
+# --- REPORTING ---
+
+# Loan statuses that no longer count as active files
+CLOSED_STATUSES = ['Fully Paid', 'Rejected']
+# Statuses of loans that are being repaid and can therefore fall overdue
+REPAYING_STATUSES = ['Approved', 'Under Payment']
+# Matches loans that are not in the recycle bin (older documents may lack the field)
+NOT_DELETED = {'$in': [False, None]}
+
+# Maximum number of rows returned for one search-as-you-type query
+SEARCH_RESULT_LIMIT = 50
+
+def normalize_name_key(name):
+    """Lowercased, whitespace-collapsed form of a customer name used for prefix search."""
+    return " ".join(str(name or "").split()).lower()
+
+def get_customer_by_nin(nin_number):
+    """The customer registered under a NIN (one indexed read), or None."""
+    global db
+    if db is None: return None
+
+    try:
+        return db[CUSTOMER_COLLECTION].find_one({'nin_number': str(nin_number or '').strip()})
+    except Exception as e:
+        print(f"Database Error: Failed to look up customer: {e}")
+        return None
+
+def register_customer(nin_number, name):
+    """
+    Returns the customer for a NIN, creating it with this name if the NIN is
+    new. An existing customer keeps its registered name; callers compare it
+    with loan_rules.same_customer(). Safe when two desks register the same
+    NIN at once: the unique index lets only one insert win.
+    """
+    global db
+    if db is None: return None
+
+    nin_number = str(nin_number or '').strip()
+    name = " ".join(str(name or '').split())
+    new_customer = {'name': name, 'name_key': normalize_name_key(name), 'created_date': datetime.datetime.now()}
+    try:
+        return db[CUSTOMER_COLLECTION].find_one_and_update(
+            {'nin_number': nin_number}, {'$setOnInsert': new_customer},
+            upsert=True, return_document=ReturnDocument.AFTER)
+    except DuplicateKeyError:
+        return db[CUSTOMER_COLLECTION].find_one({'nin_number': nin_number})
+
+def reserve_sequence(name, count=1):
+    """
+    Atomically reserves `count` consecutive numbers of the named sequence and
+    returns the first one. Sequences start at 1 and are created on first use;
+    the single $inc means concurrent callers never receive overlapping ranges.
+    """
+    global db
+    if db is None: return None
+
+    try:
+        counter = db[COUNTER_COLLECTION].find_one_and_update(
+            {'_id': name}, {'$inc': {'value': count}},
+            upsert=True, return_document=ReturnDocument.AFTER)
+        return counter['value'] - count + 1
+    except DuplicateKeyError:
+        # Two first uses raced on the upsert; the counter exists now
+        return reserve_sequence(name, count)
+    except Exception as e:
+        print(f"Database Error: Failed to reserve from sequence '{name}': {e}")
+        return None
+
+def record_customer_loans(loans):
+    """
+    Keeps each customer's latest application details (collateral, date), used
+    to prefill their next application. Older applications never overwrite
+    newer ones, so replaying loans is harmless.
+    """
+    global db
+    if db is None: return False
+
+    try:
+        from pymongo import UpdateOne
+
+        ops = [UpdateOne({'_id': loan['customer_id'],
+                          'last_application_date': {'$not': {'$gt': loan['application_date']}}},
+                         {'$set': {'last_collateral': loan.get('collateral'),
+                                   'last_application_date': loan['application_date']}})
+               for loan in loans if loan.get('customer_id') and loan.get('application_date')]
+        if ops:
+            db[CUSTOMER_COLLECTION].bulk_write(ops, ordered=False)
+        return True
+    except Exception as e:
+        print(f"Database Error: Failed to update customers: {e}")
+        return False
+
+def search_loans_by_name(term, limit=SEARCH_RESULT_LIMIT, include_deleted=False):
+    """
+    Returns up to `limit` loans whose customer name starts with `term`.
+    The anchored, case-sensitive regex on the normalized customer_name_key
+    becomes an index range scan, so the cost does not grow with the book.
+    """
+    global db
+    if db is None: return []
+
+    key = normalize_name_key(term)
+    if not key: return []
+
+    try:
+        query = {'customer_name_key': {'$regex': '^' + re.escape(key)}}
+        if not include_deleted:
+            query['is_deleted'] = NOT_DELETED
+        loans = list(db['loans'].find(query, LOAN_LIST_PROJECTION)
+                                .sort('customer_name_key', 1)
+                                .limit(limit)
+                                .max_time_ms(2000))
+        loan_cache.put_many(loans, LOAN_LIST_FIELDS)
+        return loans
+    except Exception as e:
+        print(f"Database Error: Failed to search loans for '{term}': {e}")
+        return []
+
+# Fields needed to draw one row of the loan management table
+LOAN_LIST_PROJECTION = {
+    'customer_name': 1, 'loan_amount': 1, 'duration': 1, 'status': 1,
+    'next_payment': 1, 'final_completion_date': 1, 'is_deleted': 1,
+    'payment_plan': 1
+}
+LOAN_LIST_FIELDS = {'_id'} | set(LOAN_LIST_PROJECTION)
+
+def get_loans_page(query, limit=100, after=None, projection=LOAN_LIST_PROJECTION):
+    """
+    Returns one page of loans matching `query`, newest first, and the cursor
+    for the next page: (loans, next_cursor). Keyset pagination on _id keeps
+    every page a bounded index scan no matter how deep the user scrolls.
+    """
+    global db
+    if db is None: return [], None
+
+    try:
+        if after is not None:
+            query = dict(query, _id={'$lt': after})
+        loans = list(db['loans'].find(query, projection).sort('_id', -1).limit(limit))
+        if projection is LOAN_LIST_PROJECTION:
+            loan_cache.put_many(loans, LOAN_LIST_FIELDS)
+        next_cursor = loans[-1]['_id'] if len(loans) == limit else None
+        return loans, next_cursor
+
+    except Exception as e:
+        print(f"Database Error: Failed to retrieve loans page: {e}")
+        return [], None
+
+def get_overdue_loans(limit=200, after=None, as_of=None):
+    """
+    Returns one page of overdue loans, oldest due date first, and the cursor
+    for the next page: (loans, next_cursor). Served by the
+    (is_deleted, status, next_payment) index as a bounded range scan.
+
+    after is the (next_payment, _id) pair returned by the previous call.
+    """
+    global db
+    if db is None: return [], None
+
+    try:
+        today = as_of or datetime.datetime.combine(datetime.date.today(), datetime.time())
+        query = {
+            'is_deleted': NOT_DELETED,
+            'status': {'$in': REPAYING_STATUSES},
+            'next_payment': {'$lt': today, '$type': 'date'}
+        }
+        if after:
+            last_due, last_id = after
+            query['$or'] = [
+                {'next_payment': {'$gt': last_due}},
+                {'next_payment': last_due, '_id': {'$gt': last_id}}
+            ]
+
+        loans = list(db['loans'].find(query, LOAN_LIST_PROJECTION)
+                                .sort([('next_payment', 1), ('_id', 1)])
+                                .limit(limit))
+        loan_cache.put_many(loans, LOAN_LIST_FIELDS)
+        next_cursor = None
+        if len(loans) == limit:
+            next_cursor = (loans[-1]['next_payment'], loans[-1]['_id'])
+        return loans, next_cursor
+
+    except Exception as e:
+        print(f"Database Error: Failed to retrieve overdue loans: {e}")
+        return [], None
+
+def get_portfolio_summary(start_date=None, end_date=None):
+    """
+    Computes the portfolio figures for the Reports screen in one aggregation.
+    Optionally limited to loans whose application_date falls in
+    [start_date, end_date). Returns a dict with lent, recovered, outstanding,
+    active_count and status_counts; no loan documents are sent to the client.
+    """
+    global db
+    empty = {'lent': 0.0, 'recovered': 0.0, 'outstanding': 0.0, 'active_count': 0, 'status_counts': {}}
+    if db is None: return empty
+
+    try:
+        match = {}
+        if start_date or end_date:
+            match['application_date'] = {}
+            if start_date: match['application_date']['$gte'] = start_date
+            if end_date: match['application_date']['$lt'] = end_date
+
+        pipeline = [
+            {'$match': match},
+            {'$facet': {
+                'totals': [{'$group': {
+                    '_id': None,
+                    'lent': {'$sum': {'$toDouble': {'$ifNull': ['$loan_amount', 0]}}},
+                    # total_paid is the running balance maintained by save_payment
+                    'recovered': {'$sum': {'$ifNull': ['$total_paid', 0]}},
+                    'active_count': {'$sum': {'$cond': [
+                        {'$in': [{'$ifNull': ['$status', 'Pending']}, CLOSED_STATUSES]}, 0, 1]}}
+                }}],
+                # Sorted so the pie keeps its wedge order (and colours) between refreshes
+                'statuses': [{'$group': {
+                    '_id': {'$ifNull': ['$status', 'Pending']},
+                    'count': {'$sum': 1}
+                }}, {'$sort': {'_id': 1}}]
+            }}
+        ]
+
+        result = next(db['loans'].aggregate(pipeline), None)
+        if not result:
+            return empty
+
+        totals = result['totals'][0] if result['totals'] else {}
+        lent = float(totals.get('lent', 0.0))
+        recovered = float(totals.get('recovered', 0.0))
+        return {
+            'lent': lent,
+            'recovered': recovered,
+            'outstanding': lent - recovered,
+            'active_count': int(totals.get('active_count', 0)),
+            'status_counts': {row['_id']: row['count'] for row in result['statuses']}
+        }
+
+    except Exception as e:
+        print(f"Database Error: Failed to compute portfolio summary: {e}")
+        return empty
+
+def get_aging_totals():
+    """
+    Loans being repaid grouped by the aging_bucket stored by aging_engine.py:
+    one row per bucket with loans, outstanding and arrears.
+    Loans that have not been aged yet are grouped under None.
+    """
+    global db
+    if db is None: return []
+
+    try:
+        return list(db['loans'].aggregate([
+            {'$match': {'status': {'$in': REPAYING_STATUSES}, 'is_deleted': NOT_DELETED}},
+            {'$group': {
+                '_id': '$aging_bucket',
+                'loans': {'$sum': 1},
+                'outstanding': {'$sum': {'$max': [{'$ifNull': ['$remaining_balance', 0]}, 0]}},
+                'arrears': {'$sum': {'$ifNull': ['$arrears_amount', 0]}}
+            }}
+        ]))
+    except Exception as e:
+        print(f"Database Error: Failed to compute aging totals: {e}")
+        return []
+
+def _snapshot_pipeline(day):
+    """
+    Aggregation producing the portfolio snapshot documents for `day`: one per
+    loan type and one for all types. Figures use the same definitions as
+    get_portfolio_summary(); a loan is overdue when it is being repaid and its
+    next payment fell before `day` (due that day is not yet overdue, as in
+    get_overdue_loans()).
+    """
+    day = datetime.datetime.combine(day, datetime.time())
+    day_end = day + datetime.timedelta(days=1)
+    status = {'$ifNull': ['$status', 'Pending']}
+    is_overdue = {'$and': [
+        {'$in': [status, REPAYING_STATUSES]},
+        {'$ne': ['$is_deleted', True]},
+        {'$eq': [{'$type': '$next_payment'}, 'date']},
+        {'$lt': ['$next_payment', day]}
+    ]}
+    # Second-level grouping shared by the per-type and all-types branches
+    def rollup(group_id):
+        return [
+            {'$group': {
+                '_id': group_id,
+                'disbursed': {'$sum': '$disbursed'},
+                'collected': {'$sum': '$collected'},
+                'overdue_count': {'$sum': '$overdue_count'},
+                'overdue_amount': {'$sum': '$overdue_amount'},
+                'active_count': {'$sum': {'$cond': [{'$in': ['$_id.status', CLOSED_STATUSES]}, 0, '$count']}},
+                'statuses': {'$push': {'k': '$_id.status', 'v': '$count'}}
+            }},
+        ]
+
+    return [
+        {'$match': {'application_date': {'$lt': day_end}}},
+        {'$group': {
+            '_id': {'loan_type': {'$ifNull': ['$loan_type', 'Unspecified']}, 'status': status},
+            'count': {'$sum': 1},
+            'disbursed': {'$sum': {'$toDouble': {'$ifNull': ['$loan_amount', 0]}}},
+            'collected': {'$sum': {'$ifNull': ['$total_paid', 0]}},
+            'overdue_count': {'$sum': {'$cond': [is_overdue, 1, 0]}},
+            'overdue_amount': {'$sum': {'$cond': [is_overdue, {'$ifNull': ['$remaining_balance', 0]}, 0]}}
+        }},
+        {'$facet': {
+            'by_type': rollup('$_id.loan_type'),
+            'all_types': rollup(SNAPSHOT_ALL_TYPES)
+        }},
+        {'$project': {'rows': {'$concatArrays': ['$by_type', '$all_types']}}},
+        {'$unwind': '$rows'},
+        {'$replaceRoot': {'newRoot': '$rows'}},
+        {'$project': {
+            '_id': {'date': day, 'loan_type': '$_id'},
+            'date': day,
+            'loan_type': '$_id',
+            'disbursed': 1,
+            'collected': 1,
+            'outstanding': {'$subtract': ['$disbursed', '$collected']},
+            'active_count': 1,
+            'status_counts': {'$arrayToObject': '$statuses'},
+            'overdue_count': 1,
+            'overdue_amount': 1,
+            'computed_at': '$$NOW'
+        }}
+    ]
+
+def compute_portfolio_snapshot(day=None):
+    """Computes today's (or `day`'s) snapshot documents live, without storing them."""
+    global db
+    if db is None: return []
+
+    try:
+        return list(db['loans'].aggregate(_snapshot_pipeline(day or datetime.date.today())))
+    except Exception as e:
+        print(f"Database Error: Failed to compute portfolio snapshot: {e}")
+        return []
+
+def save_portfolio_snapshot(day=None):
+    """
+    Materializes the snapshot for `day` (default today) into
+    SNAPSHOT_COLLECTION with $merge, replacing any earlier run for that day.
+    Returns the number of snapshot documents for the day, or None on failure.
+    """
+    global db
+    if db is None: return None
+
+    day = day or datetime.date.today()
+    try:
+        pipeline = _snapshot_pipeline(day) + [{'$merge': {
+            'into': SNAPSHOT_COLLECTION,
+            'on': '_id',
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert'
+        }}]
+        db['loans'].aggregate(pipeline)
+        return db[SNAPSHOT_COLLECTION].count_documents({'date': datetime.datetime.combine(day, datetime.time())})
+    except Exception as e:
+        print(f"Database Error: Failed to save portfolio snapshot: {e}")
+        return None
+
+def get_portfolio_snapshots(start_date, end_date=None, loan_type=SNAPSHOT_ALL_TYPES):
+    """Stored snapshots for one loan type with date in [start_date, end_date), oldest first."""
+    global db
+    if db is None: return []
+
+    try:
+        query = {'loan_type': loan_type, 'date': {'$gte': start_date}}
+        if end_date: query['date']['$lt'] = end_date
+        return list(db[SNAPSHOT_COLLECTION].find(query).sort('date', 1))
+    except Exception as e:
+        print(f"Database Error: Failed to read portfolio snapshots: {e}")
+        return []
+
+def count_logs(start_date=None, end_date=None):
+    """Number of activity log entries with a timestamp in [start_date, end_date)."""
+    global db
+    if db is None: return 0
+
+    try:
+        return db['logs'].count_documents(_log_range_query(start_date, end_date))
+    except Exception as e:
+        print(f"Database Error: Failed to count logs: {e}")
+        return 0
+
+def iter_logs(start_date=None, end_date=None, batch_size=1000):
+    """
+    Yields activity log entries with a timestamp in [start_date, end_date),
+    oldest first, from a batched cursor so callers never hold the whole range.
+    """
+    global db
+    if db is None: return
+
+    try:
+        cursor = (db['logs'].find(_log_range_query(start_date, end_date),
+                                  {'timestamp': 1, 'user': 1, 'action': 1, 'details': 1})
+                            .sort('timestamp', 1)
+                            .batch_size(batch_size))
+        with cursor:
+            for entry in cursor:
+                yield entry
+    except Exception as e:
+        print(f"Database Error: Failed to read logs: {e}")
+
+def iter_log_rollups(start_date=None, end_date=None):
+    """Daily per-user/per-action counts of archived log entries with date in [start_date, end_date), oldest first."""
+    global db
+    if db is None: return
+
+    try:
+        query = {}
+        if start_date or end_date:
+            query['date'] = {}
+            if start_date: query['date']['$gte'] = datetime.datetime.combine(start_date.date(), datetime.time())
+            if end_date: query['date']['$lt'] = end_date
+        cursor = db[LOG_ROLLUP_COLLECTION].find(query).sort([('date', 1), ('user', 1), ('action', 1)])
+        with cursor:
+            for rollup in cursor:
+                yield rollup
+    except Exception as e:
+        print(f"Database Error: Failed to read log rollups: {e}")
+
+def _log_range_query(start_date, end_date, user=None, action=None):
+    query = {}
+    if user: query['user'] = user
+    if action: query['action'] = action
+    if start_date or end_date:
+        query['timestamp'] = {}
+        if start_date: query['timestamp']['$gte'] = start_date
+        if end_date: query['timestamp']['$lt'] = end_date
+    return query
+
+def get_logs_page(user=None, action=None, start_date=None, end_date=None, limit=100, after=None):
+    """
+    Returns one page of activity log entries, newest first, and the cursor for
+    the next page: (logs, next_cursor). Exact user/action matches and the
+    timestamp range are served by the (user | action, timestamp, _id) indexes.
+
+    after is the (timestamp, _id) pair returned by the previous call.
+    """
+    global db
+    if db is None: return [], None
+
+    try:
+        query = _log_range_query(start_date, end_date, user, action)
+        if after:
+            last_ts, last_id = after
+            query['$or'] = [
+                {'timestamp': {'$lt': last_ts}},
+                {'timestamp': last_ts, '_id': {'$lt': last_id}}
+            ]
+
+        logs = list(db['logs'].find(query, {'timestamp': 1, 'user': 1, 'action': 1, 'details': 1})
+                              .sort([('timestamp', -1), ('_id', -1)])
+                              .limit(limit))
+        next_cursor = None
+        if len(logs) == limit:
+            next_cursor = (logs[-1]['timestamp'], logs[-1]['_id'])
+        return logs, next_cursor
+
+    except Exception as e:
+        print(f"Database Error: Failed to retrieve logs page: {e}")
+        return [], None
+
+def estimate_log_count(user=None, action=None, start_date=None, end_date=None):
+    """
+    Number of log entries matching the filters as (count, exact). Without
+    filters this is the collection's metadata count; filtered counts stop at
+    LOG_COUNT_LIMIT, in which case exact is False.
+    """
+    global db
+    if db is None: return 0, True
+
+    try:
+        query = _log_range_query(start_date, end_date, user, action)
+        if not query:
+            return db['logs'].estimated_document_count(), False
+        count = db['logs'].count_documents(query, limit=LOG_COUNT_LIMIT)
+        return count, count < LOG_COUNT_LIMIT
+    except Exception as e:
+        print(f"Database Error: Failed to count logs: {e}")
+        return 0, True
+
+def get_log_filter_values():
+    """Distinct users and actions in the activity log, for the audit filters (both index-only)."""
+    global db
+    if db is None: return [], []
+
+    try:
+        return sorted(filter(None, db['logs'].distinct('user'))), sorted(filter(None, db['logs'].distinct('action')))
+    except Exception as e:
+        print(f"Database Error: Failed to read log filters: {e}")
+        return [], []
+
 def update_loan_status(loan_id, status):
     """Updates the status of a loan in the 'loans' collection."""
     global db
@@ -190,8 +1212,9 @@ def update_loan_status(loan_id, status):
             {'_id': query_id}, 
             {'$set': {'status': status}}
         )
+        loan_cache.invalidate(loan_id)
         
-        return result.modified_count > 0
+        return result.matched_count > 0
         
     except Exception as e:
         print(f"Database Error: Failed to update loan status for {loan_id}: {e}")
@@ -199,10 +1222,23 @@ def update_loan_status(loan_id, status):
         
 # --- NEW FUNCTIONS FOR LoanDetailsViewer ---
 
-def get_loan_by_id(loan_id):
-    """Retrieves a single loan document by its unique ID."""
+def get_loan_by_id(loan_id, fields=None, cached_only=False):
+    """
+    Retrieves a single loan document by its unique ID.
+    Answers from the client-side loan cache when possible; pass `fields` when
+    only some fields are needed so documents seeded by list queries qualify.
+    With cached_only, a cache miss returns None instead of querying, so the
+    call is safe on the Tk thread.
+    """
     global db
     if db is None: return None
+
+    cached = loan_cache.get(loan_id, fields)
+    if cached is not None:
+        cached['_id'] = str(cached['_id'])
+        return cached
+    if cached_only:
+        return None
     
     try:
         # Convert string ID to ObjectId for lookup in the 'loans' collection
@@ -210,9 +1246,11 @@ def get_loan_by_id(loan_id):
         
         loan = db['loans'].find_one({'_id': query_id})
         
-        if loan and isinstance(loan.get('_id'), ObjectId):
-            # Convert ObjectId back to string for GUI display consistency
-            loan['_id'] = str(loan['_id'])
+        if loan:
+            loan_cache.put(loan)
+            if isinstance(loan.get('_id'), ObjectId):
+                # Convert ObjectId back to string for GUI display consistency
+                loan['_id'] = str(loan['_id'])
         
         return loan
         
@@ -221,7 +1259,10 @@ def get_loan_by_id(loan_id):
         return None
 
 def update_loan_details(loan_id, updated_data):
-    """Updates multiple fields of a specific loan document."""
+    """
+    Updates multiple fields of a specific loan document. Returns True when the
+    loan was found (even if the values were already set), False otherwise.
+    """
     global db
     if db is None: return False
     
@@ -233,6 +1274,15 @@ def update_loan_details(loan_id, updated_data):
             {'_id': query_id}, 
             {'$set': updated_data}
         )
+
+        if 'loan_amount' in updated_data:
+            # Keep the denormalized balance consistent with the new principal
+            db['loans'].update_one(
+                {'_id': query_id},
+                [{'$set': {'remaining_balance': {
+                    '$subtract': ['$loan_amount', {'$ifNull': ['$total_paid', 0]}]}}}]
+            )
+        loan_cache.invalidate(loan_id)
         
         return result.modified_count > 0
         
@@ -240,6 +1290,64 @@ def update_loan_details(loan_id, updated_data):
         print(f"Database Error: Failed to update loan details for {loan_id}: {e}")
         return False
 
+def set_loan_deleted(loan_id, deleted):
+    """Moves a loan to the recycle bin (deleted=True) or restores it."""
+    return update_loan_details(loan_id, {'is_deleted': bool(deleted)})
+
+def delete_loan_permanently(loan_id):
+    """Removes a loan document for good."""
+    global db
+    if db is None: return False
+
+    try:
+        query_id = ObjectId(loan_id) if is_valid_object_id(loan_id) else loan_id
+        result = db['loans'].delete_one({'_id': query_id})
+        db[INSTALLMENT_COLLECTION].delete_many({'loan_id': query_id})
+        loan_cache.invalidate(loan_id)
+        return result.deleted_count > 0
+
+    except Exception as e:
+        print(f"Database Error: Failed to delete loan {loan_id}: {e}")
+        return False
+
+def get_installments(loan_id):
+    """The stored installment schedule of a loan, in installment order."""
+    global db
+    if db is None: return []
+
+    try:
+        return list(db[INSTALLMENT_COLLECTION].find({'loan_id': {'$in': loan_id_variants(loan_id)}},
+                                                    {'_id': 0}).sort('number', 1))
+    except Exception as e:
+        print(f"Database Error: Failed to fetch installments for {loan_id}: {e}")
+        return []
+
+def replace_installments(loan_ids, installments, loan_updates=None):
+    """
+    Replaces the stored schedules of loan_ids with `installments` and sets
+    loan_updates ({loan _id: fields}) on the loans themselves. Returns the
+    number of installments written, or None on failure.
+    """
+    global db
+    if db is None: return None
+
+    try:
+        from pymongo import UpdateOne
+
+        db[INSTALLMENT_COLLECTION].delete_many({'loan_id': {'$in': list(loan_ids)}})
+        if installments:
+            db[INSTALLMENT_COLLECTION].insert_many(installments, ordered=False)
+        ops = [UpdateOne({'_id': lid}, {'$set': fields}) for lid, fields in (loan_updates or {}).items()]
+        if ops:
+            db['loans'].bulk_write(ops, ordered=False)
+        for lid in loan_ids:
+            loan_cache.invalidate(lid)
+        return len(installments)
+
+    except Exception as e:
+        print(f"Database Error: Failed to store installment schedules: {e}")
+        return None
+
 
 # Establish connection when the module is imported
 connect_to_db()
\ No newline at end of file
@@ -0,0 +1,415 @@
+"""
+Database administration CLI for the Loan Management System.
+
+Schema changes (collections and indexes) are applied here once, as numbered
+migrations, instead of on every application start. Run it from an admin
+workstation after installing or upgrading:
+
+    python db_admin.py status      # show current and expected schema version
+    python db_admin.py migrate     # apply all pending migrations
+    python db_admin.py reconcile   # rebuild loan balances from the payments collection
+    python db_admin.py snapshot    # store today's portfolio snapshot
+    python db_admin.py schedules   # rebuild installment schedules from loan terms
+    python db_admin.py aging       # age the book into PAR buckets
+    python db_admin.py retention   # roll up, archive and remove old audit log entries
+    python db_admin.py restore-logs log_archive/<file>.jsonl.gz
+    python db_admin.py agreements --out agreements   # Word agreements for approved loans
+    python db_admin.py import loans|payments <file.csv|file.xlsx>   # bulk import legacy records
+    python db_admin.py statement <file> --method "Mobile Money"      # match and post a statement
+
+Schedule `snapshot` once a day, late in the evening, e.g. with cron
+(55 23 * * * python db_admin.py snapshot) or Windows Task Scheduler. Each run
+records the portfolio as it stands at that moment and replaces any earlier
+snapshot for the same day. Schedule `aging` daily as well, shortly after
+midnight (5 0 * * *), so the Reports PAR tab starts each day current, and
+`retention` once a day or week.
+"""
+import argparse
+import datetime
+import sys
+
+import database
+import schedule_engine
+import aging_engine
+import log_retention
+import agreement_docs
+import bulk_import
+import statement_reconciler
+from pymongo import UpdateOne, UpdateMany
+from pymongo.errors import OperationFailure, DuplicateKeyError
+
+
+# --- MIGRATIONS ---
+# Each migration receives the live database handle. They must be safe to re-run
+# (create_index and create_collection are idempotent when guarded).
+
+def _ensure_collections(db, names):
+    """Creates any missing collections with a single list_collection_names() call."""
+    existing = set(db.list_collection_names())
+    for name in names:
+        if name not in existing:
+            # This implicitly creates the collection and the mandatory unique _id index
+            db.create_collection(name)
+            print(f"Collection '{name}' created.")
+
+
+def migration_001_initial_schema(db):
+    """Primary collections and the original query indexes."""
+    _ensure_collections(db, ['loans', 'users', 'payments', 'logs'])
+
+    db['loans'].create_index([("customer_name", 1)])
+    db['loans'].create_index([("status", 1)])
+    db['payments'].create_index([("loan_id", 1)])
+    db['payments'].create_index([("payment_date", -1)])
+
+    # Index for logs to ensure fast sorting in the Analytics/Reports window
+    db['logs'].create_index([("timestamp", -1)])
+
+
+def migration_002_log_timestamps_as_dates(db):
+    """Converts legacy 'YYYY-MM-DD HH:MM:SS' log timestamps to real dates for range queries."""
+    result = db['logs'].update_many(
+        {'timestamp': {'$type': 'string'}},
+        [{'$set': {'timestamp': {'$dateFromString': {
+            'dateString': '$timestamp',
+            'format': '%Y-%m-%d %H:%M:%S',
+            'onError': '$timestamp'
+        }}}}]
+    )
+    print(f"Converted {result.modified_count} log timestamps.")
+
+
+def migration_003_loan_running_balance(db):
+    """Backfills the denormalized balance fields on every loan from its payments."""
+    updated = database.reconcile_loan_balances()
+    print(f"Reconciled balances on {updated} loans.")
+
+
+def migration_004_application_date_index(db):
+    """Index for date-ranged portfolio reports."""
+    db['loans'].create_index([("application_date", -1)])
+
+
+def _string_dates_to_dates(db, field):
+    """Converts 'YYYY-MM-DD' strings in loans.<field> to dates and drops 'N/A' placeholders."""
+    converted = db['loans'].update_many(
+        {field: {'$type': 'string', '$regex': r'^\d{4}-\d{2}-\d{2}'}},
+        [{'$set': {field: {'$dateFromString': {
+            'dateString': {'$substrBytes': [f'${field}', 0, 10]},
+            'format': '%Y-%m-%d',
+            'onError': f'${field}'
+        }}}}]
+    )
+    db['loans'].update_many({field: {'$in': ['N/A', '']}}, {'$unset': {field: ''}})
+    print(f"Converted {converted.modified_count} '{field}' values to dates.")
+
+
+def migration_005_overdue_index(db):
+    """Stores due dates as dates and indexes them for the overdue query."""
+    _string_dates_to_dates(db, 'next_payment')
+    _string_dates_to_dates(db, 'final_completion_date')
+    db['loans'].update_many({'is_deleted': {'$exists': False}}, {'$set': {'is_deleted': False}})
+    db['loans'].create_index([("is_deleted", 1), ("status", 1), ("next_payment", 1)])
+
+
+def migration_006_customer_name_key(db, batch_size=1000):
+    """Backfills the normalized customer_name_key used by search-as-you-type and indexes it."""
+    ops = []
+    updated = 0
+    for loan in db['loans'].find({}, {'customer_name': 1, 'customer_name_key': 1}):
+        key = database.normalize_name_key(loan.get('customer_name'))
+        if loan.get('customer_name_key') != key:
+            ops.append(UpdateOne({'_id': loan['_id']}, {'$set': {'customer_name_key': key}}))
+        if len(ops) >= batch_size:
+            updated += db['loans'].bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        updated += db['loans'].bulk_write(ops, ordered=False).modified_count
+    db['loans'].create_index([("customer_name_key", 1)])
+    print(f"Set customer_name_key on {updated} loans.")
+
+
+def migration_007_portfolio_snapshots(db):
+    """Collection for the daily portfolio snapshots read by the Reports trends tab."""
+    _ensure_collections(db, [database.SNAPSHOT_COLLECTION])
+    db[database.SNAPSHOT_COLLECTION].create_index([("loan_type", 1), ("date", 1)])
+
+
+def migration_008_installments(db):
+    """Installment schedules for every approved loan, built from the loans' current terms."""
+    _ensure_collections(db, [database.INSTALLMENT_COLLECTION])
+    db[database.INSTALLMENT_COLLECTION].create_index([("loan_id", 1), ("number", 1)], unique=True)
+    db[database.INSTALLMENT_COLLECTION].create_index([("due_date", 1)])
+    scheduled = schedule_engine.recompute_schedules()
+    print(f"Built installment schedules for {len(scheduled)} loans.")
+
+
+def migration_009_log_browser_indexes(db):
+    """Compound indexes behind the keyset-paginated audit log browser."""
+    db['logs'].create_index([("timestamp", -1), ("_id", -1)])
+    db['logs'].create_index([("user", 1), ("timestamp", -1), ("_id", -1)])
+    db['logs'].create_index([("action", 1), ("timestamp", -1), ("_id", -1)])
+    # Superseded by the (timestamp, _id) index above
+    try:
+        db['logs'].drop_index([("timestamp", -1)])
+    except OperationFailure:
+        pass
+
+
+def migration_010_log_rollups(db):
+    """Daily per-user/per-action totals kept for audit log entries past retention."""
+    _ensure_collections(db, [database.LOG_ROLLUP_COLLECTION])
+    db[database.LOG_ROLLUP_COLLECTION].create_index([("date", 1), ("user", 1), ("action", 1)])
+
+
+def migration_011_import_keys(db):
+    """Lookups behind the bulk importer and the NIN check, and the key that makes payment imports idempotent."""
+    db['loans'].create_index([("loan_id", 1)])
+    db['loans'].create_index([("nin_number", 1)])
+    db['payments'].create_index([("import_key", 1)], unique=True,
+                                partialFilterExpression={'import_key': {'$exists': True}})
+
+
+def migration_012_statement_review(db):
+    """Review queue for unmatched statement lines and the payer numbers learned from it."""
+    _ensure_collections(db, [database.STATEMENT_REVIEW_COLLECTION, database.PAYER_COLLECTION])
+    db[database.STATEMENT_REVIEW_COLLECTION].create_index([("status", 1), ("date", 1), ("line", 1)])
+
+
+def migration_013_customers(db, batch_size=1000):
+    """
+    Customer registry keyed by NIN, backfilled from the loans. Each NIN's
+    customer takes the name of its earliest application (the one the identity
+    check has been comparing against) and the collateral of its latest one.
+    Loans are then linked to their customer through customer_id.
+    """
+    _ensure_collections(db, [database.CUSTOMER_COLLECTION])
+    customers = db[database.CUSTOMER_COLLECTION]
+    customers.create_index([("nin_number", 1)], unique=True)
+    customers.create_index([("name_key", 1)])
+
+    db['loans'].aggregate([
+        {'$match': {'nin_number': {'$type': 'string', '$ne': ''}}},
+        {'$sort': {'application_date': 1}},
+        {'$group': {
+            '_id': '$nin_number',
+            'name': {'$first': '$customer_name'},
+            'name_key': {'$first': '$customer_name_key'},
+            'created_date': {'$first': '$application_date'},
+            'last_collateral': {'$last': '$collateral'},
+            'last_application_date': {'$last': '$application_date'},
+        }},
+        {'$project': {'_id': 0, 'nin_number': '$_id', 'name': 1, 'name_key': 1, 'created_date': 1,
+                      'last_collateral': 1, 'last_application_date': 1}},
+        {'$merge': {'into': database.CUSTOMER_COLLECTION, 'on': 'nin_number',
+                    'whenMatched': 'keepExisting', 'whenNotMatched': 'insert'}}
+    ], allowDiskUse=True)
+
+    ops = []
+    linked = 0
+    for customer in customers.find({}, {'nin_number': 1}):
+        ops.append(UpdateMany({'nin_number': customer['nin_number'], 'customer_id': {'$ne': customer['_id']}},
+                              {'$set': {'customer_id': customer['_id']}}))
+        if len(ops) >= batch_size:
+            linked += db['loans'].bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        linked += db['loans'].bulk_write(ops, ordered=False).modified_count
+    db['loans'].create_index([("customer_id", 1)])
+    print(f"Registered {customers.estimated_document_count()} customers; linked {linked} loans.")
+
+
+def migration_014_unique_loan_ids(db):
+    """
+    Makes loan_id unique, replacing the plain index from migration 011, and
+    creates the counters the loan number allocator reserves from. Stops
+    without changes if duplicate loan ids already exist; fix those and rerun.
+    """
+    _ensure_collections(db, [database.COUNTER_COLLECTION])
+    # Loans without a loan id (very old records) are left out of the unique index
+    has_loan_id = {'loan_id': {'$type': 'string'}}
+    duplicates = list(db['loans'].aggregate([
+        {'$match': has_loan_id},
+        {'$group': {'_id': '$loan_id', 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}},
+        {'$limit': 20}
+    ], allowDiskUse=True))
+    if duplicates:
+        for dup in duplicates:
+            print(f"  {dup['_id']}: {dup['count']} loans")
+        raise OperationFailure("Loan ids listed above are used by more than one loan.")
+
+    try:
+        db['loans'].drop_index("loan_id_1")
+    except OperationFailure:
+        pass
+    db['loans'].create_index([("loan_id", 1)], unique=True, partialFilterExpression=has_loan_id)
+
+
+# Ordered list of (version, description, function). The last version must
+# match database.SCHEMA_VERSION.
+MIGRATIONS = [
+    (1, "Initial collections and indexes", migration_001_initial_schema),
+    (2, "Store log timestamps as dates", migration_002_log_timestamps_as_dates),
+    (3, "Running balance fields on loans", migration_003_loan_running_balance),
+    (4, "Index loans by application date", migration_004_application_date_index),
+    (5, "Date-typed due dates and overdue index", migration_005_overdue_index),
+    (6, "Normalized customer name search key", migration_006_customer_name_key),
+    (7, "Daily portfolio snapshots", migration_007_portfolio_snapshots),
+    (8, "Installment schedules", migration_008_installments),
+    (9, "Audit log browser indexes", migration_009_log_browser_indexes),
+    (10, "Audit log rollups", migration_010_log_rollups),
+    (11, "Bulk import lookups and payment import keys", migration_011_import_keys),
+    (12, "Statement reconciliation review queue", migration_012_statement_review),
+    (13, "Customer registry keyed by NIN", migration_013_customers),
+    (14, "Unique loan ids and loan number counters", migration_014_unique_loan_ids),
+]
+
+
+def run_migrations(db):
+    """Applies every migration newer than the recorded schema version, in order."""
+    current = database.get_schema_version()
+    pending = [m for m in MIGRATIONS if m[0] > current]
+    if not pending:
+        print(f"Schema is up to date (version {current}).")
+        return current
+
+    for version, description, func in pending:
+        print(f"Applying migration {version}: {description} ...")
+        try:
+            func(db)
+        except OperationFailure as e:
+            print(f"Migration {version} failed: {e}")
+            return current
+
+        # Only advance from the version we started at, so two admins running
+        # the tool at the same time cannot record a step twice. On a fresh
+        # database the first admin creates the schema document; the second
+        # one's upsert then collides with it on _id.
+        guard = {'_id': 'schema', 'version': current if current else {'$exists': False}}
+        try:
+            result = db[database.SCHEMA_COLLECTION].update_one(
+                guard,
+                {'$set': {'version': version},
+                 '$push': {'history': {'version': version,
+                                       'description': description,
+                                       'applied_at': datetime.datetime.now()}}},
+                upsert=not current
+            )
+            advanced = result.matched_count > 0 or result.upserted_id is not None
+        except DuplicateKeyError:
+            advanced = False
+        if not advanced:
+            print(f"Schema version changed during migration {version}; another admin may be migrating. Stopping.")
+            return database.get_schema_version()
+        current = version
+
+    print(f"Schema migrated to version {current}.")
+    return current
+
+
+def show_status():
+    current = database.get_schema_version()
+    print(f"Database:         {database.DATABASE_NAME}")
+    print(f"Schema version:   {current}")
+    print(f"Expected version: {database.SCHEMA_VERSION}")
+    for version, description, _ in MIGRATIONS:
+        state = "applied" if version <= current else "pending"
+        print(f"  [{state:>7}] {version:03d} {description}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Loan Management System database administration")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Show schema version and pending migrations")
+    sub.add_parser("migrate", help="Apply pending schema migrations")
+    reconcile = sub.add_parser("reconcile", help="Rebuild loan balance fields from payments")
+    reconcile.add_argument("loan_ids", nargs="*", help="Limit to these loan _ids (default: all loans)")
+    sub.add_parser("snapshot", help="Store today's portfolio snapshot (run daily)")
+    schedules = sub.add_parser("schedules", help="Rebuild installment schedules from loan terms")
+    schedules.add_argument("loan_ids", nargs="*", help="Limit to these loan _ids (default: all approved loans)")
+    sub.add_parser("aging", help="Age active loans into PAR buckets (run daily)")
+    retention = sub.add_parser("retention", help="Roll up, archive and remove old audit log entries")
+    retention.add_argument("--days", type=int, default=database.LOG_RETENTION_DAYS,
+                           help=f"Days of raw entries to keep (default {database.LOG_RETENTION_DAYS})")
+    retention.add_argument("--archive-dir", default=database.LOG_ARCHIVE_DIR,
+                           help=f"Where archive files are written (default {database.LOG_ARCHIVE_DIR})")
+    restore = sub.add_parser("restore-logs", help="Load archived audit log entries back into the logs collection")
+    restore.add_argument("files", nargs="+", help="Archive files written by the retention command")
+    agreements = sub.add_parser("agreements", help="Generate Word loan agreements in bulk")
+    agreements.add_argument("loan_ids", nargs="*", help="Limit to these loan _ids (default: all approved loans)")
+    agreements.add_argument("--out", default="agreements", help="Output directory (default agreements)")
+    agreements.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    importer = sub.add_parser("import", help="Bulk import loans or payments from a CSV or XLSX file")
+    importer.add_argument("kind", choices=bulk_import.IMPORT_KINDS)
+    importer.add_argument("file", help="CSV or XLSX file with a header row")
+    importer.add_argument("--chunk", type=int, default=bulk_import.CHUNK_SIZE,
+                          help=f"Rows per bulk write (default {bulk_import.CHUNK_SIZE})")
+    importer.add_argument("--ordered", action="store_true", help="Write each chunk in file order")
+    importer.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the top")
+    statement = sub.add_parser("statement", help="Match a Mobile Money or bank statement to loans and post it")
+    statement.add_argument("file", help="CSV or XLSX statement with a header row")
+    statement.add_argument("--method", choices=statement_reconciler.PAYMENT_METHODS,
+                           default=statement_reconciler.PAYMENT_METHODS[0], help="Payment method recorded")
+
+    args = parser.parse_args(argv)
+
+    if database.db is None:
+        print("Database not connected. Check MONGO_URI in database.py.")
+        return 1
+
+    if args.command == "status":
+        show_status()
+    elif args.command == "migrate":
+        run_migrations(database.db)
+    elif args.command == "reconcile":
+        updated = database.reconcile_loan_balances(args.loan_ids or None)
+        print(f"Reconciled balances on {updated} loans.")
+    elif args.command == "snapshot":
+        saved = database.save_portfolio_snapshot()
+        if saved is None:
+            return 1
+        print(f"Stored {saved} snapshot documents for {datetime.date.today()}.")
+    elif args.command == "schedules":
+        scheduled = schedule_engine.recompute_schedules(args.loan_ids or None)
+        print(f"Rebuilt installment schedules for {len(scheduled)} loans.")
+    elif args.command == "aging":
+        aged, changed = aging_engine.run_aging()
+        print(f"Aged {aged} loans ({changed} changed bucket or arrears).")
+    elif args.command == "retention":
+        path, removed = log_retention.run_retention(args.days, args.archive_dir)
+        if path:
+            print(f"Archived and removed {removed} log entries older than {args.days} days to {path}.")
+        else:
+            print(f"No log entries older than {args.days} days.")
+    elif args.command == "restore-logs":
+        for path in args.files:
+            print(f"{path}: restored {log_retention.restore_archive(path)} log entries.")
+    elif args.command == "agreements":
+        written, failed = agreement_docs.render_agreements(args.loan_ids or None, args.out, args.workers)
+        for loan_id, error in failed.items():
+            print(f"  {loan_id}: {error}")
+        print(f"Wrote {len(written)} agreements to {args.out} ({len(failed)} failed).")
+        return 1 if failed else 0
+    elif args.command == "import":
+        if database.get_schema_version() < 11:
+            print("Run 'python db_admin.py migrate' first; imports rely on the import_key index.")
+            return 1
+        totals = bulk_import.run_import(args.kind, args.file, args.chunk, args.ordered, args.restart)
+        print(f"Imported {totals['written']:,} {args.kind} in {totals['seconds']:.1f}s "
+              f"({totals['rows'] / totals['seconds'] if totals['seconds'] else 0:,.0f} rows/s); "
+              f"{totals['present']:,} already present, {totals['rejected']:,} rejected.")
+        if totals['rejected']:
+            print(f"Rejected rows: {args.file}{bulk_import.REJECTED_SUFFIX}")
+    elif args.command == "statement":
+        if database.get_schema_version() < 12:
+            print("Run 'python db_admin.py migrate' first.")
+            return 1
+        totals = statement_reconciler.reconcile_statement(args.file, args.method)
+        print(f"{totals['lines']:,} lines in {totals['seconds']:.1f}s: {totals['posted']:,} posted, "
+              f"{totals['queued']:,} queued for review, {totals['skipped']:,} already handled.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
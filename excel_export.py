@@ -0,0 +1,151 @@
+"""
+Streaming Excel export for the loan management screen.
+
+Rows are read from a batched MongoDB cursor and appended to an openpyxl
+write-only workbook, so memory use stays flat however many loans fall in the
+selected range. export_loans() is meant to run on a worker thread: it reports
+progress through a callback and stops when the cancel event is set.
+"""
+import os
+
+from bson.objectid import ObjectId
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+import database
+
+# Number of documents fetched from MongoDB per network round trip
+EXPORT_BATCH_SIZE = 1000
+# Progress is reported every this many rows to keep the UI queue small
+PROGRESS_EVERY = 500
+
+# (field, column heading) pairs written to each sheet, in column order
+LOAN_COLUMNS = [
+    ('_id', 'Record ID'),
+    ('loan_id', 'Loan Number'),
+    ('customer_name', 'Customer Name'),
+    ('nin_number', 'NIN'),
+    ('loan_type', 'Loan Type'),
+    ('loan_amount', 'Loan Amount'),
+    ('interest_rate', 'Interest Rate'),
+    ('return_amount', 'Return Amount'),
+    ('duration', 'Duration'),
+    ('payment_plan', 'Payment Plan'),
+    ('collateral', 'Collateral'),
+    ('status', 'Status'),
+    ('total_paid', 'Total Paid'),
+    ('remaining_balance', 'Remaining Balance'),
+    ('payment_count', 'Payments'),
+    ('last_payment_date', 'Last Payment'),
+    ('next_payment', 'Next Payment'),
+    ('final_completion_date', 'Final Completion'),
+    ('application_date', 'Application Date'),
+    ('is_deleted', 'In Recycle Bin'),
+    ('purpose', 'Purpose'),
+]
+
+PAYMENT_COLUMNS = [
+    ('_id', 'Payment ID'),
+    ('loan_id', 'Loan Record ID'),
+    ('customer_name', 'Customer Name'),
+    ('payment_date', 'Payment Date'),
+    ('payment_amount', 'Amount'),
+    ('payment_method', 'Method'),
+    ('received_by', 'Received By'),
+    ('next_payment_date', 'Next Payment Date'),
+    ('recorded_date', 'Recorded At'),
+]
+
+
+class ExportCancelled(Exception):
+    """Raised inside the export when the user presses Cancel."""
+
+
+def _cell_value(value):
+    """Converts a MongoDB value into something openpyxl can store."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(v) for v in value)
+    if isinstance(value, dict):
+        return str(value)
+    return value
+
+
+def _write_sheet(ws, cursor, columns, total, progress, cancel_event, label):
+    header_font = Font(bold=True)
+    header = []
+    for _, heading in columns:
+        cell = WriteOnlyCell(ws, value=heading)
+        cell.font = header_font
+        header.append(cell)
+    ws.append(header)
+
+    written = 0
+    for doc in cursor:
+        if cancel_event is not None and cancel_event.is_set():
+            raise ExportCancelled()
+        ws.append([_cell_value(doc.get(field)) for field, _ in columns])
+        written += 1
+        if progress and written % PROGRESS_EVERY == 0:
+            progress(label, written, total)
+
+    if progress:
+        progress(label, written, total)
+    return written
+
+
+def export_loans(file_path, start_dt, end_dt, include_payments=False, progress=None, cancel_event=None):
+    """
+    Writes loans applied for between start_dt and end_dt (and optionally the
+    payments made in that range) to file_path.
+
+    progress(label, rows_written, rows_total) is called periodically from the
+    calling thread. Returns a dict of row counts per sheet. Raises
+    ExportCancelled when cancel_event is set; the target file is only written
+    once every row has been read.
+    """
+    db = database.db
+    if db is None:
+        raise RuntimeError("Database not connected.")
+
+    loan_query = {"application_date": {"$gte": start_dt, "$lte": end_dt}}
+    loan_projection = {field: 1 for field, _ in LOAN_COLUMNS}
+    # Payment dates are stored as 'YYYY-MM-DD' strings, which sort chronologically
+    payment_query = {"payment_date": {"$gte": start_dt.strftime("%Y-%m-%d"),
+                                      "$lte": end_dt.strftime("%Y-%m-%d")}}
+    payment_projection = {field: 1 for field, _ in PAYMENT_COLUMNS}
+
+    wb = Workbook(write_only=True)
+    counts = {}
+    try:
+        ws = wb.create_sheet("Loans")
+        total = db['loans'].count_documents(loan_query)
+        cursor = (db['loans'].find(loan_query, loan_projection)
+                             .sort('application_date', 1)
+                             .batch_size(EXPORT_BATCH_SIZE))
+        with cursor:
+            counts['Loans'] = _write_sheet(ws, cursor, LOAN_COLUMNS, total, progress, cancel_event, "Loans")
+
+        if include_payments:
+            ws = wb.create_sheet("Payments")
+            total = db['payments'].count_documents(payment_query)
+            cursor = (db['payments'].find(payment_query, payment_projection)
+                                    .sort('payment_date', 1)
+                                    .batch_size(EXPORT_BATCH_SIZE))
+            with cursor:
+                counts['Payments'] = _write_sheet(ws, cursor, PAYMENT_COLUMNS, total, progress, cancel_event, "Payments")
+
+    except BaseException:
+        # Nothing has been written to file_path yet; drop the buffered rows
+        wb.close()
+        raise
+
+    try:
+        wb.save(file_path)
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return counts
@@ -1,14 +1,13 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from docx import Document 
-from docx.shared import Pt, Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from PIL import Image, ImageTk  # Required for previews
+from PIL import ImageTk  # Required for previews
 import database 
+import agreement_docs
+import loan_rules
+import schedule_engine
+import thumbnails
 import datetime
 import uuid
-import subprocess
-import sys
 import os
 
 # --- THEME & STYLE ---
@@ -21,28 +20,15 @@ DANGER_RED = "#c0392b"
 HOVER_RED = "#e74c3c"
 FONT_FAMILY = "Segoe UI" 
 
-# --- SESSION PERSISTENCE ---
-try:
-    CURRENT_USER_ROLE = sys.argv[1]
-    CURRENT_USER_NAME = sys.argv[2]
-except IndexError:
-    CURRENT_USER_ROLE = "Staff"
-    CURRENT_USER_NAME = "Guest"
-
-class LoanApplicationApp:
-    def __init__(self, root):
-        self.root = root
-        self.root.title(f"Loan Application - Logged in as: {CURRENT_USER_NAME}")
-        self.root.geometry("1150x850") 
-        self.root.configure(bg=BG_LIGHT)
-
-        try:
-            title_icon = tk.PhotoImage(file="bu logo.png")
-            self.root.iconphoto(True, title_icon)
-        except Exception:
-            pass
+class LoanApplicationApp(tk.Frame):
+    def __init__(self, parent, controller):
+        super().__init__(parent, bg=BG_LIGHT)
+        self.controller = controller
+        controller.title(f"Loan Application - Logged in as: {controller.current_user_name}")
+        controller.geometry("1150x850") 
 
         self.repayment_method_var = tk.StringVar(value="Monthly")
+        self.interest_method_var = tk.StringVar(value=schedule_engine.INTEREST_FLAT)
         self.terms_var = tk.IntVar()
         self.security_photos = [] # Store file paths
         self.preview_images = [] # Keep reference to images to prevent garbage collection
@@ -50,15 +36,15 @@ class LoanApplicationApp:
         self.setup_ui()
 
     def setup_ui(self):
-        header = tk.Frame(self.root, bg=PRIMARY_GREEN, height=100)
+        header = tk.Frame(self, bg=PRIMARY_GREEN, height=100)
         header.pack(fill="x", side="top")
         header.pack_propagate(False)
 
         tk.Label(header, text="OFFICIAL LOAN APPLICATION", font=(FONT_FAMILY, 24, "bold"), 
                  bg=PRIMARY_GREEN, fg="white").pack(pady=(25, 0))
 
-        self.main_canvas = tk.Canvas(self.root, bg=BG_LIGHT, highlightthickness=0)
-        self.scrollbar = ttk.Scrollbar(self.root, orient="vertical", command=self.main_canvas.yview)
+        self.main_canvas = tk.Canvas(self, bg=BG_LIGHT, highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.main_canvas.yview)
         self.scrollable_frame = tk.Frame(self.main_canvas, bg=BG_LIGHT)
 
         self.scrollable_frame.bind(
@@ -104,6 +90,10 @@ class LoanApplicationApp:
                 self.security_photos.extend(new_files)
             
             self.update_photo_label()
+            # Warm the thumbnail cache in the background so the preview opens instantly
+            for path in self.security_photos:
+                self.controller.tasks.submit(thumbnails.load_thumbnail, path, owner=self,
+                                             busy=False, on_error=lambda e: None)
 
     def update_photo_label(self):
         count = len(self.security_photos)
@@ -125,7 +115,7 @@ class LoanApplicationApp:
             messagebox.showinfo("Preview", "No photos attached to preview.")
             return
 
-        preview_win = tk.Toplevel(self.root)
+        preview_win = tk.Toplevel(self)
         preview_win.title("Security Photo Previews")
         preview_win.geometry("900x500")
         preview_win.configure(bg=BG_LIGHT)
@@ -135,31 +125,33 @@ class LoanApplicationApp:
         container = tk.Frame(preview_win, bg=BG_LIGHT, padx=20, pady=20)
         container.pack(fill="both", expand=True)
 
+        # Frames go up at once with a placeholder; each thumbnail is decoded (or read
+        # from the cache) on the task runner and dropped in as soon as it is ready
         for path in self.security_photos:
-            try:
-                img = Image.open(path)
-                img.thumbnail((200, 180)) 
-                tk_img = ImageTk.PhotoImage(img)
-                self.preview_images.append(tk_img) 
-
-                photo_frame = tk.Frame(container, bg="white", bd=1, relief="solid", padx=5, pady=5)
-                photo_frame.pack(side="left", padx=10, pady=10, anchor="n")
-                
-                lbl = tk.Label(photo_frame, image=tk_img, bg="white")
-                lbl.pack()
-                
-                # Truncate long filenames
-                fname = os.path.basename(path)
-                short_name = (fname[:15] + '..') if len(fname) > 17 else fname
-                tk.Label(photo_frame, text=short_name, font=(FONT_FAMILY, 8), bg="white").pack(pady=2)
-
-                del_btn = tk.Button(photo_frame, text="❌ REMOVE", bg=DANGER_RED, fg="white", 
-                                    font=(FONT_FAMILY, 7, "bold"), bd=0, cursor="hand2",
-                                    command=lambda p=path, f=photo_frame: self.remove_photo(p, f, preview_win))
-                del_btn.pack(fill="x", pady=2)
-
-            except Exception as e:
-                tk.Label(container, text=f"Error: {os.path.basename(path)}", fg="red").pack()
+            photo_frame = tk.Frame(container, bg="white", bd=1, relief="solid", padx=5, pady=5)
+            photo_frame.pack(side="left", padx=10, pady=10, anchor="n")
+            
+            lbl = tk.Label(photo_frame, text="Loading...", width=28, height=11, bg="#f1f2f6", fg="#7f8c8d")
+            lbl.pack()
+            
+            # Truncate long filenames
+            fname = os.path.basename(path)
+            short_name = (fname[:15] + '..') if len(fname) > 17 else fname
+            tk.Label(photo_frame, text=short_name, font=(FONT_FAMILY, 8), bg="white").pack(pady=2)
+
+            del_btn = tk.Button(photo_frame, text="❌ REMOVE", bg=DANGER_RED, fg="white", 
+                                font=(FONT_FAMILY, 7, "bold"), bd=0, cursor="hand2",
+                                command=lambda p=path, f=photo_frame: self.remove_photo(p, f, preview_win))
+            del_btn.pack(fill="x", pady=2)
+
+            self.controller.tasks.submit(thumbnails.load_thumbnail, path, owner=lbl,
+                                         on_done=lambda img, l=lbl: self._show_thumbnail(l, img),
+                                         on_error=lambda e, l=lbl: l.config(text="Error: cannot read image", fg="red"))
+
+    def _show_thumbnail(self, label, img):
+        tk_img = ImageTk.PhotoImage(img)
+        self.preview_images.append(tk_img)
+        label.config(image=tk_img, text="", width=tk_img.width(), height=tk_img.height(), bg="white")
 
     def build_form(self):
         self.create_label("NIN NUMBER (NATIONAL ID)", 0, 0)
@@ -218,8 +210,16 @@ class LoanApplicationApp:
         self.create_label("PAYMENT FREQUENCY", 6, 0)
         radio_frame = tk.Frame(self.card, bg="white")
         radio_frame.grid(row=7, column=0, sticky="w", padx=15)
-        tk.Radiobutton(radio_frame, text="Monthly", variable=self.repayment_method_var, value="Monthly", bg="white", font=(FONT_FAMILY, 12)).pack(side="left")
-        tk.Radiobutton(radio_frame, text="Weekly", variable=self.repayment_method_var, value="Weekly", bg="white", font=(FONT_FAMILY, 12)).pack(side="left", padx=20)
+        tk.Radiobutton(radio_frame, text="Monthly", variable=self.repayment_method_var, value="Monthly", bg="white", font=(FONT_FAMILY, 12),
+                       command=self.update_return_amount).pack(side="left")
+        tk.Radiobutton(radio_frame, text="Weekly", variable=self.repayment_method_var, value="Weekly", bg="white", font=(FONT_FAMILY, 12),
+                       command=self.update_return_amount).pack(side="left", padx=20)
+
+        self.create_label("INTEREST METHOD", 6, 1)
+        self.interest_method_combo = ttk.Combobox(self.card, textvariable=self.interest_method_var, values=schedule_engine.INTEREST_METHODS,
+                                                  font=(FONT_FAMILY, 13), state="readonly")
+        self.interest_method_combo.grid(row=7, column=1, sticky="ew", padx=15)
+        self.interest_method_combo.bind("<<ComboboxSelected>>", self.update_return_amount)
 
         self.create_label("PURPOSE OF LOAN", 8, 0, colspan=2)
         self.purpose_text = tk.Text(self.card, height=4, font=(FONT_FAMILY, 12), bd=1, relief="solid", padx=10, pady=10)
@@ -227,7 +227,7 @@ class LoanApplicationApp:
 
         self.total_frame = tk.Frame(self.card, bg="#f1f2f6", padx=30, pady=25)
         self.total_frame.grid(row=10, column=0, columnspan=2, sticky="ew", padx=15, pady=10)
-        tk.Label(self.total_frame, text="ESTIMATED TOTAL REPAYMENT (12% Interest)", font=(FONT_FAMILY, 10, "bold"), bg="#f1f2f6", fg=DARK_TEXT).pack(anchor="w")
+        tk.Label(self.total_frame, text=f"ESTIMATED TOTAL REPAYMENT ({schedule_engine.DEFAULT_ANNUAL_RATE:g}% Interest)", font=(FONT_FAMILY, 10, "bold"), bg="#f1f2f6", fg=DARK_TEXT).pack(anchor="w")
         self.return_amount_lbl = tk.Label(self.total_frame, text="0.00 RWF", font=(FONT_FAMILY, 28, "bold"), bg="#f1f2f6", fg=PRIMARY_GREEN)
         self.return_amount_lbl.pack(anchor="w")
 
@@ -254,43 +254,35 @@ class LoanApplicationApp:
         if not nin:
             messagebox.showwarning("Input Required", "Please enter a NIN number to search.")
             return
-        try:
-            prev_record = database.db['loans'].find_one({"nin_number": nin}, sort=[("application_date", -1)])
-            if prev_record:
-                self.name_entry.delete(0, tk.END)
-                self.name_entry.insert(0, prev_record.get("customer_name", ""))
-                collateral_val = prev_record.get("collateral", "")
-                if collateral_val in self.collateral_combo['values']:
-                    self.collateral_combo.set(collateral_val)
-                messagebox.showinfo("User Found", f"Records found for {prev_record.get('customer_name')}.")
-            else:
-                messagebox.showinfo("New Customer", "No existing records found for this NIN.")
-        except Exception as e:
-            messagebox.showerror("Search Error", f"Could not retrieve records: {e}")
+        self.controller.tasks.submit(
+            database.get_customer_by_nin, nin,
+            on_done=self._show_lookup_result, owner=self,
+            on_error=lambda e: messagebox.showerror("Search Error", f"Could not retrieve records: {e}"))
+
+    def _show_lookup_result(self, customer):
+        if customer:
+            self.name_entry.delete(0, tk.END)
+            self.name_entry.insert(0, customer.get("name", ""))
+            collateral_val = customer.get("last_collateral", "")
+            if collateral_val in self.collateral_combo['values']:
+                self.collateral_combo.set(collateral_val)
+            messagebox.showinfo("User Found", f"Records found for {customer.get('name')}.")
+        else:
+            messagebox.showinfo("New Customer", "No existing records found for this NIN.")
 
     def return_to_dashboard(self):
-        self.root.destroy()
-        try:
-            subprocess.Popen([sys.executable, "dashboard.py", CURRENT_USER_ROLE, CURRENT_USER_NAME])
-        except Exception:
-            messagebox.showerror("Error", "Could not find 'dashboard.py'.")
+        self.controller.show_frame("Dashboard")
 
     def handle_logout(self):
         if messagebox.askyesno("Logout", "Are you sure you want to sign out?"):
-            database.log_activity(CURRENT_USER_NAME, "Logout", "User signed out from Application form")
-            self.root.destroy()
-            try:
-                subprocess.Popen([sys.executable, "login.py"])
-            except Exception:
-                messagebox.showerror("Error", "Could not find 'login.py'.")
+            self.controller.logout("User signed out from Application form")
 
     def update_return_amount(self, event=None):
         try:
             amt_str = self.amount_entry.get().replace(',', '')
             amt = float(amt_str) if amt_str else 0
-            dur = self.duration_combo.get()
-            years = int(dur.split()[0]) if "year" in dur else int(dur.split()[0]) / 12.0
-            total = amt + (amt * 0.12 * years)
+            total = schedule_engine.total_repayment(amt, self.duration_combo.get(), self.repayment_method_var.get(),
+                                                    schedule_engine.DEFAULT_ANNUAL_RATE, self.interest_method_var.get())
             self.return_amount_lbl.config(text=f"{total:,.2f} RWF")
             return total
         except:
@@ -308,46 +300,64 @@ class LoanApplicationApp:
             messagebox.showwarning("Terms", "Please accept the terms.")
             return
 
-        try:
-            existing_user = database.db['loans'].find_one({"nin_number": current_nin})
-            
-            if existing_user:
-                stored_name = existing_user.get("customer_name", "").strip().lower()
-                if stored_name != current_name.lower():
-                    messagebox.showerror("Identity Error", 
-                        f"Registration Failed!\n\nThis NIN ({current_nin}) is already associated with a different name: "
-                        f"'{existing_user.get('customer_name')}'.\n\nOne NIN cannot be used by more than one person.")
-                    return
-
-            current_year = datetime.datetime.now().strftime("%Y")
-            unique_suffix = str(uuid.uuid4())[:4].upper()
-            loan_id = f"LOAN-{current_year}-{unique_suffix}"
-            
-            loan_data = {
-                "loan_id": loan_id,
-                "customer_name": current_name,
-                "nin_number": current_nin,
-                "loan_amount": float(self.amount_entry.get().replace(',', '')),
-                "loan_type": self.type_combo.get(),
-                "duration": self.duration_combo.get(),
-                "collateral": self.collateral_combo.get(),
-                "security_photos": self.security_photos,
-                "payment_plan": self.repayment_method_var.get(),
-                "purpose": self.purpose_text.get("1.0", tk.END).strip(),
-                "return_amount": self.update_return_amount(),
-                "status": "Pending",
-                "application_date": datetime.datetime.now()
-            }
-            database.db['loans'].insert_one(loan_data)
-            database.log_activity(CURRENT_USER_NAME, "New Loan Application", f"Submitted loan {loan_id} for {current_name}")
-            
-            messagebox.showinfo("Success", f"Application {loan_id} saved to Database!")
-            if messagebox.askyesno("Print", "Generate Word Doc for signing?"):
-                self.print_application(custom_id=loan_id)
-            self.return_to_dashboard()
-        except Exception as e:
+        fields = dict(
+            customer_name=current_name,
+            nin_number=current_nin,
+            loan_amount=self.amount_entry.get(),
+            loan_type=self.type_combo.get(),
+            duration=self.duration_combo.get(),
+            collateral=self.collateral_combo.get(),
+            payment_plan=self.repayment_method_var.get(),
+            interest_method=self.interest_method_var.get(),
+            purpose=self.purpose_text.get("1.0", tk.END).strip(),
+            security_photos=list(self.security_photos),
+        )
+        self.controller.tasks.submit(self._save_application, fields,
+                                     on_done=lambda result: self._on_application_saved(*result),
+                                     on_error=self._on_save_failed, owner=self)
+
+    @staticmethod
+    def _save_application(fields):
+        """
+        Builds the loan (which may reserve a block of loan numbers) and inserts
+        it unless its NIN already belongs to a different name. Returns the loan
+        and that other name on conflict, otherwise None. Runs on a worker thread.
+        """
+        loan_data = loan_rules.build_loan(**fields)
+        customer = database.register_customer(loan_data["nin_number"], loan_data["customer_name"])
+        if customer is None:
+            raise RuntimeError("Could not reach the customer registry.")
+        if not loan_rules.same_customer(customer.get("name"), loan_data["customer_name"]):
+            return loan_data, customer.get('name')
+
+        loan_data["customer_id"] = customer["_id"]
+        database.db['loans'].insert_one(loan_data)
+        database.record_customer_loans([loan_data])
+        return loan_data, None
+
+    @staticmethod
+    def _on_save_failed(e):
+        if isinstance(e, loan_rules.ValidationError):
+            messagebox.showerror("Error", str(e))
+        else:
             messagebox.showerror("System Error", f"Failed to save: {e}")
 
+    def _on_application_saved(self, loan_data, conflicting_name):
+        current_nin = loan_data["nin_number"]
+        loan_id = loan_data["loan_id"]
+        if conflicting_name is not None:
+            messagebox.showerror("Identity Error", 
+                f"Registration Failed!\n\nThis NIN ({current_nin}) is already associated with a different name: "
+                f"'{conflicting_name}'.\n\nOne NIN cannot be used by more than one person.")
+            return
+
+        database.log_activity(self.controller.current_user_name, "New Loan Application", f"Submitted loan {loan_id} for {loan_data['customer_name']}")
+        
+        messagebox.showinfo("Success", f"Application {loan_id} saved to Database!")
+        if messagebox.askyesno("Print", "Generate Word Doc for signing?"):
+            self.print_application(custom_id=loan_id)
+        self.return_to_dashboard()
+
     def print_application(self, custom_id=None):
         if not self.name_entry.get().strip() or not self.amount_entry.get().strip():
             messagebox.showwarning("Incomplete Form", "Missing info for printing.")
@@ -358,79 +368,44 @@ class LoanApplicationApp:
             file_path = filedialog.asksaveasfilename(defaultextension=".docx", initialfile=f"Loan_App_{app_id}.docx")
             if not file_path: return
 
-            doc = Document()
-            try:
-                doc.add_picture('bu logo.png', width=Inches(1.2))
-                doc.paragraphs[-1].alignment = WD_ALIGN_PARAGRAPH.CENTER
-            except: pass
-
-            title = doc.add_paragraph()
-            title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            run = title.add_run("OFFICIAL LOAN APPLICATION FORM")
-            run.bold = True
-            run.font.size = Pt(20)
-
-            ref_p = doc.add_paragraph()
-            ref_p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            ref_p.add_run(f"Reference ID: {app_id} | Date: {datetime.datetime.now().strftime('%Y-%m-%d')}")
-            doc.add_paragraph("_" * 75)
-
-            doc.add_heading('I. APPLICANT INFORMATION', level=2)
-            p1 = doc.add_paragraph()
-            p1.add_run("Full Name: ").bold = True; p1.add_run(self.name_entry.get().upper())
-            p2 = doc.add_paragraph()
-            p2.add_run("National ID (NIN): ").bold = True; p2.add_run(self.nin_entry.get())
-
-            doc.add_heading('II. LOAN SPECIFICATIONS', level=2)
-            table = doc.add_table(rows=0, cols=2)
-            specs = [
-                ("Requested Amount:", f"{self.amount_entry.get()} RWF"),
-                ("Loan Category:", self.type_combo.get()),
-                ("Repayment Term:", self.duration_combo.get()),
-                ("Collateral Provided:", self.collateral_combo.get()),
-                ("Repayment Cycle:", self.repayment_method_var.get()),
-                ("Interest Rate:", "12% Per Annum")
-            ]
-
-            for label, val in specs:
-                row_cells = table.add_row().cells
-                row_cells[0].text = label; row_cells[0].paragraphs[0].runs[0].bold = True
-                row_cells[1].text = val
-
-            doc.add_paragraph()
-            summary = doc.add_paragraph()
-            res_run = summary.add_run(f"TOTAL ESTIMATED REPAYMENT: {self.return_amount_lbl.cget('text')}")
-            res_run.bold = True; res_run.font.size = Pt(13)
-
-            doc.add_heading('III. PURPOSE OF LOAN', level=2)
-            doc.add_paragraph(self.purpose_text.get("1.0", tk.END).strip())
-
-            if self.security_photos:
-                doc.add_heading('IV. SECURITY ATTACHMENTS', level=2)
-                for photo_path in self.security_photos:
-                    if os.path.exists(photo_path):
-                        try:
-                            doc.add_picture(photo_path, width=Inches(3.5))
-                            p = doc.add_paragraph(f"Attachment: {os.path.basename(photo_path)}")
-                            p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                        except:
-                            doc.add_paragraph(f"[Error loading image: {os.path.basename(photo_path)}]")
-
-            doc.add_paragraph("\n" * 2)
-            sig_table = doc.add_table(rows=1, cols=2)
-            sig_table.width = doc.sections[0].page_width
-            sig_table.cell(0,0).paragraphs[0].add_run("__________________________\nAPPLICANT SIGNATURE")
-            right_cell = sig_table.cell(0,1).paragraphs[0]
-            right_cell.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-            right_cell.add_run("__________________________\nOFFICER APPROVAL / DATE")
-
-            doc.save(file_path)
-            database.log_activity(CURRENT_USER_NAME, "Print Application", f"Generated Word document for {self.name_entry.get()}")
-            os.startfile(file_path)
+            application = {
+                'app_id': app_id,
+                'date': datetime.datetime.now().strftime('%Y-%m-%d'),
+                'customer_name': self.name_entry.get(),
+                'nin_number': self.nin_entry.get(),
+                'loan_amount': self.amount_entry.get(),
+                'loan_type': self.type_combo.get(),
+                'duration': self.duration_combo.get(),
+                'collateral': self.collateral_combo.get(),
+                'payment_plan': self.repayment_method_var.get(),
+                'interest': f"{schedule_engine.DEFAULT_ANNUAL_RATE:g}% Per Annum ({self.interest_method_var.get()})",
+                'total_repayment': self.return_amount_lbl.cget('text'),
+                'purpose': self.purpose_text.get("1.0", tk.END).strip(),
+                'photos': list(self.security_photos),
+            }
         except Exception as e:
             messagebox.showerror("Print Error", f"Failed to generate document: {e}")
+            return
+
+        # Resizing the photos and writing the file happen off the Tk thread. No
+        # owner: submit_application() leaves this screen while the file is written.
+        user = self.controller.current_user_name
+        self.controller.tasks.submit(
+            agreement_docs.render_application, application, file_path,
+            on_done=lambda path: self._open_agreement(path, user, application['customer_name']),
+            on_error=lambda e: messagebox.showerror("Print Error", f"Failed to generate document: {e}"))
+
+    @staticmethod
+    def _open_agreement(file_path, user, customer_name):
+        try:
+            database.log_activity(user, "Print Application", f"Generated Word document for {customer_name}")
+            os.startfile(file_path)
+        except Exception as e:
+            messagebox.showerror("Print Error", f"Failed to open document: {e}")
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = LoanApplicationApp(root)
-    root.mainloop()
\ No newline at end of file
+    import sys
+    import main
+    role = sys.argv[1] if len(sys.argv) > 1 else "Staff"
+    user = sys.argv[2] if len(sys.argv) > 2 else "Guest"
+    main.run("LoanApplication", role=role, user=user)
@@ -0,0 +1,612 @@
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog, simpledialog
+import database  # MongoDB connection
+import os
+import bcrypt  # For secure password verification
+from datetime import datetime
+from collections import OrderedDict
+import excel_export
+import schedule_engine
+
+# VIRTUAL LIST MODEL
+class LoanPageModel:
+    """
+    Keyset-paginated view over the loans matching one filter.
+
+    fetch_page(cursor, limit) returns (rows, next_cursor). Page cursors are
+    remembered as pages are reached, so any page can be fetched again after
+    its rows were evicted from the LRU page cache.
+    """
+
+    def __init__(self, fetch_page, page_size=100, cache_pages=20):
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.cache_pages = cache_pages
+        self.cache = OrderedDict()  # page index -> rows, least recently used first
+        self.cursors = [None]       # cursors[i] is the cursor that fetches page i
+        self.last_page = None       # index of the final page once it has been reached
+
+    def has_page(self, index):
+        if index < 0 or index >= len(self.cursors):
+            return False
+        return self.last_page is None or index <= self.last_page
+
+    def cached_page(self, index):
+        """Returns the rows of a page already in memory, or None."""
+        if index in self.cache:
+            self.cache.move_to_end(index)
+            return self.cache[index]
+        return None
+
+    def store_page(self, index, rows, next_cursor):
+        """Records a fetched page; the cursor of the following page becomes known."""
+        if index == len(self.cursors) - 1:
+            if next_cursor is None:
+                self.last_page = index
+            else:
+                self.cursors.append(next_cursor)
+
+        self.cache[index] = rows
+        if len(self.cache) > self.cache_pages:
+            self.cache.popitem(last=False)
+
+    def get_page(self, index):
+        rows = self.cached_page(index)
+        if rows is not None:
+            return rows
+        if not self.has_page(index):
+            return []
+
+        rows, next_cursor = self.fetch_page(self.cursors[index], self.page_size)
+        self.store_page(index, rows, next_cursor)
+        return rows
+
+
+# LOAN MANAGEMENT DASHBOARD 
+class DashboardFrame(tk.Frame):
+    PAGE_SIZE = 100
+    MAX_RENDERED_PAGES = 3   # rows kept in the Treeview: visible window plus a buffer page each side
+    PAGE_CACHE_SIZE = 20
+    SEARCH_DEBOUNCE_MS = 300
+    ROW_FIELDS = ['customer_name', 'status', 'is_deleted']  # read by the selection and action handlers
+
+    def __init__(self, parent, controller):
+        super().__init__(parent)
+        self.controller = controller
+        self.config(bg="#ecf0f1")
+        self.current_filter = None 
+
+        controller.title(f"Loan Management System - User: {controller.current_user_name}")
+        controller.geometry("1550x700")
+        
+        self.grid_columnconfigure(1, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        # SIDEBAR 
+        sidebar = tk.Frame(self, bg="#34495e", width=220, padx=15, pady=10)
+        sidebar.grid(row=0, column=0, rowspan=3, sticky="nsew") 
+
+        tk.Label(sidebar, text="Loan Management", font=("Arial", 14, "bold"), bg="#34495e", fg="white").pack(pady=(10, 20))
+
+        tk.Button(sidebar, text="← Return to Dashboard", font=("Arial", 10, "bold"),
+                  bg="#3498db", fg="white", width=20, height=2,
+                  command=lambda: controller.show_frame("Dashboard")).pack(pady=(0, 20))
+
+        tk.Button(sidebar, text="+ New Application", font=("Arial", 10, "bold"),
+                  bg="#2ecc71", fg="white", width=20,
+                  command=lambda: controller.show_frame("LoanApplication")).pack(pady=(5, 10))
+
+        tk.Label(sidebar, text="SEARCH RECORDS", font=("Arial", 9, "bold"), bg="#34495e", fg="#bdc3c7").pack(pady=(20, 5))
+        self.search_entry = tk.Entry(sidebar, font=("Arial", 10), width=22)
+        self.search_entry.pack(pady=5)
+        # Results update as the user types (debounced)
+        self.search_job = None
+        self.search_generation = 0
+        self.search_entry.bind("<KeyRelease>", self.on_search_typed)
+        tk.Button(sidebar, text="Run Search", font=("Arial", 10, "bold"), bg="#95a5a6", fg="white", width=20, command=self.search_loans).pack(pady=(0, 15))
+
+        tk.Label(sidebar, text="FILTER BY STATUS", font=("Arial", 9, "bold"), bg="#34495e", fg="#bdc3c7").pack(pady=(15, 5))
+        tk.Button(sidebar, text="All Loans", font=("Arial", 10), bg="#ecf0f1", width=20, command=lambda: self.filter_loans(None)).pack(pady=3)
+        tk.Button(sidebar, text="⚠️ Overdue Loans", font=("Arial", 10, "bold"), bg="#e74c3c", fg="white", width=20, command=lambda: self.filter_loans("Overdue")).pack(pady=3)
+        tk.Button(sidebar, text="Pending/New", font=("Arial", 10), bg="#f1c40f", width=20, command=lambda: self.filter_loans("Pending")).pack(pady=3)
+        tk.Button(sidebar, text="Under Payment", font=("Arial", 10), bg="#3498db", fg="white", width=20, command=lambda: self.filter_loans("Active")).pack(pady=3)
+        tk.Button(sidebar, text="Fully Paid", font=("Arial", 10), bg="#2ecc71", fg="white", width=20, command=lambda: self.filter_loans("Closed")).pack(pady=3)
+        tk.Button(sidebar, text="Rejected Loans", font=("Arial", 10), bg="#7f8c8d", fg="white", width=20, command=lambda: self.filter_loans("Rejected")).pack(pady=3)
+        
+        tk.Button(sidebar, text="♻️ Recycle Bin", font=("Arial", 10, "italic"), bg="#bdc3c7", width=20, command=lambda: self.filter_loans("Recycle")).pack(pady=(20, 3))
+
+        tk.Button(sidebar, text="🛑 Sign Out System", font=("Arial", 10, "bold"), 
+                  bg="#e67e22", fg="white", width=20, height=2,
+                  command=self.logout_system).pack(pady=(20, 10))
+
+        # --- MAIN HEADER ---
+        header_frame = tk.Frame(self, bg="white", padx=20, pady=15)
+        header_frame.grid(row=0, column=1, sticky="ew")
+
+        tk.Label(header_frame, text="Current Loan Applications", font=("Arial", 20, "bold"), bg="white", fg="#2c3e50").pack(side=tk.LEFT)
+        self.current_status_label = tk.Label(header_frame, text="Displaying: All Loans", font=("Arial", 12), bg="white", fg="#7f8c8d")
+        self.current_status_label.pack(side=tk.RIGHT)
+
+        # --- TREEVIEW ---
+        main_content_frame = tk.Frame(self, bg="#ecf0f1")
+        main_content_frame.grid(row=1, column=1, sticky="nsew", padx=20, pady=5)
+        main_content_frame.grid_columnconfigure(0, weight=1)
+        main_content_frame.grid_rowconfigure(0, weight=1)
+
+        columns = ('#id', 'customer_name', 'loan_amount', 'duration', 'status', 'next_payment', 'days_remaining', 'final_due_date')
+        self.tree = ttk.Treeview(main_content_frame, columns=columns, show='headings')
+
+        self.tree.heading('#id', text='ID')
+        self.tree.heading('customer_name', text='Customer Name')
+        self.tree.heading('loan_amount', text='Loan Amount')
+        self.tree.heading('duration', text='Term')
+        self.tree.heading('status', text='Status')
+        self.tree.heading('next_payment', text='Next Payment')
+        self.tree.heading('days_remaining', text='Days Left')
+        self.tree.heading('final_due_date', text='Loan Completion Date')
+
+        self.tree.column('#id', width=50, anchor='center')
+        self.tree.column('customer_name', width=200)
+        self.tree.column('loan_amount', width=120, anchor='e')
+        self.tree.column('duration', width=80, anchor='center')
+        self.tree.column('status', width=100, anchor='center')
+        self.tree.column('next_payment', width=110, anchor='center')
+        self.tree.column('days_remaining', width=110, anchor='center')
+        self.tree.column('final_due_date', width=140, anchor='center')
+
+        self.tree.tag_configure('overdue', background='#f8d7da', foreground='#721c24')
+        self.tree.tag_configure('pending', background='#fcf8e3', foreground='#8a6d3b')
+        self.tree.tag_configure('underpayment', background='#d9edf7', foreground='#31708f')
+        self.tree.tag_configure('fullypaid', background='#dff0d8', foreground='#3c763d')
+        self.tree.tag_configure('approved', background='#fae8ff', foreground='#9c27b0')
+        self.tree.tag_configure('rejected', background='#fdecea', foreground='#d32f2f')
+        self.tree.tag_configure('deleted', background='#f2f2f2', foreground='#95a5a6')
+
+        self.tree.bind("<<TreeviewSelect>>", self.on_loan_select)
+
+        self.scrollbar = ttk.Scrollbar(main_content_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._on_tree_scroll)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        # Virtual list state: which model pages are currently drawn in the tree
+        self.model = None
+        self.rendered_pages = OrderedDict()  # page index -> item ids, in display order
+        self._scroll_check_pending = False
+        self.pages_in_flight = set()  # (model, page index) fetches running on the task runner
+
+        #  ACTION BUTTONS 
+        action_frame = tk.Frame(self, bg="#ecf0f1", padx=20, pady=15)
+        action_frame.grid(row=2, column=1, sticky="ew")
+
+        tk.Button(action_frame, text="🔍 View/Edit Details", font=("Arial", 10), bg="#3498db", fg="white", padx=10, 
+                  command=self.view_loan_details).pack(side=tk.LEFT, padx=5)
+
+        tk.Button(action_frame, text="✅ Approve Loan", font=("Arial", 10, "bold"), bg="#2ecc71", fg="white", padx=10, 
+                  command=self.approve_loan).pack(side=tk.LEFT, padx=5)
+        
+        tk.Button(action_frame, text="❌ Reject Loan", font=("Arial", 10), bg="#e67e22", fg="white", padx=10, 
+                  command=self.reject_loan).pack(side=tk.LEFT, padx=5)
+        
+        tk.Button(action_frame, text="🗑️ Delete Loan", font=("Arial", 10), bg="#c0392b", fg="white", padx=10, 
+                  command=self.delete_loan).pack(side=tk.LEFT, padx=5)
+
+        if controller.current_user_role == "Admin":
+            tk.Button(action_frame, text="🧨 PERMANENT DELETE", font=("Arial", 10, "bold"), 
+                      bg="black", fg="white", padx=10, 
+                      command=self.permanently_delete_loan).pack(side=tk.LEFT, padx=5)
+        
+        self.btn_repayment = tk.Button(action_frame, text="💰 Record Repayment", font=("Arial", 10), bg="#9b59b6", fg="white", padx=10, 
+                  command=self.record_repayment)
+        self.btn_repayment.pack(side=tk.LEFT, padx=5)
+        
+        tk.Button(action_frame, text="📥 Export Excel", font=("Arial", 10, "bold"), bg="#27ae60", fg="white", padx=10,
+                  command=self.open_export_options).pack(side=tk.RIGHT, padx=5)
+
+        if not hasattr(database, 'db') or database.db is None:
+            messagebox.showerror("Initialization Error", "Database connection failed.")
+            return
+
+        self.filter_loans(None)
+
+    def logout_system(self):
+        if messagebox.askyesno("Confirm Logout", "Are you sure you want to sign out?"):
+            self.controller.logout("User signed out of the system")
+
+    def permanently_delete_loan(self):
+        loan_id = self.tree.focus()
+        if not loan_id:
+            messagebox.showwarning("Selection Required", "Please select a loan record to delete forever.")
+            return
+
+        pwd = simpledialog.askstring("Security Verification", "Enter your Login Password to confirm permanent deletion:", show='*')
+        if pwd:
+            # bcrypt is deliberately slow, so the check runs on the task runner
+            self.controller.tasks.submit(self._verify_password, self.controller.current_user_name, pwd,
+                                         on_done=lambda verdict: self._confirm_permanent_delete(loan_id, verdict),
+                                         on_error=lambda e: messagebox.showerror("Error", f"Verification error: {e}"),
+                                         owner=self)
+
+    @staticmethod
+    def _verify_password(user_name, pwd):
+        """Returns 'ok', 'denied' or 'missing' for the signed-in user's password. Runs on a worker thread."""
+        user_doc = database.db['users'].find_one({"full_name": user_name})
+        if not user_doc:
+            user_doc = database.db['users'].find_one({"username": user_name})
+        if not user_doc:
+            return 'missing'
+        stored_hash = user_doc.get('password_hash', '').encode('utf-8')
+        return 'ok' if bcrypt.checkpw(pwd.encode('utf-8'), stored_hash) else 'denied'
+
+    def _confirm_permanent_delete(self, loan_id, verdict):
+        if verdict == 'missing':
+            messagebox.showerror("Error", "User record not found.")
+            return
+        if verdict != 'ok':
+            messagebox.showerror("Access Denied", "Invalid Password.")
+            return
+
+        name = self._row_details(loan_id)["customer_name"]
+        confirm = messagebox.askyesno("Final Confirmation", f"Are you sure you want to PERMANENTLY delete the loan for {name}?")
+        if confirm:
+            def deleted(_):
+                # LOG THE ACTIVITY
+                database.log_activity(self.controller.current_user_name, "Permanent Delete", f"Wiped loan record for {name} (ID: {loan_id})")
+                messagebox.showinfo("Deleted", "Record wiped from database.")
+                self.filter_loans(self.current_filter)
+            self.controller.tasks.submit(database.delete_loan_permanently, loan_id, on_done=deleted, owner=self)
+
+    def approve_loan(self):
+        loan_id = self.tree.focus()
+        if not loan_id: return
+        loan_data = self._row_details(loan_id)
+        if loan_data["is_deleted"]: return
+
+        def approved(first_due):
+            # LOG THE ACTIVITY
+            database.log_activity(self.controller.current_user_name, "Approve Loan", f"Approved loan for {loan_data.get('customer_name')}")
+            
+            if first_due is None:
+                messagebox.showwarning("Approved", "Loan Approved, but no repayment schedule could be built from its amount and term.")
+            else:
+                messagebox.showinfo("Approved", f"Loan Approved!\nNext Pay: {first_due.strftime('%Y-%m-%d')}")
+            self.filter_loans(self.current_filter)
+
+        # The installment schedule is stored with the approval; due dates come from it
+        self.controller.tasks.submit(schedule_engine.approve_loan, loan_id, on_done=approved, owner=self)
+
+    def _row_details(self, loan_id):
+        """
+        Customer name, status and deleted flag of a selected loan, never read
+        from the server on the Tk thread. The page queries seed the loan cache
+        with these fields; once an entry has expired or been invalidated the
+        row as drawn in the table answers instead.
+        """
+        loan = database.get_loan_by_id(loan_id, fields=self.ROW_FIELDS, cached_only=True)
+        if loan is not None:
+            return {"customer_name": loan.get("customer_name", "Unknown"), "status": loan.get("status", "Pending"),
+                    "is_deleted": bool(loan.get("is_deleted"))}
+        if not self.tree.exists(loan_id):
+            # The table was redrawn while a confirmation was pending
+            return {"customer_name": "Unknown", "status": "Unknown", "is_deleted": False}
+        values = self.tree.item(loan_id, 'values')
+        return {"customer_name": str(values[1]), "status": str(values[4]),
+                "is_deleted": 'deleted' in self.tree.item(loan_id, 'tags')}
+
+    def _format_row(self, loan, today):
+        full_id = str(loan.get('_id', ''))
+        status = loan.get('status', 'Unknown')
+        next_pay = loan.get('next_payment')
+        next_pay_str = database.format_date(next_pay)
+        final_due_str = database.format_date(loan.get('final_completion_date'))
+        days_txt = "N/A"
+        tag = status.replace(" ", "").lower()
+        
+        if status not in ["Fully Paid", "Rejected", "Pending"] and next_pay_str != "N/A":
+            try:
+                due_date = database.parse_date(next_pay).date()
+                diff = (due_date - today).days
+                if diff > 0: days_txt = f"{diff} Days left"
+                elif diff == 0: days_txt = "Due Today"
+                else: 
+                    days_txt = f"{abs(diff)} Days Overdue"
+                    tag = 'overdue'
+            except: days_txt = "Error"
+        
+        if loan.get('is_deleted'): tag = 'deleted'
+        data = (full_id[-4:], loan.get('customer_name', 'N/A'), f"RWF {loan.get('loan_amount', 0.00):,.2f}", 
+                loan.get('duration', 'N/A'), status, next_pay_str, days_txt, final_due_str)
+        return full_id, data, tag
+
+    def _ensure_page(self, index, then):
+        """
+        True when page `index` is in memory. Otherwise fetches it on a worker
+        thread, calls then() once it has arrived and returns False.
+        """
+        model = self.model
+        if model.cached_page(index) is not None:
+            return True
+        if (model, index) in self.pages_in_flight:
+            return False
+
+        def fetched(result):
+            self.pages_in_flight.discard((model, index))
+            if model is not self.model:
+                return  # the filter changed while the page was loading
+            rows, next_cursor = result
+            model.store_page(index, rows, next_cursor)
+            then()
+
+        def failed(e):
+            self.pages_in_flight.discard((model, index))
+            self.controller.tasks.report_error(e)
+
+        self.pages_in_flight.add((model, index))
+        self.controller.tasks.submit(model.fetch_page, model.cursors[index], model.page_size,
+                                     on_done=fetched, on_error=failed, owner=self)
+        return False
+
+    def _insert_page(self, index, position):
+        """Draws one model page into the tree at `position` ('end' or 0) and returns its row count."""
+        today = datetime.now().date()
+        iids = []
+        for offset, loan in enumerate(self.model.get_page(index)):
+            full_id, data, tag = self._format_row(loan, today)
+            if self.tree.exists(full_id):
+                continue  # a row edited between page fetches can appear on two pages
+            at = tk.END if position == tk.END else position + len(iids)
+            self.tree.insert('', at, iid=full_id, values=data, tags=(tag,))
+            iids.append(full_id)
+        self.rendered_pages[index] = iids
+        if position != tk.END:
+            self.rendered_pages.move_to_end(index, last=False)
+        return len(iids)
+
+    def _drop_page(self, index):
+        iids = self.rendered_pages.pop(index, [])
+        if iids:
+            self.tree.delete(*iids)
+        return len(iids)
+
+    def show_model(self, model):
+        """Replaces the table contents with the first pages of `model`, fetching them in the background."""
+        self.model = model
+        self.rendered_pages.clear()
+        for i in self.tree.get_children(): self.tree.delete(i)
+        self._show_first_pages()
+
+    def _show_first_pages(self):
+        if not self._ensure_page(0, self._show_first_pages):
+            return
+        if not self.rendered_pages:
+            self._insert_page(0, tk.END)
+            self.tree.yview_moveto(0)
+        # Page 1's cursor is only known once page 0 has been fetched
+        if self.model.has_page(1) and 1 not in self.rendered_pages:
+            if self._ensure_page(1, self._show_first_pages):
+                self._insert_page(1, tk.END)
+
+    def _on_tree_scroll(self, first, last):
+        """Scrollbar callback; loads or unloads pages when the view nears either edge."""
+        self.scrollbar.set(first, last)
+        if not self._scroll_check_pending and self.model is not None:
+            self._scroll_check_pending = True
+            self.after_idle(self._check_scroll_window)
+
+    def _check_scroll_window(self):
+        self._scroll_check_pending = False
+        if not self.rendered_pages:
+            return
+        first, last = self.tree.yview()
+        pages = list(self.rendered_pages)
+        total = len(self.tree.get_children())
+
+        if last >= 0.9 and self.model.has_page(pages[-1] + 1):
+            if not self._ensure_page(pages[-1] + 1, self._check_scroll_window):
+                return
+            added = self._insert_page(pages[-1] + 1, tk.END)
+            if len(self.rendered_pages) > self.MAX_RENDERED_PAGES and added:
+                top = first * total
+                removed = self._drop_page(pages[0])
+                self.tree.yview_moveto(max(0.0, top - removed) / max(1, total + added - removed))
+        elif first <= 0.1 and pages[0] > 0:
+            if not self._ensure_page(pages[0] - 1, self._check_scroll_window):
+                return
+            top = first * total
+            added = self._insert_page(pages[0] - 1, 0)
+            removed = 0
+            if len(self.rendered_pages) > self.MAX_RENDERED_PAGES:
+                removed = self._drop_page(pages[-1])
+            self.tree.yview_moveto((top + added) / max(1, total + added - removed))
+
+    def update_treeview(self, loan_list):
+        """Shows a fixed list of loans (e.g. capped search results) as a single page."""
+        model = LoanPageModel(lambda cursor, limit: (loan_list, None), page_size=len(loan_list) or 1)
+        model.store_page(0, loan_list, None)
+        self.show_model(model)
+
+    def filter_loans(self, status=None):
+        self.current_filter = status
+        self.search_generation += 1  # results of a search still in flight no longer apply
+        self.show_model(LoanPageModel(self.page_fetcher(status), self.PAGE_SIZE, self.PAGE_CACHE_SIZE))
+        self.current_status_label.config(text=f"Displaying: {status if status else 'All Loans'}")
+
+    def page_fetcher(self, status_filter=None):
+        """Returns a fetch_page(cursor, limit) function for the given sidebar filter."""
+        if status_filter == "Overdue":
+            # Indexed range scan on (is_deleted, status, next_payment), keyset on (next_payment, _id)
+            return lambda after, limit: database.get_overdue_loans(limit, after=after)
+
+        query = {"is_deleted": True} if status_filter == "Recycle" else {"is_deleted": database.NOT_DELETED}
+        if status_filter and status_filter != "Recycle":
+            if status_filter == "Active": query["status"] = {"$in": ["Under Payment", "Approved"]}
+            elif status_filter == "Closed": query["status"] = "Fully Paid"
+            else: query["status"] = status_filter
+        
+        return lambda after, limit: database.get_loans_page(query, limit, after)
+
+    def on_search_typed(self, event=None):
+        """Restarts the debounce timer on every keystroke so only the last one queries the database."""
+        if self.search_job:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(self.SEARCH_DEBOUNCE_MS, self.search_loans)
+
+    def search_loans(self):
+        if self.search_job:
+            self.after_cancel(self.search_job)
+            self.search_job = None
+
+        term = self.search_entry.get().strip()
+        if not term:
+            self.filter_loans(self.current_filter)
+            return
+
+        # A newer search makes the results of any older one stale
+        self.search_generation += 1
+        generation = self.search_generation
+
+        def show_results(results):
+            if generation != self.search_generation:
+                return
+            self.update_treeview(results)
+            capped = " (first results)" if len(results) >= database.SEARCH_RESULT_LIMIT else ""
+            self.current_status_label.config(text=f"Search: '{term}' - {len(results)} match(es){capped}")
+
+        self.controller.tasks.submit(database.search_loans_by_name, term,
+                                     include_deleted=(self.current_filter == "Recycle"),
+                                     on_done=show_results, owner=self)
+
+    def on_loan_select(self, event):
+        selected_id = self.tree.focus()
+        if not selected_id: return
+        loan_data = self._row_details(selected_id)
+        if loan_data["status"] in ["Pending", "Rejected"] or loan_data["is_deleted"]:
+            self.btn_repayment.config(state=tk.DISABLED, bg="#bdc3c7")
+        else:
+            self.btn_repayment.config(state=tk.NORMAL, bg="#9b59b6")
+
+    def delete_loan(self):
+        loan_id = self.tree.focus()
+        if not loan_id: return
+        loan_data = self._row_details(loan_id)
+        new_state = not loan_data["is_deleted"]
+
+        def toggled(_):
+            # LOG THE ACTIVITY
+            action_name = "Move to Recycle" if new_state else "Restore Loan"
+            database.log_activity(self.controller.current_user_name, action_name, f"Changed deletion state for {loan_data.get('customer_name')}")
+            
+            self.filter_loans(self.current_filter)
+
+        self.controller.tasks.submit(database.set_loan_deleted, loan_id, new_state, on_done=toggled, owner=self)
+
+    def reject_loan(self):
+        loan_id = self.tree.focus()
+        if not loan_id: return
+        loan_data = self._row_details(loan_id)
+
+        def rejected(_):
+            # LOG THE ACTIVITY
+            database.log_activity(self.controller.current_user_name, "Reject Loan", f"Rejected loan application for {loan_data.get('customer_name')}")
+            
+            self.filter_loans(self.current_filter)
+
+        self.controller.tasks.submit(database.update_loan_status, loan_id, "Rejected", on_done=rejected, owner=self)
+
+    # UPDATED VIEW DETAILS LOGIC
+    def view_loan_details(self):
+        loan_id = self.tree.focus()
+        if not loan_id: return
+        # Open the loan file inside the same window, passing the selection in memory
+        self.controller.show_frame("LoanDetails", loan_id=loan_id)
+
+    #  UPDATED RECORD REPAYMENT LOGIC 
+    def record_repayment(self):
+        loan_id = self.tree.focus()
+        if not loan_id: return
+        self.controller.show_frame("Repayment", loan_id=loan_id)
+
+    def open_export_options(self):
+        self.export_win = tk.Toplevel(self)
+        self.export_win.title("Export Range Selection")
+        self.export_win.geometry("400x420")
+        self.export_win.configure(bg="white")
+        self.export_win.grab_set()
+        self.export_win.protocol("WM_DELETE_WINDOW", self.cancel_export)
+        tk.Label(self.export_win, text="EXCEL EXPORT", font=("Arial", 14, "bold"), bg="white", fg="#27ae60").pack(pady=10)
+        tk.Label(self.export_win, text="Start Date (YYYY-MM-DD):", bg="white").pack(pady=(15, 0))
+        self.start_date_ent = tk.Entry(self.export_win, font=("Arial", 12), justify="center")
+        self.start_date_ent.insert(0, datetime.now().strftime("%Y-01-01"))
+        self.start_date_ent.pack(pady=5)
+        tk.Label(self.export_win, text="End Date (YYYY-MM-DD):", bg="white").pack(pady=(5, 0))
+        self.end_date_ent = tk.Entry(self.export_win, font=("Arial", 12), justify="center")
+        self.end_date_ent.insert(0, datetime.now().strftime("%Y-%m-%d"))
+        self.end_date_ent.pack(pady=5)
+        self.export_payments_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.export_win, text="Include payments sheet for the same range", variable=self.export_payments_var,
+                       bg="white").pack(pady=5)
+        self.export_btn = tk.Button(self.export_win, text="PROCESS EXCEL", bg="#2ecc71", fg="white", font=("Arial", 11, "bold"), width=25, height=2, bd=0, command=self.process_export)
+        self.export_btn.pack(pady=10)
+        self.export_progress = ttk.Progressbar(self.export_win, orient=tk.HORIZONTAL, length=300, mode="determinate")
+        self.export_progress.pack(pady=5)
+        self.export_status = tk.Label(self.export_win, text="", bg="white", fg="#7f8c8d")
+        self.export_status.pack()
+        self.export_cancel_btn = tk.Button(self.export_win, text="Cancel", bg="#c0392b", fg="white", bd=0, width=12,
+                                           state=tk.DISABLED, command=self.cancel_export)
+        self.export_cancel_btn.pack(pady=5)
+        self.export_task = None
+
+    def process_export(self):
+        try:
+            start_dt = datetime.strptime(self.start_date_ent.get(), "%Y-%m-%d")
+            end_dt = datetime.strptime(self.end_date_ent.get(), "%Y-%m-%d").replace(hour=23, minute=59)
+        except ValueError:
+            messagebox.showerror("Error", "Dates must be in YYYY-MM-DD format.", parent=self.export_win)
+            return
+        file_path = filedialog.asksaveasfilename(defaultextension=".xlsx", parent=self.export_win)
+        if not file_path: return
+
+        # The export streams rows on the task runner; progress comes back on the Tk thread
+        self.export_btn.config(state=tk.DISABLED)
+        self.export_cancel_btn.config(state=tk.NORMAL)
+        self.export_status.config(text="Starting export...")
+        self.export_task = self.controller.tasks.submit(
+            excel_export.export_loans, file_path, start_dt, end_dt, self.export_payments_var.get(),
+            on_progress=self._show_export_progress,
+            on_done=lambda counts: self._export_finished(file_path, counts),
+            on_error=self._export_failed,
+            owner=self.export_win, busy=False, pass_cancel=True)
+
+    def _show_export_progress(self, label, done, total):
+        self.export_progress.config(maximum=max(total, 1), value=done)
+        self.export_status.config(text=f"{label}: {done:,} of {total:,} rows")
+
+    def _export_finished(self, file_path, counts):
+        self.export_task = None
+        summary = ", ".join(f"{n:,} {sheet.lower()}" for sheet, n in counts.items())
+        # LOG THE ACTIVITY
+        database.log_activity(self.controller.current_user_name, "Export Excel", f"Exported {summary} to {os.path.basename(file_path)}")
+        self.export_win.destroy()
+        if hasattr(os, "startfile"):
+            os.startfile(file_path)
+
+    def _export_failed(self, e):
+        self.export_task = None
+        messagebox.showerror("Error", str(e), parent=self.export_win)
+        self.export_btn.config(state=tk.NORMAL)
+        self.export_cancel_btn.config(state=tk.DISABLED)
+        self.export_status.config(text="")
+
+    def cancel_export(self):
+        if self.export_task is not None:
+            # The worker stops at its next row; the partial workbook is discarded
+            self.export_task.cancel()
+            self.export_task = None
+        self.export_win.destroy()
+
+if __name__ == "__main__":
+    import sys
+    import main
+    role = sys.argv[1] if len(sys.argv) > 1 else "Staff"
+    user = sys.argv[2] if len(sys.argv) > 2 else "Guest"
+    main.run("LoanManagement", role=role, user=user)
@@ -0,0 +1,129 @@
+"""
+Rules a new loan or payment has to satisfy, shared by the data-entry screens
+and the bulk importer (bulk_import.py) so both accept exactly the same records.
+"""
+import datetime
+import re
+import threading
+
+import database
+import schedule_engine
+
+# LOAN-<year>-<suffix>. Older applications have 4-character random suffixes,
+# imported loans 8-character content hashes; new ones get an allocated number.
+LOAN_ID_PATTERN = re.compile(r"^LOAN-\d{4}-[0-9A-Z]{4,}$")
+LOAN_STATUSES = ['Pending', 'Approved', 'Under Payment', 'Fully Paid', 'Rejected']
+
+
+class ValidationError(ValueError):
+    """A record breaks one of the rules below; the message says which."""
+
+
+# Allocated loan numbers are LOAN-<year>-<branch><sequence>. Each branch counts
+# per year in its own database counter; the app reserves LOAN_NUMBER_BLOCK numbers
+# at a time, so most applications get their number without a round trip. Numbers
+# left in a block when the app closes are never issued.
+BRANCH_CODE = ""
+LOAN_NUMBER_DIGITS = 6
+LOAN_NUMBER_BLOCK = 20
+
+
+class LoanNumberAllocator:
+    """Issues loan numbers from blocks reserved on the database counter. Thread-safe."""
+
+    def __init__(self, branch=BRANCH_CODE, block_size=LOAN_NUMBER_BLOCK):
+        self.branch = branch.strip().upper()
+        self.block_size = block_size
+        self._blocks = {}  # year -> [next number, end of block)
+        self._lock = threading.Lock()
+
+    def counter_name(self, year):
+        return f"loan-{year}-{self.branch}" if self.branch else f"loan-{year}"
+
+    def next_id(self, year):
+        with self._lock:
+            block = self._blocks.get(year)
+            if block is None or block[0] >= block[1]:
+                first = database.reserve_sequence(self.counter_name(year), self.block_size)
+                if first is None:
+                    raise RuntimeError("Could not reserve loan numbers from the database.")
+                block = self._blocks[year] = [first, first + self.block_size]
+            number = block[0]
+            block[0] += 1
+        return f"LOAN-{year}-{self.branch}{number:0{LOAN_NUMBER_DIGITS}d}"
+
+
+_allocator = LoanNumberAllocator()
+
+
+def new_loan_id(year=None):
+    """Next loan number for `year` (default: this year). Needs the database when a new block is due."""
+    year = year or datetime.datetime.now().year
+    return _allocator.next_id(year)
+
+
+def check_loan_id(loan_id):
+    loan_id = str(loan_id or '').strip().upper()
+    if not LOAN_ID_PATTERN.match(loan_id):
+        raise ValidationError(f"Loan id '{loan_id}' is not in the LOAN-YYYY-XXXX format.")
+    return loan_id
+
+
+def parse_amount(value, field="Amount"):
+    """'1,500' -> 1500.0; anything that is not a positive number is rejected."""
+    try:
+        amount = float(str(value).replace(',', '').strip())
+    except (TypeError, ValueError):
+        raise ValidationError(f"{field} '{value}' is not a number.")
+    if not amount > 0:
+        raise ValidationError(f"{field} must be greater than zero.")
+    return amount
+
+
+def same_customer(stored_name, name):
+    """One NIN belongs to one person: names are compared ignoring case and outer spaces."""
+    return str(stored_name or '').strip().lower() == str(name or '').strip().lower()
+
+
+def build_loan(customer_name, nin_number, loan_amount, loan_type='', duration='', collateral='',
+               payment_plan='Monthly', interest_method=schedule_engine.INTEREST_FLAT, purpose='',
+               security_photos=None, loan_id=None, status='Pending', application_date=None,
+               interest_rate=schedule_engine.DEFAULT_ANNUAL_RATE):
+    """Validates the fields of a new application and returns the loan document to insert."""
+    customer_name = str(customer_name or '').strip()
+    nin_number = str(nin_number or '').strip()
+    if not customer_name or not nin_number:
+        raise ValidationError("Customer name and NIN are required.")
+    loan_amount = parse_amount(loan_amount, "Loan amount")
+    if status not in LOAN_STATUSES:
+        raise ValidationError(f"Unknown status '{status}'.")
+    if interest_method not in schedule_engine.INTEREST_METHODS:
+        raise ValidationError(f"Unknown interest method '{interest_method}'.")
+    application_date = database.parse_date(application_date) if application_date else datetime.datetime.now()
+    if application_date is None:
+        raise ValidationError("Application date must be YYYY-MM-DD.")
+
+    return {
+        "loan_id": check_loan_id(loan_id) if loan_id else new_loan_id(application_date.year),
+        "customer_name": customer_name,
+        "customer_name_key": database.normalize_name_key(customer_name),
+        "nin_number": nin_number,
+        "loan_amount": loan_amount,
+        "loan_type": loan_type,
+        "duration": duration,
+        "collateral": collateral,
+        "security_photos": list(security_photos or []),
+        "payment_plan": payment_plan,
+        "interest_rate": interest_rate,
+        "interest_method": interest_method,
+        "purpose": purpose,
+        "return_amount": schedule_engine.total_repayment(loan_amount, duration, payment_plan,
+                                                         interest_rate, interest_method),
+        "total_paid": 0.0,
+        "remaining_balance": loan_amount,
+        "payment_count": 0,
+        "last_payment_date": None,
+        "status": status,
+        "is_deleted": False,
+        "application_date": application_date
+    }
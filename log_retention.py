@@ -0,0 +1,140 @@
+"""
+Audit log retention: keeps the 'logs' collection down to the recent, hot entries.
+
+Run daily with `python db_admin.py retention`. Entries older than
+LOG_RETENTION_DAYS (whole days) are
+
+  1. rolled up into one LOG_ROLLUP_COLLECTION document per day, user and
+     action (count, first and last time), so long-range activity stays
+     queryable;
+  2. written to a gzip-compressed JSONL archive in LOG_ARCHIVE_DIR using
+     MongoDB extended JSON, so ids and dates survive a round trip;
+  3. deleted from 'logs', but only after the archive file is complete on disk.
+
+Each step can safely be repeated if a run is interrupted. Archived entries
+can be loaded back with `python db_admin.py restore-logs <file>`; entries
+that are already present are skipped. Restored entries are older than the
+cutoff, so the next retention run archives them again; restore into a copy
+of the database, or pass a larger --days, to keep them around.
+"""
+import datetime
+import gzip
+import os
+
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+import database
+
+# Documents read, inserted or deleted per round trip
+BATCH_SIZE = 1000
+DUPLICATE_KEY = 11000
+
+
+def retention_cutoff(retain_days=None, today=None):
+    """Midnight starting the oldest day that stays in 'logs'."""
+    retain_days = database.LOG_RETENTION_DAYS if retain_days is None else retain_days
+    today = today or datetime.date.today()
+    return datetime.datetime.combine(today - datetime.timedelta(days=retain_days), datetime.time())
+
+
+def rollup_logs(cutoff):
+    """
+    Stores daily per-user/per-action counts for every entry before cutoff.
+    Days are recomputed from the raw entries and replaced, so rerunning is harmless.
+    """
+    database.db['logs'].aggregate([
+        {'$match': {'timestamp': {'$lt': cutoff, '$type': 'date'}}},
+        {'$group': {
+            '_id': {
+                'date': {'$dateFromString': {'dateString': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$timestamp'}}}},
+                'user': '$user',
+                'action': '$action'
+            },
+            'count': {'$sum': 1},
+            'first': {'$min': '$timestamp'},
+            'last': {'$max': '$timestamp'}
+        }},
+        {'$project': {'_id': 1, 'date': '$_id.date', 'user': '$_id.user', 'action': '$_id.action',
+                      'count': 1, 'first': 1, 'last': 1}},
+        {'$merge': {'into': database.LOG_ROLLUP_COLLECTION, 'on': '_id',
+                    'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+    ], allowDiskUse=True)
+
+
+def archive_logs(cutoff, archive_dir=None):
+    """
+    Writes every entry before cutoff, oldest first, to a new .jsonl.gz file.
+    Returns (path, archived _ids); path is None when there was nothing to archive.
+    """
+    archive_dir = archive_dir or database.LOG_ARCHIVE_DIR
+    query = {'timestamp': {'$lt': cutoff}}
+    if database.db['logs'].find_one(query, {'_id': 1}) is None:
+        return None, []
+
+    os.makedirs(archive_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(archive_dir, f"logs-before-{cutoff:%Y-%m-%d}-{stamp}.jsonl.gz")
+    partial = path + ".part"
+
+    ids = []
+    cursor = database.db['logs'].find(query).sort('timestamp', 1).batch_size(BATCH_SIZE)
+    try:
+        with cursor, gzip.open(partial, 'wt', encoding='utf-8') as out:
+            for entry in cursor:
+                out.write(json_util.dumps(entry, json_options=json_util.RELAXED_JSON_OPTIONS))
+                out.write("\n")
+                ids.append(entry['_id'])
+        # Only a complete file gets its final name (and allows the delete)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return path, ids
+
+
+def delete_archived(ids):
+    deleted = 0
+    for i in range(0, len(ids), BATCH_SIZE):
+        deleted += database.db['logs'].delete_many({'_id': {'$in': ids[i:i + BATCH_SIZE]}}).deleted_count
+    return deleted
+
+
+def run_retention(retain_days=None, archive_dir=None):
+    """
+    Rolls up, archives and removes log entries older than retain_days
+    (default LOG_RETENTION_DAYS). Returns (archive path or None, entries removed).
+    """
+    cutoff = retention_cutoff(retain_days)
+    rollup_logs(cutoff)
+    path, ids = archive_logs(cutoff, archive_dir)
+    removed = delete_archived(ids)
+    database.record_job_run('retention', cutoff=cutoff, archive=path, removed=removed)
+    return path, removed
+
+
+def restore_archive(path):
+    """Loads an archive written by archive_logs() back into 'logs'. Returns the number of entries inserted."""
+    inserted = 0
+
+    def flush(batch):
+        try:
+            return len(database.db['logs'].insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            # Entries still (or again) in the collection keep their _id and are skipped
+            if any(err.get('code') != DUPLICATE_KEY for err in e.details.get('writeErrors', [])):
+                raise
+            return e.details.get('nInserted', 0)
+
+    batch = []
+    with gzip.open(path, 'rt', encoding='utf-8') as src:
+        for line in src:
+            if line.strip():
+                batch.append(json_util.loads(line))
+            if len(batch) >= BATCH_SIZE:
+                inserted += flush(batch)
+                batch = []
+    if batch:
+        inserted += flush(batch)
+    return inserted
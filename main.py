@@ -0,0 +1,123 @@
+import tkinter as tk
+from tkinter import messagebox
+import importlib
+import os
+import database  # Shared MongoDB connection for every screen
+from task_runner import TaskRunner
+
+# SCREEN REGISTRY
+# Maps a page name to the (module, class) that builds it. Modules are imported
+# lazily the first time a page is opened and then stay loaded for the rest of
+# the session, so matplotlib/reportlab/openpyxl are only imported once.
+SCREENS = {
+    "Login": ("login", "LoginFrame"),
+    "Dashboard": ("dashboard", "MainMenuFrame"),
+    "LoanApplication": ("loan_application", "LoanApplicationApp"),
+    "LoanManagement": ("loan_management", "DashboardFrame"),
+    "LoanDetails": ("view_loan_details", "ViewLoanDetailsPage"),
+    "Repayment": ("repayment", "RepaymentWindow"),
+    "Reports": ("reports", "ReportsWindow"),
+    "UserManagement": ("user_management", "UserManagementFrame"),
+    "StatementReview": ("statement_review", "StatementReviewFrame"),
+}
+
+
+# MAIN APPLICATION CLASS
+class LoanApp(tk.Tk):
+    """Single long-lived window that hosts every screen of the system as a frame."""
+
+    def __init__(self, start_page="Login", role=None, user=None, loan_id=None):
+        super().__init__()
+        self.title("Loan Management System")
+        self.config(bg="#ecf0f1")
+
+        try:
+            if os.path.exists("bu logo.png"):
+                self.app_icon = tk.PhotoImage(file="bu logo.png")
+                self.iconphoto(True, self.app_icon)
+        except Exception as e:
+            print(f"Icon could not be loaded: {e}")
+
+        # SESSION STATE (kept in memory instead of being passed through sys.argv)
+        self.current_user_role = role or "Staff"
+        self.current_user_name = user or "Guest"
+        self.selected_loan_id = loan_id
+
+        # Screens run their database work here so the window stays responsive
+        self.tasks = TaskRunner(self)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        self.container = tk.Frame(self)
+        self.container.pack(side="top", fill="both", expand=True)
+        self.container.grid_rowconfigure(0, weight=1)
+        self.container.grid_columnconfigure(0, weight=1)
+
+        self.current_frame = None
+        self.current_page = None
+        self.show_frame(start_page)
+
+    def start_session(self, role, user):
+        """Stores the logged-in user's identity for all screens."""
+        self.current_user_role = role
+        self.current_user_name = user
+        self.selected_loan_id = None
+
+    def show_frame(self, page_name, **kwargs):
+        """Replaces the visible screen with page_name, building it inside the shared container."""
+        module_name, class_name = SCREENS[page_name]
+        try:
+            module = importlib.import_module(module_name)
+            frame_class = getattr(module, class_name)
+        except Exception as e:
+            messagebox.showerror("Navigation Error", f"Could not open '{page_name}': {e}")
+            return None
+
+        if "loan_id" in kwargs:
+            self.selected_loan_id = kwargs["loan_id"]
+
+        # Every screen starts from a resizable window; screens may lock it again.
+        self.resizable(True, True)
+
+        old_frame = self.current_frame
+        try:
+            frame = frame_class(parent=self.container, controller=self, **kwargs)
+        except Exception as e:
+            messagebox.showerror("Navigation Error", f"Failed to build '{page_name}': {e}")
+            return None
+
+        if old_frame is not None:
+            self.tasks.cancel_owner(old_frame)
+            old_frame.destroy()
+
+        frame.grid(row=0, column=0, sticky="nsew")
+        frame.tkraise()
+        self.current_frame = frame
+        self.current_page = page_name
+        return frame
+
+    def logout(self, details="User signed out of the system"):
+        """Logs the sign-out, clears the session and returns to the login screen."""
+        try:
+            database.log_activity(self.current_user_name, "Logout", details)
+        except Exception:
+            pass  # Ensure logout proceeds even if logging fails
+
+        self.current_user_role = "Staff"
+        self.current_user_name = "Guest"
+        self.selected_loan_id = None
+        self.show_frame("Login")
+
+
+    def on_close(self):
+        self.tasks.shutdown()
+        self.destroy()
+
+
+def run(start_page="Login", role=None, user=None, loan_id=None):
+    """Starts the application at the given screen and enters the Tk main loop."""
+    app = LoanApp(start_page=start_page, role=role, user=user, loan_id=loan_id)
+    app.mainloop()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,231 @@
+"""
+Platypus-based PDF analytics report for the Reports screen.
+
+The document is built from a stream of flowables: the summary, chart, status
+and portfolio-at-risk sections first, then the audit log for the chosen period as a series
+of page-sized tables with repeating header rows. Log entries are pulled from
+a MongoDB cursor while ReportLab lays out pages, so only a page or two of
+rows is held in memory however long the report is.
+"""
+import datetime
+import io
+from itertools import chain, islice
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import (SimpleDocTemplate, Table, TableStyle, Paragraph,
+                                Spacer, Image, PageBreak)
+
+import database
+import aging_engine
+
+# Log rows per table chunk; roughly one page at the log table font size
+LOG_ROWS_PER_TABLE = 45
+# Longer log details are cut so each row stays on one line
+LOG_DETAILS_MAX_CHARS = 80
+
+HEADER_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.darkgreen),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+]
+
+LOG_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+    ('FONTSIZE', (0, 0), (-1, -1), 7),
+    ('LEADING', (0, 0), (-1, -1), 8.5),
+    ('TOPPADDING', (0, 0), (-1, -1), 1),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+])
+
+
+class StreamingFlowables(list):
+    """
+    List of flowables that refills itself from an iterator as the document
+    builder consumes it.
+
+    BaseDocTemplate.build() loops on len() and pops from the front, so keeping
+    only a few items buffered lets arbitrarily long reports be laid out
+    without materializing every flowable first.
+    """
+
+    def __init__(self, source, buffered=4):
+        super().__init__()
+        self._source = iter(source)
+        self._buffered = buffered
+
+    def __len__(self):
+        while self._source is not None and list.__len__(self) < self._buffered:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+        return list.__len__(self)
+
+    def __bool__(self):
+        return len(self) > 0
+
+
+def format_timestamp(value):
+    """Formats a log timestamp for display (legacy logs may still hold strings)."""
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value or '')[:19]
+
+
+def _summary_flowables(styles, summary, period_label):
+    lent, rec, debt, count, status_counts = summary
+    yield Paragraph("BIG ON GOLD LOANS - ANALYTICS REPORT", styles['Title'])
+    yield Paragraph(f"Period: {period_label}", styles['Normal'])
+    yield Paragraph(f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal'])
+    yield Spacer(1, 6 * mm)
+
+    yield Paragraph("Financial Summary", styles['Heading2'])
+    table = Table([
+        ["Description", "Amount (RWF)"],
+        ["Total Capital Disbursed", f"{lent:,.0f}"],
+        ["Total Revenue Recovered", f"{rec:,.0f}"],
+        ["Money Outstanding", f"{debt:,.0f}"],
+        ["Active Loan Files", str(count)],
+    ], colWidths=[70 * mm, 50 * mm], hAlign='LEFT')
+    table.setStyle(TableStyle(HEADER_STYLE + [('ALIGN', (1, 1), (1, -1), 'RIGHT')]))
+    yield table
+    yield Spacer(1, 6 * mm)
+
+    yield Paragraph("Loan Status Breakdown", styles['Heading2'])
+    total = sum(status_counts.values()) or 1
+    rows = [["Status", "Loans", "Share"]]
+    for status, n in sorted(status_counts.items(), key=lambda kv: -kv[1]):
+        rows.append([status, f"{n:,}", f"{n * 100.0 / total:.1f}%"])
+    if len(rows) == 1:
+        rows.append(["No loans in this period", "", ""])
+    table = Table(rows, colWidths=[70 * mm, 25 * mm, 25 * mm], hAlign='LEFT')
+    table.setStyle(TableStyle(HEADER_STYLE + [('ALIGN', (1, 1), (-1, -1), 'RIGHT')]))
+    yield table
+
+
+def _chart_flowables(styles, chart_png, width):
+    if not chart_png:
+        return
+    yield Spacer(1, 6 * mm)
+    yield Paragraph("Charts", styles['Heading2'])
+    img = Image(io.BytesIO(chart_png))
+    # Scale to the frame width, keeping the aspect ratio
+    ratio = width / float(img.imageWidth)
+    img.drawWidth = width
+    img.drawHeight = img.imageHeight * ratio
+    yield img
+
+
+def _aging_flowables(styles):
+    report = aging_engine.aging_report()
+    yield Spacer(1, 6 * mm)
+    yield Paragraph("Portfolio at Risk", styles['Heading2'])
+    as_of = f"{report['as_of']:%Y-%m-%d}" if report['as_of'] else "never (run db_admin.py aging)"
+    yield Paragraph(f"Loans being repaid, aged as of {as_of}.", styles['Normal'])
+    yield Spacer(1, 2 * mm)
+
+    total = report['outstanding'] or 1
+    rows = [["Days Past Due", "Loans", "Outstanding (RWF)", "Share", "Arrears (RWF)"]]
+    for bucket, loans, outstanding, arrears in report['buckets']:
+        rows.append([bucket, f"{loans:,}", f"{outstanding:,.0f}", f"{outstanding * 100.0 / total:.1f}%", f"{arrears:,.0f}"])
+    for name, at_risk, share in report['par']:
+        rows.append([name, "", f"{at_risk:,.0f}", f"{share * 100:.2f}%", ""])
+    table = Table(rows, colWidths=[35 * mm, 20 * mm, 40 * mm, 20 * mm, 35 * mm], hAlign='LEFT')
+    table.setStyle(TableStyle(HEADER_STYLE + [
+        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (0, len(report['buckets']) + 1), (-1, -1), 'Helvetica-Bold'),
+    ]))
+    yield table
+
+
+def _rollup_flowables(styles, log_range):
+    """Daily activity totals for the part of the period whose raw entries were archived."""
+    rollups = database.iter_log_rollups(*log_range)
+    first = next(rollups, None)
+    if first is None:
+        return
+    yield PageBreak()
+    yield Paragraph("Archived Activity (daily totals)", styles['Heading2'])
+    yield Paragraph(f"Entries older than {database.LOG_RETENTION_DAYS} days are kept as daily counts per user "
+                    f"and action; the full entries are in the log archive files.", styles['Normal'])
+    yield Spacer(1, 3 * mm)
+
+    header = ["Date", "User", "Action", "Entries", "First", "Last"]
+    rollups = chain([first], rollups)
+    while True:
+        chunk = list(islice(rollups, LOG_ROWS_PER_TABLE))
+        if not chunk:
+            break
+        rows = [header]
+        for r in chunk:
+            rows.append([database.format_date(r.get('date')), str(r.get('user', '') or ''), str(r.get('action', '') or ''),
+                         f"{r.get('count', 0):,}", format_timestamp(r.get('first'))[11:], format_timestamp(r.get('last'))[11:]])
+        table = Table(rows, colWidths=[22 * mm, 40 * mm, 50 * mm, 18 * mm, 25 * mm, 25 * mm], repeatRows=1, hAlign='LEFT')
+        table.setStyle(LOG_TABLE_STYLE)
+        yield table
+
+
+def _log_flowables(styles, log_range):
+    start_date, end_date = log_range
+    total = database.count_logs(start_date, end_date)
+    yield PageBreak()
+    yield Paragraph("User Activity Logs", styles['Heading2'])
+    yield Paragraph(f"{total:,} entries, oldest first.", styles['Normal'])
+    yield Spacer(1, 3 * mm)
+
+    header = ["Timestamp", "User", "Action", "Details"]
+    logs = database.iter_logs(start_date, end_date)
+    while True:
+        chunk = list(islice(logs, LOG_ROWS_PER_TABLE))
+        if not chunk:
+            break
+        rows = [header]
+        for log in chunk:
+            details = str(log.get('details', '') or '')
+            if len(details) > LOG_DETAILS_MAX_CHARS:
+                details = details[:LOG_DETAILS_MAX_CHARS - 3] + "..."
+            rows.append([format_timestamp(log.get('timestamp')), str(log.get('user', '') or ''),
+                         str(log.get('action', '') or ''), details])
+        # repeatRows keeps the header on every page a chunk is split across
+        table = Table(rows, colWidths=[30 * mm, 32 * mm, 32 * mm, 86 * mm], repeatRows=1, hAlign='LEFT')
+        table.setStyle(LOG_TABLE_STYLE)
+        yield table
+
+
+def _draw_page_footer(canvas, doc):
+    canvas.saveState()
+    canvas.setFont('Helvetica', 8)
+    canvas.setFillColor(colors.grey)
+    canvas.drawString(doc.leftMargin, 10 * mm, "BIG ON GOLD LOANS - Confidential")
+    canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, 10 * mm, f"Page {doc.page}")
+    canvas.restoreState()
+
+
+def build_analytics_report(file_path, summary, chart_png=None, period_label="Whole business", log_range=(None, None)):
+    """
+    Writes the analytics report to file_path.
+
+    summary is the (lent, recovered, outstanding, active_count, status_counts)
+    tuple shown on the Reports screen, chart_png the rendered charts as PNG
+    bytes, and log_range the (start, end) timestamps of the audit log section.
+    """
+    doc = SimpleDocTemplate(file_path, pagesize=A4,
+                            leftMargin=15 * mm, rightMargin=15 * mm,
+                            topMargin=15 * mm, bottomMargin=18 * mm,
+                            title="Analytics Report", author="BIG ON GOLD LOANS")
+    styles = getSampleStyleSheet()
+
+    def story():
+        yield from _summary_flowables(styles, summary, period_label)
+        yield from _chart_flowables(styles, chart_png, doc.width)
+        yield from _aging_flowables(styles)
+        yield from _rollup_flowables(styles, log_range)
+        yield from _log_flowables(styles, log_range)
+
+    doc.build(StreamingFlowables(story()), onFirstPage=_draw_page_footer, onLaterPages=_draw_page_footer)
@@ -3,56 +3,52 @@ from tkinter import ttk, messagebox
 from tkcalendar import DateEntry
 import datetime
 import database
-import sys
-import subprocess
+import schedule_engine
+import loan_rules
 import os
 from bson.objectid import ObjectId
 
-# SESSION PERSISTENCE 
-try:
-    if len(sys.argv) > 3:
-        LOAN_ID_FROM_ARGS = sys.argv[1]
-        CURRENT_USER_ROLE = sys.argv[2]
-        CURRENT_USER_NAME = sys.argv[3]
-    else:
-        LOAN_ID_FROM_ARGS = None
-        CURRENT_USER_ROLE = "Staff"
-        CURRENT_USER_NAME = "Guest"
-except IndexError:
-    LOAN_ID_FROM_ARGS = None
-    CURRENT_USER_ROLE = "Staff"
-    CURRENT_USER_NAME = "Guest"
-
-class RepaymentWindow(tk.Tk): 
-    def __init__(self, loan_data=None):
-        super().__init__()
+class RepaymentWindow(tk.Frame): 
+    def __init__(self, parent, controller, loan_id=None, loan_data=None):
+        super().__init__(parent)
+        self.controller = controller
+        self.icon_path = "bu logo.png"
         
-        if loan_data is None and LOAN_ID_FROM_ARGS:
-            try:
-                self.loan_data = database.db['loans'].find_one({"_id": ObjectId(LOAN_ID_FROM_ARGS)})
-            except Exception:
-                self.loan_data = None
-        else:
-            self.loan_data = loan_data
+        self.config(bg="#f8f9fa") 
+
+        # Loan, payments and totals are fetched together in one round trip, off the Tk thread
+        self.loading_label = tk.Label(self, text="Loading loan file...", font=("Segoe UI", 12), bg="#f8f9fa", fg="#7f8c8d")
+        self.loading_label.pack(pady=50)
+        controller.tasks.submit(self._load_loan_file, loan_id if loan_id else (loan_data or {}).get('_id'),
+                                on_done=self._build, owner=self)
+
+    @staticmethod
+    def _load_loan_file(loan_id):
+        """The loan file plus its installment schedule. Runs on a worker thread."""
+        loan_file = database.get_loan_file(loan_id)
+        if loan_file:
+            loan_file['installments'] = database.get_installments(loan_file['loan']['_id'])
+        return loan_file
+
+    def _build(self, loan_file):
+        """Builds the screen once the loan file has arrived."""
+        controller = self.controller
+        self.loading_label.destroy()
+        self.loan_file = loan_file
+        self.loan_data = self.loan_file['loan'] if self.loan_file else None
+        self.installments = self.loan_file.get('installments', []) if self.loan_file else []
 
         if not self.loan_data:
             messagebox.showerror("Error", "No loan record found. Returning to management.")
             self._handle_go_back()
             return
 
-        self.loan_id = self.loan_data['_id'] 
+        # Payments reference the loan by its ObjectId
+        loan_key = self.loan_data['_id']
+        self.loan_id = ObjectId(loan_key) if database.is_valid_object_id(loan_key) else loan_key
         
-        self.title(f"Repayment Management - {self.loan_data.get('customer_name', 'Unknown')} (User: {CURRENT_USER_NAME})")
-        self.geometry("1150x700") 
-        self.config(bg="#f8f9fa") 
-
-        try:
-            self.icon_path = "bu logo.png"
-            if os.path.exists(self.icon_path):
-                img = tk.PhotoImage(file=self.icon_path)
-                self.iconphoto(False, img)
-        except Exception as e:
-            print(f"Icon could not be loaded: {e}")
+        controller.title(f"Repayment Management - {self.loan_data.get('customer_name', 'Unknown')} (User: {controller.current_user_name})")
+        controller.geometry("1150x700") 
         
         self.colors = {
             "primary": "#2c3e50",
@@ -125,10 +121,7 @@ class RepaymentWindow(tk.Tk):
         tk.Label(form_frame, text="Next Payment Date", bg="white", font=("Segoe UI", 9)).grid(row=0, column=2, sticky="w")
         self.next_payment_date_entry = DateEntry(form_frame, width=12, background=self.colors["primary"], 
                                                   foreground='white', borderwidth=2, date_pattern='yyyy-mm-dd')
-        
-        plan = str(self.loan_data.get('payment_plan', 'Monthly')).lower()
-        suggested_date = datetime.date.today() + (datetime.timedelta(days=7) if "weekly" in plan else datetime.timedelta(days=30))
-        self.next_payment_date_entry.set_date(suggested_date)
+        self._suggest_next_payment()
         self.next_payment_date_entry.grid(row=1, column=2, padx=(0,10), pady=5)
         
         tk.Label(form_frame, text="Payment Method", bg="white", font=("Segoe UI", 9)).grid(row=0, column=3, sticky="w")
@@ -139,12 +132,12 @@ class RepaymentWindow(tk.Tk):
 
         tk.Label(form_frame, text="Received By", bg="white", font=("Segoe UI", 9)).grid(row=0, column=4, sticky="w")
         self.received_by_entry = tk.Entry(form_frame, font=("Segoe UI", 11), width=12, highlightthickness=1, highlightbackground="#dcdde1", relief="flat")
-        self.received_by_entry.insert(0, CURRENT_USER_NAME)
+        self.received_by_entry.insert(0, self.controller.current_user_name)
         self.received_by_entry.grid(row=1, column=4, pady=5)
 
-        btn_submit = tk.Button(form_frame, text="CONFIRM PAYMENT", bg=self.colors["success"], fg="white", 
+        self.btn_submit = tk.Button(form_frame, text="CONFIRM PAYMENT", bg=self.colors["success"], fg="white", 
                                font=("Segoe UI", 9, "bold"), relief="flat", padx=15, command=self.record_payment, cursor="hand2")
-        btn_submit.grid(row=0, column=5, rowspan=2, padx=(15, 0), sticky="ns")
+        self.btn_submit.grid(row=0, column=5, rowspan=2, padx=(15, 0), sticky="ns")
 
     def create_payment_view(self):
         view_frame = tk.Frame(self, bg=self.colors["bg"])
@@ -180,28 +173,19 @@ class RepaymentWindow(tk.Tk):
                   relief="flat", padx=20, command=self.generate_receipt, cursor="hand2").pack(side="right")
 
     def _handle_go_back(self):
-        try:
-            filename = "loan management.py" if os.path.exists("loan management.py") else "loan_management.py"
-            subprocess.Popen([sys.executable, filename, CURRENT_USER_ROLE, CURRENT_USER_NAME])
-            self.destroy()
-        except Exception as e:
-            messagebox.showerror("Navigation Error", f"Failed to open management: {e}")
+        self.controller.show_frame("LoanManagement")
 
     def handle_logout(self):
         if messagebox.askyesno("Confirm Logout", "Are you sure you want to sign out?"):
-            database.log_activity(CURRENT_USER_NAME, "Logout", "User signed out from Repayment screen")
-            try:
-                subprocess.Popen([sys.executable, "login.py"])
-                self.destroy()
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to logout: {e}")
+            self.controller.logout("User signed out from Repayment screen")
 
     def load_payments(self):
         for item in self.payments_tree.get_children():
             self.payments_tree.delete(item)
             
-        payment_list = database.get_payments_by_loan(self.loan_id)
-        total_paid = database.get_total_paid_for_loan(self.loan_id)
+        payment_list = self.loan_file['payments']
+        total_paid = self.loan_file['total_paid']
+        remaining = self.loan_file['remaining_balance']
         
         for payment in payment_list:
             rec_date = payment.get('recorded_date', 'N/A')
@@ -216,8 +200,6 @@ class RepaymentWindow(tk.Tk):
                 rec_date
             ))
             
-        loan_amount = float(self.loan_data.get('loan_amount', 0))
-        remaining = loan_amount - total_paid
         self.total_paid_var.set(f"RWF {total_paid:,.2f}")
         self.remaining_var.set(f"RWF {max(0, remaining):,.2f}")
         
@@ -228,7 +210,7 @@ class RepaymentWindow(tk.Tk):
             new_status = "Under Payment"
         
         if self.loan_data.get('status') != new_status:
-            database.update_loan_status(self.loan_id, new_status)
+            self.controller.tasks.submit(database.update_loan_status, self.loan_id, new_status, busy=False)
             self.loan_data['status'] = new_status
 
     def record_payment(self):
@@ -239,9 +221,8 @@ class RepaymentWindow(tk.Tk):
 
         amount_str = self.amount_entry.get().strip()
         try:
-            amount = float(amount_str)
-            if amount <= 0: raise ValueError
-        except ValueError:
+            amount = loan_rules.parse_amount(amount_str)
+        except loan_rules.ValidationError:
             messagebox.showerror("Validation Error", "Enter a valid payment amount.")
             return
 
@@ -260,18 +241,50 @@ class RepaymentWindow(tk.Tk):
             'recorded_date': datetime.datetime.now()
         }
         
-        if database.save_payment(payment_data):
-            database.log_activity(
-                CURRENT_USER_NAME, 
-                "Payment Recorded", 
-                f"Recorded payment of RWF {amount:,.2f} for {self.loan_data.get('customer_name')}"
-            )
-            database.db['loans'].update_one({"_id": self.loan_id}, {"$set": {"next_payment": next_payment_date}})
-            messagebox.showinfo("Success", "Payment recorded successfully.")
-            self.amount_entry.delete(0, tk.END)
-            self.load_payments()
-        else:
+        # Disabled until the save finishes so a double click cannot record the payment twice
+        self.btn_submit.config(state=tk.DISABLED)
+        self.controller.tasks.submit(self._save_payment, payment_data, next_payment_date,
+                                     on_done=lambda loan_file: self._on_payment_saved(loan_file, amount),
+                                     on_error=self._on_payment_failed, owner=self)
+
+    def _save_payment(self, payment_data, next_payment_date):
+        """Stores the payment and returns the refreshed loan file, or None on failure. Runs on a worker thread."""
+        if not database.save_payment(payment_data):
+            return None
+        database.update_loan_details(self.loan_id, {"next_payment": database.parse_date(next_payment_date)})
+        return database.get_loan_file(self.loan_id) or self.loan_file
+
+    def _on_payment_failed(self, e):
+        self.btn_submit.config(state=tk.NORMAL)
+        messagebox.showerror("Error", f"Failed to save payment: {e}")
+
+    def _on_payment_saved(self, loan_file, amount):
+        self.btn_submit.config(state=tk.NORMAL)
+        if loan_file is None:
             messagebox.showerror("Error", "Failed to save payment.")
+            return
+
+        database.log_activity(
+            self.controller.current_user_name, 
+            "Payment Recorded", 
+            f"Recorded payment of RWF {amount:,.2f} for {self.loan_data.get('customer_name')}"
+        )
+        messagebox.showinfo("Success", "Payment recorded successfully.")
+        self.amount_entry.delete(0, tk.END)
+        self.loan_file = loan_file
+        self.loan_data = loan_file['loan']
+        self._suggest_next_payment()
+        self.load_payments()
+
+    def _suggest_next_payment(self):
+        """Pre-fills the next payment date from the installment schedule, or one period ahead for unscheduled loans."""
+        suggested = schedule_engine.next_due_date(self.installments, self.loan_file['total_paid'])
+        if suggested is not None:
+            suggested = suggested.date()
+        else:
+            weekly = schedule_engine.is_weekly(self.loan_data.get('payment_plan', 'Monthly'))
+            suggested = datetime.date.today() + datetime.timedelta(days=7 if weekly else 30)
+        self.next_payment_date_entry.set_date(suggested)
 
     def generate_receipt(self):
         selected = self.payments_tree.focus()
@@ -281,7 +294,7 @@ class RepaymentWindow(tk.Tk):
 
         values = self.payments_tree.item(selected)['values']
         database.log_activity(
-            CURRENT_USER_NAME, 
+            self.controller.current_user_name, 
             "Receipt Generated", 
             f"Generated digital receipt for {self.loan_data.get('customer_name')} - Amount: RWF {values[1]}"
         )
@@ -305,7 +318,7 @@ class RepaymentWindow(tk.Tk):
         
         # Determine status message
         is_finished = self.loan_data.get('status') == "Fully Paid"
-        status_msg = "LOAN FULLY CLEARED!" if is_finished else f"NEXT DUE DATE: {self.loan_data.get('next_payment', 'N/A')}"
+        status_msg = "LOAN FULLY CLEARED!" if is_finished else f"NEXT DUE DATE: {database.format_date(self.loan_data.get('next_payment'))}"
 
         receipt_text = f"""
 ===========================================
@@ -343,5 +356,9 @@ We value your partnership!
                   command=lambda: messagebox.showinfo("Printer", "Sending to printer...")).pack(pady=20)
 
 if __name__ == "__main__":
-    app = RepaymentWindow()
-    app.mainloop()
\ No newline at end of file
+    import sys
+    import main
+    if len(sys.argv) > 3:
+        main.run("Repayment", role=sys.argv[2], user=sys.argv[3], loan_id=sys.argv[1])
+    else:
+        main.run("LoanManagement")
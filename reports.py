@@ -1,56 +1,33 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 import database
-import sys
-import subprocess
-import os
 import datetime
 import matplotlib
 # Use the TkAgg backend explicitly to prevent startup crashes in some environments
 matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle
+import math
+import numpy as np
+from pdf_report import build_analytics_report, format_timestamp
+import aging_engine
 from PIL import Image, ImageTk
 import io
-
-# SESSION PERSISTENCE 
-try:
-    if len(sys.argv) > 2:
-        CURRENT_USER_ROLE = sys.argv[1]
-        CURRENT_USER_NAME = sys.argv[2]
-    else:
-        # Defaults if the script is run directly without arguments
-        CURRENT_USER_ROLE = "Admin"
-        CURRENT_USER_NAME = "Guest"
-except IndexError:
-    CURRENT_USER_ROLE = "Admin"
-    CURRENT_USER_NAME = "Guest"
+import os
 
 # --- MAIN WINDOW CLASS ---
-# Inherits from tk.Tk to create the primary window for reports and analytics.
-class ReportsWindow(tk.Tk):
-    def __init__(self):
-        super().__init__()
+# Inherits from tk.Frame so the reports screen is hosted inside the main application window.
+class ReportsWindow(tk.Frame):
+    def __init__(self, parent, controller):
+        super().__init__(parent)
+        self.controller = controller
         
         # BASIC WINDOW CONFIGURATION
         
-        self.title(f"BIG ON GOLD - Analytics & Logs - {CURRENT_USER_NAME}")
-        self.geometry("1250x750")
+        controller.title(f"BIG ON GOLD - Analytics & Logs - {controller.current_user_name}")
+        controller.geometry("1250x750")
         self.config(bg="#f4f7f6")
 
-        # APPLICATION ICON SETUP
-        # Display the company logo as the window icon.
-        try:
-            self.icon_img = Image.open("bu logo.png")
-            self.icon_photo = ImageTk.PhotoImage(self.icon_img)
-            self.iconphoto(False, self.icon_photo)
-        except Exception:
-            pass # Silently fail if image is missing
-
         # THEME COLOR PALETTE
         # Defines a consistent set of hex colors used throughout the UI components.
         self.colors = {
@@ -88,10 +65,22 @@ class ReportsWindow(tk.Tk):
         self.tab_audit = tk.Frame(self.notebook, bg=self.colors["bg"])
         self.notebook.add(self.tab_audit, text="  🔑  USER ACTIVITY LOGS  ")
 
+        # TAB 3: PORTFOLIO TRENDS
+        # Daily snapshots stored by `python db_admin.py snapshot`.
+        self.tab_trends = tk.Frame(self.notebook, bg=self.colors["bg"])
+        self.notebook.add(self.tab_trends, text="  📈  PORTFOLIO TRENDS  ")
+
+        # TAB 4: PORTFOLIO AT RISK
+        # Aging buckets stored on the loans by `python db_admin.py aging`.
+        self.tab_par = tk.Frame(self.notebook, bg=self.colors["bg"])
+        self.notebook.add(self.tab_par, text="  ⚠  PORTFOLIO AT RISK  ")
+
         # CONTENT POPULATION
         # Calls methods to build the interior UI of each tab and the bottom control bar.
         self.setup_finance_tab()
         self.setup_audit_tab()
+        self.setup_trends_tab()
+        self.setup_par_tab()
         self.create_bottom_controls()
 
     def create_header(self):
@@ -118,30 +107,12 @@ class ReportsWindow(tk.Tk):
         tk.Label(title_frame, text="BIG ON GOLD LOANS", font=("Segoe UI", 16, "bold"), 
                   bg=self.colors["primary"], fg="white").pack(anchor="w")
 
-    def _get_filtered_data(self, start_date=None):
-        """Fetches loan and payment data from the database and calculates financial metrics."""
-        try:
-            query = {}
-            if start_date:
-                # Uses a regex to match the beginning of the date string (YYYY-MM-DD)
-                query = {"date": {"$regex": f"^{start_date}"}} 
-            
-            # Retrieve documents from MongoDB collections
-            loans = list(database.db['loans'].find(query))
-            payments = list(database.db['payments'].find()) 
-            
-            # Calculate financial totals
-            total_lent = sum(float(l.get('loan_amount', 0)) for l in loans)
-            
-            # Calculate recovery by matching payment loan_ids with currently filtered loans
-            total_rec = sum(float(p.get('payment_amount', 0)) for p in payments if any(str(l['_id']) == str(p.get('loan_id')) for l in loans))
-            
-            debt = total_lent - total_rec
-            active_count = len([l for l in loans if l.get('status') not in ['Fully Paid', 'Rejected']])
-            
-            return total_lent, total_rec, debt, active_count, loans
-        except Exception:
-            return 0, 0, 0, 0, []
+    def _get_filtered_data(self, date_range=None):
+        """Fetches portfolio metrics computed by the database for the optional (start, end) application date range."""
+        start_date, end_date = date_range if date_range else (None, None)
+        summary = database.get_portfolio_summary(start_date, end_date)
+        return (summary['lent'], summary['recovered'], summary['outstanding'],
+                summary['active_count'], summary['status_counts'])
 
     def setup_finance_tab(self):
         """Builds the UI elements for the Financial Analytics tab."""
@@ -163,58 +134,176 @@ class ReportsWindow(tk.Tk):
         self.chart_area = tk.Frame(self.tab_finance, bg="white", highlightthickness=1, highlightbackground="#dcdde1")
         self.chart_area.pack(fill="both", expand=True, padx=20, pady=5)
         
+        self.current_data = None
+        self._create_finance_widgets()
         self.refresh_finance()
 
-    def ask_date_filter(self):
-        """Invokes a simple dialog box to collect a filter date from the user."""
-        date_str = simpledialog.askstring("Filter", "Enter date (YYYY-MM-DD):")
-        if date_str:
-            self.refresh_finance(date_str)
+    def _create_finance_widgets(self):
+        """Creates the summary cards, figure and canvas once; refreshes only update their contents."""
+        self.card_values = [
+            self._build_card(self.card_container, "TOTAL CASH GIVEN OUT", "RWF 0", 0),
+            self._build_card(self.card_container, "TOTAL RECOVERY", "RWF 0", 1),
+            self._build_card(self.card_container, "MONEY NOT YET RECOVERED", "RWF 0", 2),
+        ]
 
-    def refresh_finance(self, date_filter=None):
-        """Re-fetches database data and redraws both the summary cards and the charts."""
-        # Clear existing widgets to avoid duplication
-        for widget in self.card_container.winfo_children(): widget.destroy()
-        for widget in self.chart_area.winfo_children(): widget.destroy()
-
-        # Fetch new data based on current filter
-        self.current_data = self._get_filtered_data(date_filter)
-        lent, rec, debt, count, loans = self.current_data
-
-        # Re-build summary metric cards
-        self._build_card(self.card_container, "TOTAL CASH GIVEN OUT", f"RWF {lent:,.0f}", 0)
-        self._build_card(self.card_container, "TOTAL RECOVERY", f"RWF {rec:,.0f}", 1)
-        self._build_card(self.card_container, "MONEY NOT YET RECOVERED", f"RWF {debt:,.0f}", 2)
-
-        # MATPLOTLIB CHART GENERATION
-        # Clears previous figures to prevent memory leaks and performance lag.
-        plt.close('all') 
-        self.fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10, 3), dpi=90)
-        
-        # CHART 1: Pie chart of Loan Status Distribution
-        statuses = [l.get('status', 'Pending') for l in loans]
-        status_counts = {s: statuses.count(s) for s in set(statuses)}
-        
-        if status_counts:
-            ax1.pie(status_counts.values(), labels=status_counts.keys(), autopct='%1.1f%%', colors=['#3498db', '#2ecc71', '#e74c3c'])
-        else:
-            ax1.text(0.5, 0.5, 'No Data', ha='center')
-        ax1.set_title("Status Breakdown")
+        self.fig = Figure(figsize=(10, 3), dpi=90)
+        self.ax_pie, self.ax_bar = self.fig.subplots(1, 2)
+
+        # CHART 1: Pie chart of Loan Status Distribution (wedges are created by _update_pie)
+        self.ax_pie.set_title("Status Breakdown")
+        self.ax_pie.set_aspect('equal')
+        self.pie_statuses = None
+        self.pie_artists = []
 
         # CHART 2: Bar chart comparing Lent vs Recovered vs Debt
-        ax2.bar(['Given Out', 'Recovered', 'In Debt'], [lent, rec, debt], color=[self.colors["dark"], self.colors["primary"], "#e74c3c"])
-        ax2.set_title("Financial Health")
+        self.bars = self.ax_bar.bar(['Given Out', 'Recovered', 'In Debt'], [0, 0, 0],
+                                    color=[self.colors["dark"], self.colors["primary"], "#e74c3c"])
+        self.ax_bar.set_title("Financial Health")
 
         # Integrate the Matplotlib canvas into the Tkinter frame
-        canvas_plot = FigureCanvasTkAgg(self.fig, master=self.chart_area)
-        canvas_plot.get_tk_widget().pack(fill="both", expand=True)
+        self.canvas_plot = FigureCanvasTkAgg(self.fig, master=self.chart_area)
+        self.canvas_plot.get_tk_widget().pack(fill="both", expand=True)
+
+        # PNG of the charts per filter, captured from the Agg buffer after each draw for the PDF export
+        self.chart_png_cache = {}
+        self._png_pending = None
+        self.canvas_plot.mpl_connect('draw_event', self._capture_chart_png)
+
+    def _ask_date_range(self, title, from_prompt, start_default=None, end_default=None):
+        """Asks for a from/to date pair and returns the half-open range (start, end + 1 day), or None."""
+        start_str = simpledialog.askstring(title, from_prompt, initialvalue=start_default)
+        if not start_str:
+            return None
+        end_str = simpledialog.askstring(title, "Up to and including (YYYY-MM-DD):", initialvalue=end_default or start_str)
+        try:
+            start_date = datetime.datetime.strptime(start_str.strip(), "%Y-%m-%d")
+            end_date = datetime.datetime.strptime((end_str or start_str).strip(), "%Y-%m-%d") + datetime.timedelta(days=1)
+        except ValueError:
+            messagebox.showerror("Invalid Date", "Please enter dates as YYYY-MM-DD.")
+            return None
+        return start_date, end_date
+
+    def ask_date_filter(self):
+        """Collects an application date range from the user (end date defaults to the start date)."""
+        date_range = self._ask_date_range("Filter", "Loans applied from (YYYY-MM-DD):")
+        if date_range:
+            self.refresh_finance(date_range)
+
+    def refresh_finance(self, date_filter=None):
+        """Re-fetches database data and redraws both the summary cards and the charts."""
+
+        # Fetch new data based on current filter; the aggregation runs on the task runner
+        self.current_filter = date_filter
+        self.controller.tasks.submit(self._get_filtered_data, date_filter,
+                                     on_done=self._show_finance, owner=self)
+
+    def _show_finance(self, data):
+        """Draws the summary cards and charts for freshly fetched portfolio figures."""
+        self.current_data = data
+        lent, rec, debt, count, status_counts = self.current_data
+
+        # Update summary metric cards
+        for label, value in zip(self.card_values, (lent, rec, debt)):
+            label.config(text=f"RWF {value:,.0f}")
+
+        self._update_pie(status_counts)
+
+        for bar, height in zip(self.bars, (lent, rec, debt)):
+            bar.set_height(height)
+        self.ax_bar.relim()
+        self.ax_bar.autoscale_view()
+
+        self._png_pending = (self._filter_key(self.current_filter), self.current_data)
+        self.canvas_plot.draw_idle()
+
+    PIE_COLORS = ['#3498db', '#2ecc71', '#e74c3c']
+
+    def _update_pie(self, status_counts):
+        """Moves the existing wedges and labels to the new shares; rebuilds only when the set of statuses changes."""
+        statuses = list(status_counts)
+        total = float(sum(status_counts.values()))
+        if statuses != self.pie_statuses or not total:
+            for artist in self.pie_artists:
+                artist.remove()
+            self.pie_artists = []
+            self.pie_statuses = statuses
+            if not total:
+                self.pie_artists.append(self.ax_pie.text(0.5, 0.5, 'No Data', ha='center', transform=self.ax_pie.transAxes))
+                return
+            wedges, labels, pcts = self.ax_pie.pie(list(status_counts.values()), labels=statuses, autopct='%1.1f%%',
+                                                   colors=self.PIE_COLORS)
+            self.pie_wedges = list(zip(wedges, labels, pcts))
+            self.pie_artists = list(wedges) + list(labels) + list(pcts)
+            return
+
+        # Same statuses as before: recompute angles exactly as Axes.pie() lays them out
+        theta1 = 0.0
+        for (wedge, label, pct), count in zip(self.pie_wedges, status_counts.values()):
+            frac = count / total
+            theta2 = theta1 + 360.0 * frac
+            wedge.set_theta1(theta1)
+            wedge.set_theta2(theta2)
+            mid = math.radians((theta1 + theta2) / 2.0)
+            x, y = math.cos(mid), math.sin(mid)
+            label.set_position((1.1 * x, 1.1 * y))
+            label.set_horizontalalignment('left' if x > 0 else 'right')
+            label.set_verticalalignment('center')
+            pct.set_position((0.6 * x, 0.6 * y))
+            pct.set_text(f"{frac * 100:.1f}%")
+            theta1 = theta2
+
+    @staticmethod
+    def _filter_key(date_filter):
+        return tuple(date_filter) if date_filter else None
+
+    def _capture_chart_png(self, event):
+        """Encodes the freshly drawn canvas buffer as PNG for the current filter (no second render)."""
+        if self._png_pending is None:
+            return
+        key, data = self._png_pending
+        self._png_pending = None
+        pixels = np.asarray(self.canvas_plot.buffer_rgba())
+        png = io.BytesIO()
+        Image.fromarray(pixels).save(png, format='PNG')
+        self.chart_png_cache[key] = (data, png.getvalue())
+
+    def _chart_png(self):
+        """PNG of the charts for the current filter, from the cache when the figures have not changed."""
+        cached = self.chart_png_cache.get(self._filter_key(self.current_filter))
+        if cached and cached[0] == self.current_data:
+            return cached[1]
+        imgdata = io.BytesIO()
+        self.fig.savefig(imgdata, format='png', bbox_inches='tight')
+        return imgdata.getvalue()
+
+    LOG_PAGE_SIZE = 100
+    ANY = "(any)"
 
     def setup_audit_tab(self):
-        """Builds the UI elements for the Activity Logs tab including the scrollable table."""
+        """Builds the Activity Logs tab: user/action/date filters over a paged, scrollable table."""
         filter_frame = tk.Frame(self.tab_audit, bg=self.colors["bg"])
         filter_frame.pack(fill="x", padx=20, pady=5)
 
-        tk.Button(filter_frame, text="Show All Logs", command=lambda: self.load_logs(None), 
+        tk.Label(filter_frame, text="User", bg=self.colors["bg"], font=("Segoe UI", 9)).pack(side="left")
+        self.log_user_combo = ttk.Combobox(filter_frame, width=16, values=[self.ANY])
+        self.log_user_combo.set(self.ANY)
+        self.log_user_combo.pack(side="left", padx=(3, 10))
+
+        tk.Label(filter_frame, text="Action", bg=self.colors["bg"], font=("Segoe UI", 9)).pack(side="left")
+        self.log_action_combo = ttk.Combobox(filter_frame, width=20, values=[self.ANY])
+        self.log_action_combo.set(self.ANY)
+        self.log_action_combo.pack(side="left", padx=(3, 10))
+
+        tk.Label(filter_frame, text="From", bg=self.colors["bg"], font=("Segoe UI", 9)).pack(side="left")
+        self.log_from_entry = tk.Entry(filter_frame, width=11)
+        self.log_from_entry.pack(side="left", padx=(3, 10))
+        tk.Label(filter_frame, text="To", bg=self.colors["bg"], font=("Segoe UI", 9)).pack(side="left")
+        self.log_to_entry = tk.Entry(filter_frame, width=11)
+        self.log_to_entry.pack(side="left", padx=(3, 10))
+
+        tk.Button(filter_frame, text="Apply Filters", command=self.apply_log_filters,
+                  bg=self.colors["accent"], fg="white").pack(side="left", padx=5)
+        tk.Button(filter_frame, text="Show All Logs", command=self.clear_log_filters, 
                   bg=self.colors["dark"], fg="white").pack(side="left", padx=5)
         
         tree_frame = tk.Frame(self.tab_audit, bg="white")
@@ -224,20 +313,235 @@ class ReportsWindow(tk.Tk):
         columns = ("Time", "User", "Action", "Details")
         self.audit_tree = ttk.Treeview(tree_frame, columns=columns, show="headings", height=12)
         for col in columns: self.audit_tree.heading(col, text=col)
+        audit_scroll = ttk.Scrollbar(tree_frame, orient="vertical", command=self.audit_tree.yview)
+        self.audit_tree.configure(yscrollcommand=audit_scroll.set)
+        audit_scroll.pack(side="right", fill="y")
         self.audit_tree.pack(fill="both", expand=True)
+
+        # PAGER: keyset cursors for every page reached so far, so Newer can step back
+        pager = tk.Frame(self.tab_audit, bg=self.colors["bg"])
+        pager.pack(fill="x", padx=20, pady=(0, 5))
+        self.log_newer_btn = tk.Button(pager, text="◀ Newer", command=lambda: self.show_log_page(self.log_page - 1), state=tk.DISABLED)
+        self.log_newer_btn.pack(side="left")
+        self.log_older_btn = tk.Button(pager, text="Older ▶", command=lambda: self.show_log_page(self.log_page + 1), state=tk.DISABLED)
+        self.log_older_btn.pack(side="left", padx=5)
+        self.log_page_label = tk.Label(pager, text="", bg=self.colors["bg"], fg="#7f8c8d", font=("Segoe UI", 9))
+        self.log_page_label.pack(side="left", padx=10)
+
+        self.controller.tasks.submit(database.get_log_filter_values, on_done=self._show_log_filter_values,
+                                     on_error=lambda e: None, owner=self)
         self.load_logs()
 
-    def load_logs(self, date_filter=None):
-        """Fetches the latest 100 activity logs from the database and inserts them into the table."""
-        for i in self.audit_tree.get_children(): self.audit_tree.delete(i)
-        query = {}
-        if date_filter: query = {"timestamp": {"$regex": f"^{date_filter}"}}
+    def _show_log_filter_values(self, values):
+        users, actions = values
+        self.log_user_combo['values'] = [self.ANY] + users
+        self.log_action_combo['values'] = [self.ANY] + actions
+
+    def apply_log_filters(self):
+        filters = {}
+        for key, combo in (('user', self.log_user_combo), ('action', self.log_action_combo)):
+            value = combo.get().strip()
+            if value and value != self.ANY:
+                filters[key] = value
         try:
-            # Sort by timestamp descending so the newest logs appear first
-            self.logs_data = list(database.db['logs'].find(query).sort("timestamp", -1).limit(100))
-            for log in self.logs_data:
-                self.audit_tree.insert("", "end", values=(log.get('timestamp'), log.get('user'), log.get('action'), log.get('details')))
-        except Exception: pass
+            # Whole days, as a half-open range so the timestamp index can be used
+            if self.log_from_entry.get().strip():
+                filters['start_date'] = datetime.datetime.strptime(self.log_from_entry.get().strip(), "%Y-%m-%d")
+            if self.log_to_entry.get().strip():
+                filters['end_date'] = datetime.datetime.strptime(self.log_to_entry.get().strip(), "%Y-%m-%d") + datetime.timedelta(days=1)
+        except ValueError:
+            messagebox.showerror("Error", "Invalid format. Use YYYY-MM-DD")
+            return
+        self.load_logs(filters)
+
+    def clear_log_filters(self):
+        self.log_user_combo.set(self.ANY)
+        self.log_action_combo.set(self.ANY)
+        self.log_from_entry.delete(0, tk.END)
+        self.log_to_entry.delete(0, tk.END)
+        self.load_logs()
+
+    def load_logs(self, filters=None):
+        """Starts browsing the activity log (newest first) with the given filters."""
+        self.log_filters = filters or {}
+        self.log_cursors = [None]   # log_cursors[i] fetches page i
+        self.log_page = 0
+        self.log_count = None
+        self.logs_data = []
+        self.log_generation = getattr(self, 'log_generation', 0) + 1
+        generation = self.log_generation
+        self.controller.tasks.submit(database.estimate_log_count, owner=self, on_error=lambda e: None,
+                                     on_done=lambda count: self._show_log_count(count, generation),
+                                     **self.log_filters)
+        self.show_log_page(0)
+
+    def show_log_page(self, page):
+        if page < 0 or page >= len(self.log_cursors):
+            return
+        generation = self.log_generation
+        self.log_newer_btn.config(state=tk.DISABLED)
+        self.log_older_btn.config(state=tk.DISABLED)
+        self.controller.tasks.submit(database.get_logs_page, limit=self.LOG_PAGE_SIZE, after=self.log_cursors[page],
+                                     on_done=lambda result: self._show_logs(result, page, generation),
+                                     on_error=lambda e: None, owner=self, **self.log_filters)
+
+    def _show_logs(self, result, page, generation):
+        if generation != self.log_generation:
+            return  # the filters changed while this page was loading
+        logs, next_cursor = result
+        self.log_page = page
+        if next_cursor is not None and len(self.log_cursors) == page + 1:
+            self.log_cursors.append(next_cursor)
+
+        for i in self.audit_tree.get_children(): self.audit_tree.delete(i)
+        self.logs_data = logs
+        for log in self.logs_data:
+            self.audit_tree.insert("", "end", values=(format_timestamp(log.get('timestamp')), log.get('user'), log.get('action'), log.get('details')))
+        self.audit_tree.yview_moveto(0)
+
+        self.log_newer_btn.config(state=tk.NORMAL if page > 0 else tk.DISABLED)
+        self.log_older_btn.config(state=tk.NORMAL if next_cursor is not None else tk.DISABLED)
+        self._update_log_page_label()
+
+    def _show_log_count(self, count, generation):
+        if generation == self.log_generation:
+            self.log_count = count
+            self._update_log_page_label()
+
+    def _update_log_page_label(self):
+        shown = len(self.logs_data)
+        first = self.log_page * self.LOG_PAGE_SIZE
+        text = f"Showing {first + 1:,}-{first + shown:,}" if shown else "No matching entries"
+        if self.log_count is not None:
+            count, exact = self.log_count
+            if exact:
+                text += f" of {count:,}"
+            else:
+                text += f" of about {count:,}" + ("+" if count >= database.LOG_COUNT_LIMIT else "")
+        self.log_page_label.config(text=text)
+
+    # (snapshot field, legend label, color) plotted on the trends tab
+    TREND_SERIES = [
+        ('disbursed', 'Given Out', '#2c3e50'),
+        ('collected', 'Recovered', '#2ecc71'),
+        ('outstanding', 'In Debt', '#e74c3c'),
+        ('overdue_amount', 'Overdue', '#f39c12'),
+    ]
+
+    def setup_trends_tab(self):
+        """Builds the Portfolio Trends tab: one line chart over the stored daily snapshots."""
+        filter_frame = tk.Frame(self.tab_trends, bg=self.colors["bg"])
+        filter_frame.pack(fill="x", padx=20, pady=5)
+
+        for days, text in ((30, "Last 30 Days"), (90, "Last 90 Days"), (365, "Last 12 Months")):
+            tk.Button(filter_frame, text=text, command=lambda d=days: self.load_trends(d),
+                      bg=self.colors["dark"], fg="white", font=("Segoe UI", 9, "bold")).pack(side="left", padx=5)
+
+        self.trend_status = tk.Label(filter_frame, text="", bg=self.colors["bg"], fg="#7f8c8d", font=("Segoe UI", 9))
+        self.trend_status.pack(side="left", padx=15)
+
+        trend_area = tk.Frame(self.tab_trends, bg="white", highlightthickness=1, highlightbackground="#dcdde1")
+        trend_area.pack(fill="both", expand=True, padx=20, pady=5)
+
+        # The figure and lines are created once; reloads only replace the line data
+        self.trend_fig = Figure(figsize=(10, 4), dpi=90)
+        self.ax_trend = self.trend_fig.add_subplot(1, 1, 1)
+        self.trend_lines = [self.ax_trend.plot([], [], label=label, color=color, marker='.')[0]
+                            for _, label, color in self.TREND_SERIES]
+        self.ax_trend.set_ylabel("RWF")
+        self.ax_trend.legend(loc="upper left")
+        self.ax_trend.grid(True, alpha=0.3)
+        self.trend_fig.autofmt_xdate()
+
+        self.trend_canvas = FigureCanvasTkAgg(self.trend_fig, master=trend_area)
+        self.trend_canvas.get_tk_widget().pack(fill="both", expand=True)
+        self.load_trends(30)
+
+    @staticmethod
+    def _get_trend_points(days):
+        """Stored snapshots for the last `days` days plus a live point for today. Runs on a worker thread."""
+        today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+        start = today - datetime.timedelta(days=days - 1)
+        points = database.get_portfolio_snapshots(start, today)
+        live = [doc for doc in database.compute_portfolio_snapshot()
+                if doc.get('loan_type') == database.SNAPSHOT_ALL_TYPES]
+        return points, live
+
+    def load_trends(self, days):
+        self.trend_days = days
+        self.trend_status.config(text="Loading...")
+        self.controller.tasks.submit(self._get_trend_points, days,
+                                     on_done=self._show_trends, owner=self)
+
+    def _show_trends(self, result):
+        stored, live = result
+        points = stored + live
+        dates = [p['date'] for p in points]
+        for line, (field, _, _) in zip(self.trend_lines, self.TREND_SERIES):
+            line.set_data(dates, [p.get(field, 0) for p in points])
+        self.ax_trend.set_title(f"Portfolio over the last {self.trend_days} days")
+        self.ax_trend.relim()
+        self.ax_trend.autoscale_view()
+
+        if not stored:
+            self.trend_status.config(text="No stored snapshots yet; showing today only. Schedule 'db_admin.py snapshot' daily.")
+        else:
+            self.trend_status.config(text=f"{len(stored)} daily snapshots + today (live)")
+        self.trend_canvas.draw_idle()
+
+    def setup_par_tab(self):
+        """Builds the Portfolio at Risk tab: PAR ratio cards over a table of aging buckets."""
+        filter_frame = tk.Frame(self.tab_par, bg=self.colors["bg"])
+        filter_frame.pack(fill="x", padx=20, pady=5)
+
+        tk.Button(filter_frame, text="Refresh", command=self.load_aging,
+                  bg=self.colors["dark"], fg="white", font=("Segoe UI", 9, "bold")).pack(side="left", padx=5)
+        if self.controller.current_user_role == "Admin":
+            tk.Button(filter_frame, text="Re-age Portfolio Now", command=self.rerun_aging,
+                      bg=self.colors["accent"], fg="white", font=("Segoe UI", 9, "bold")).pack(side="left", padx=5)
+
+        self.par_status = tk.Label(filter_frame, text="", bg=self.colors["bg"], fg="#7f8c8d", font=("Segoe UI", 9))
+        self.par_status.pack(side="left", padx=15)
+
+        card_frame = tk.Frame(self.tab_par, bg=self.colors["bg"])
+        card_frame.pack(fill="x", padx=10)
+        self.par_values = [self._build_card(card_frame, name, "0.00%", col)
+                           for col, (name, _) in enumerate(aging_engine.PAR_RATIOS)]
+
+        tree_frame = tk.Frame(self.tab_par, bg="white")
+        tree_frame.pack(fill="both", expand=True, padx=20, pady=10)
+        columns = ("Bucket", "Loans", "Outstanding", "Share", "Arrears")
+        self.par_tree = ttk.Treeview(tree_frame, columns=columns, show="headings", height=6)
+        for col in columns:
+            self.par_tree.heading(col, text=col if col != "Bucket" else "Days Past Due")
+            self.par_tree.column(col, anchor="w" if col == "Bucket" else "e")
+        self.par_tree.pack(fill="both", expand=True)
+        self.load_aging()
+
+    def load_aging(self):
+        self.par_status.config(text="Loading...")
+        self.controller.tasks.submit(aging_engine.aging_report, on_done=self._show_aging, owner=self)
+
+    def rerun_aging(self):
+        """Re-ages the whole book now instead of waiting for the scheduled run."""
+        self.par_status.config(text="Ageing portfolio...")
+        self.controller.tasks.submit(lambda: (aging_engine.run_aging(), aging_engine.aging_report())[1],
+                                     on_done=self._show_aging, owner=self)
+
+    def _show_aging(self, report):
+        for label, (_, _, share) in zip(self.par_values, report['par']):
+            label.config(text=f"{share * 100:.2f}%")
+
+        for i in self.par_tree.get_children(): self.par_tree.delete(i)
+        total = report['outstanding'] or 1
+        for bucket, loans, outstanding, arrears in report['buckets']:
+            self.par_tree.insert("", "end", values=(bucket, f"{loans:,}", f"RWF {outstanding:,.0f}",
+                                                    f"{outstanding * 100.0 / total:.1f}%", f"RWF {arrears:,.0f}"))
+
+        if report['as_of']:
+            self.par_status.config(text=f"Aged as of {report['as_of']:%Y-%m-%d}")
+        else:
+            self.par_status.config(text="Portfolio not aged yet. Schedule 'db_admin.py aging' daily.")
 
     def _build_card(self, parent, title, value, col):
         """Helper utility to construct a visually appealing 'Card' for summary metrics."""
@@ -245,7 +549,9 @@ class ReportsWindow(tk.Tk):
         card.grid(row=0, column=col, padx=5, sticky="nsew")
         parent.columnconfigure(col, weight=1)
         tk.Label(card, text=title, font=("Segoe UI", 8, "bold"), bg="white", fg="#7f8c8d").pack(anchor="w")
-        tk.Label(card, text=value, font=("Segoe UI", 14, "bold"), bg="white", fg=self.colors["dark"]).pack(anchor="w")
+        value_label = tk.Label(card, text=value, font=("Segoe UI", 14, "bold"), bg="white", fg=self.colors["dark"])
+        value_label.pack(anchor="w")
+        return value_label
 
     def create_bottom_controls(self):
         """Initializes the sticky navigation bar at the bottom of the window."""
@@ -259,88 +565,53 @@ class ReportsWindow(tk.Tk):
                   relief="flat", width=20, height=1).pack(side="right", padx=20)
 
     def go_back(self):
-        """Closes current window and re-launches the main dashboard script."""
-        subprocess.Popen([sys.executable, "dashboard.py", CURRENT_USER_ROLE, CURRENT_USER_NAME])
-        self.destroy()
+        """Returns to the main dashboard screen."""
+        self.controller.show_frame("Dashboard")
 
     def export_to_pdf(self):
-        """Handles the complex logic of converting UI data, tables, and charts into a multi-page PDF report."""
+        """Builds a multi-page PDF with the summary, charts, status breakdown and the full audit log for a period."""
+        if self.current_data is None:
+            messagebox.showinfo("Please Wait", "The analytics are still loading.")
+            return
+
+        # The audit log section covers the finance filter period, or the current month by default
+        if self.current_filter:
+            start, end = self.current_filter
+            start_default, end_default = start.strftime("%Y-%m-%d"), (end - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+        else:
+            today = datetime.date.today()
+            start_default, end_default = today.strftime("%Y-%m-01"), today.strftime("%Y-%m-%d")
+        log_range = self._ask_date_range("Report Period", "Include activity logs from (YYYY-MM-DD):",
+                                         start_default, end_default)
+        if not log_range: return
+
         # Collect desired save path from user
         file_path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")])
         if not file_path: return
-        try:
-            # Setup PDF canvas
-            c = canvas.Canvas(file_path, pagesize=letter)
-            width, height = letter
-
-            # --- PART 1: PAGE HEADER ---
-            c.setFont("Helvetica-Bold", 18)
-            c.setFillColor(colors.darkgreen)
-            c.drawString(50, height - 50, "BIG ON GOLD LOANS - ANALYTICS REPORT")
-            c.setFont("Helvetica", 10)
-            c.setFillColor(colors.black)
-            c.drawString(50, height - 65, f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            c.line(50, height - 75, width - 50, height - 75)
-
-            # --- PART 2: FINANCIAL SUMMARY TABLE ---
-            lent, rec, debt, count, _ = self.current_data
-            data = [
-                ["Description", "Amount (RWF)"],
-                ["Total Capital Disbursed", f"{lent:,.0f}"],
-                ["Total Revenue Recovered", f"{rec:,.0f}"],
-                ["Money Outstanding", f"{debt:,.0f}"],
-                ["Active Loan Files", str(count)]
-            ]
-            t = Table(data, colWidths=[200, 150])
-            t.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.darkgreen),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
-            ]))
-            t.wrapOn(c, width, height)
-            t.drawOn(c, 50, height - 180)
-
-            # --- PART 3: CAPTURING THE MATPLOTLIB CHART ---
-            # Save the active plot to an in-memory byte stream instead of a physical file.
-            imgdata = io.BytesIO()
-            self.fig.savefig(imgdata, format='png', bbox_inches='tight')
-            imgdata.seek(0)
-            
-            # Use PIL to open the byte stream and draw it into the PDF report.
-            chart_img = Image.open(imgdata)
-            c.drawInlineImage(chart_img, 50, height - 480, width=500, height=250)
-
-            # --- PART 4: AUDIT LOGS (ON NEW PAGE) ---
-            c.showPage()
-            c.setFont("Helvetica-Bold", 14)
-            c.drawString(50, height - 50, "USER ACTIVITY LOGS")
-            c.line(50, height - 60, width - 50, height - 60)
-
-            log_table_data = [["Timestamp", "User", "Action"]]
-            # Safety check: print only the first 25 logs to ensure they fit on one page.
-            logs_to_print = getattr(self, 'logs_data', [])
-            for log in logs_to_print[:25]: 
-                log_table_data.append([log.get('timestamp', '')[:19], log.get('user', ''), log.get('action', '')])
-            
-            # Apply styling to the audit log table
-            lt = Table(log_table_data, colWidths=[120, 100, 300])
-            lt.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('FONTSIZE', (0, 0), (-1, -1), 8)
-            ]))
-            lt.wrapOn(c, width, height)
-            lt.drawOn(c, 50, height - (70 + (len(log_table_data)*15)))
-
-            # Save the file and notify the user
-            c.save()
-            messagebox.showinfo("Success", "Report exported successfully with Charts and Logs.")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to create PDF: {str(e)}")
+
+        if self.current_filter:
+            start, end = self.current_filter
+            period_label = f"Loans applied {start:%Y-%m-%d} to {end - datetime.timedelta(days=1):%Y-%m-%d}"
+        else:
+            period_label = "Whole business"
+
+        # The charts PNG was captured when they were last drawn; the PDF itself is built on the task runner
+        self.controller.tasks.submit(
+            build_analytics_report, file_path, self.current_data, self._chart_png(),
+            period_label=period_label, log_range=log_range,
+            on_done=lambda _: self._pdf_exported(file_path),
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to create PDF: {str(e)}"),
+            owner=self)
+
+    def _pdf_exported(self, file_path):
+        database.log_activity(self.controller.current_user_name, "Export PDF", f"Exported analytics report to {os.path.basename(file_path)}")
+        messagebox.showinfo("Success", "Report exported successfully with Charts and Logs.")
 
 # --- SCRIPT ENTRY POINT ---
 if __name__ == "__main__":
-    app = ReportsWindow()
-    app.mainloop()
\ No newline at end of file
+    import sys
+    import main
+    # Defaults if the script is run directly without arguments
+    role = sys.argv[1] if len(sys.argv) > 2 else "Admin"
+    user = sys.argv[2] if len(sys.argv) > 2 else "Guest"
+    main.run("Reports", role=role, user=user)
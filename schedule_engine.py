@@ -0,0 +1,295 @@
+"""
+Installment schedule engine.
+
+Builds full repayment schedules (flat or reducing-balance interest, weekly or
+monthly installments) with NumPy. Every installment of every loan in a batch
+is one row of a set of flat arrays, so scheduling the whole portfolio is a
+handful of vector operations rather than a Python loop per installment.
+
+Schedules are stored in the 'installments' collection when a loan is approved
+and rebuilt in bulk after terms change:
+
+    python db_admin.py schedules            # every approved / repaying loan
+    python db_admin.py schedules <loan_id>  # just these loans
+"""
+import datetime
+from itertools import islice
+
+import numpy as np
+from pymongo import UpdateOne
+
+import database
+
+# Rate applied when a loan does not carry its own interest_rate (percent per year)
+DEFAULT_ANNUAL_RATE = 12.0
+
+INTEREST_FLAT = "Flat"
+INTEREST_REDUCING = "Reducing Balance"
+INTEREST_METHODS = [INTEREST_FLAT, INTEREST_REDUCING]
+
+WEEKS_PER_YEAR = 52
+# Loans read and written per round trip by recompute_schedules()
+RECOMPUTE_BATCH_SIZE = 2000
+
+# Only loans that have been approved carry a schedule
+SCHEDULED_STATUSES = database.REPAYING_STATUSES + ['Fully Paid']
+# Loan fields a schedule is computed from; editing any of them calls for a recompute
+TERM_FIELDS = ('loan_amount', 'interest_rate', 'interest_method', 'duration', 'payment_plan', 'approved_date')
+SCHEDULE_PROJECTION = {field: 1 for field in TERM_FIELDS + ('application_date',)}
+
+
+def parse_term_months(duration):
+    """'6 months' -> 6, '2 years' -> 24; a bare number counts as months. None if unreadable."""
+    parts = str(duration or '').strip().lower().split()
+    try:
+        value = float(parts[0])
+    except (IndexError, ValueError):
+        return None
+    if len(parts) > 1 and parts[1].startswith(('year', 'yr')):
+        value *= 12
+    months = int(round(value))
+    return months if months > 0 else None
+
+
+def is_weekly(payment_plan):
+    return 'weekly' in str(payment_plan or '').lower()
+
+
+def compute_schedules(principal, annual_rate, term_months, weekly, reducing, start):
+    """
+    Vectorized core. Arguments are equal-length sequences with one entry per
+    loan: principal, annual_rate (percent), term_months, weekly and reducing
+    (booleans) and start (dates the schedules run from).
+
+    Returns a dict of arrays with one row per installment: 'loan' (index into
+    the inputs), 'number' (1-based), 'due', 'principal', 'interest', 'amount'
+    and 'balance' (principal outstanding after the installment). Amounts are
+    rounded to cents with the rounding carried by each loan's last installment.
+    """
+    principal = np.asarray(principal, dtype=float)
+    annual_rate = np.asarray(annual_rate, dtype=float) / 100.0
+    term_months = np.asarray(term_months, dtype=float)
+    weekly = np.asarray(weekly, dtype=bool)
+    reducing = np.asarray(reducing, dtype=bool)
+    start = np.asarray(start, dtype='datetime64[D]')
+
+    n = np.maximum(np.where(weekly, np.rint(term_months * WEEKS_PER_YEAR / 12), term_months), 1).astype(np.int64)
+    if n.size == 0:
+        empty = np.array([], dtype=float)
+        return {'loan': np.array([], dtype=np.int64), 'number': np.array([], dtype=np.int64),
+                'due': np.array([], dtype='datetime64[D]'), 'principal': empty,
+                'interest': empty, 'amount': empty, 'balance': empty}
+    periodic_rate = annual_rate / np.where(weekly, WEEKS_PER_YEAR, 12)
+
+    # Flatten: row i belongs to loan[i] and is installment number[i] of n[loan[i]]
+    first = np.concatenate(([0], np.cumsum(n)[:-1]))
+    last = first + n - 1
+    loan = np.repeat(np.arange(n.size), n)
+    number = np.arange(n.sum()) - first[loan] + 1
+
+    P, r, N = principal[loan], periodic_rate[loan], n[loan]
+
+    # Flat: interest on the original principal for the whole term, spread evenly
+    flat_total_interest = np.round(principal * annual_rate * term_months / 12.0, 2)
+    flat_interest = (flat_total_interest / n)[loan]
+
+    # Reducing balance: level payment A = P r / (1 - (1 + r)^-N); the balance
+    # before installment k is P (1 + r)^(k-1) - A ((1 + r)^(k-1) - 1) / r
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = (1.0 + r) ** (number - 1)
+        payment = np.where(r > 0, P * r / (1.0 - (1.0 + r) ** -N), P / N)
+        balance_before = np.where(r > 0, P * growth - payment * (growth - 1.0) / r, P - payment * (number - 1))
+    reducing_interest = balance_before * r
+
+    is_reducing = reducing[loan]
+    interest = np.round(np.where(is_reducing, reducing_interest, flat_interest), 2)
+    principal_part = np.round(np.where(is_reducing, payment - reducing_interest, P / N), 2)
+
+    # The last installment absorbs the rounding so principal (and flat interest) totals are exact
+    principal_part[last] = np.round(principal_part[last] + principal - np.add.reduceat(principal_part, first), 2)
+    interest[last] = np.round(interest[last] + np.where(reducing, 0.0, flat_total_interest - np.add.reduceat(interest, first)), 2)
+
+    running = np.cumsum(principal_part)
+    paid_before_loan = running[first] - principal_part[first]
+    balance = np.round(P - (running - paid_before_loan[loan]), 2)
+
+    # Weekly installments fall every 7 days; monthly ones on the start's day of
+    # the month, clamped to the month's length (Jan 31 -> Feb 28)
+    start_month = start.astype('datetime64[M]')
+    day_of_month = (start - start_month.astype('datetime64[D]')).astype(np.int64)[loan]
+    due_month = start_month[loan] + number
+    month_length = ((due_month + 1).astype('datetime64[D]') - due_month.astype('datetime64[D]')).astype(np.int64)
+    monthly_due = due_month.astype('datetime64[D]') + np.minimum(day_of_month, month_length - 1)
+    weekly_due = start[loan] + 7 * number
+    due = np.where(weekly[loan], weekly_due, monthly_due)
+
+    return {'loan': loan, 'number': number, 'due': due, 'principal': principal_part,
+            'interest': interest, 'amount': np.round(principal_part + interest, 2), 'balance': balance}
+
+
+def loan_terms(loan, start=None):
+    """
+    Reads the schedule inputs from a loan document as
+    (principal, annual_rate, term_months, weekly, reducing, start), or None
+    when the loan has no usable amount or term.
+    """
+    try:
+        principal = float(loan.get('loan_amount') or 0)
+        rate = loan.get('interest_rate')
+        rate = DEFAULT_ANNUAL_RATE if rate in (None, '') else float(rate)
+    except (TypeError, ValueError):
+        return None
+    months = parse_term_months(loan.get('duration'))
+    if principal <= 0 or months is None:
+        return None
+    start = database.parse_date(start or loan.get('approved_date') or loan.get('application_date'))
+    start = (start or datetime.datetime.now()).date()
+    return (principal, rate, months, is_weekly(loan.get('payment_plan')),
+            loan.get('interest_method') == INTEREST_REDUCING, start)
+
+
+def total_repayment(loan_amount, duration, payment_plan="Monthly", interest_rate=DEFAULT_ANNUAL_RATE,
+                    interest_method=INTEREST_FLAT):
+    """Principal plus all interest for the given terms, or 0.0 when they are incomplete."""
+    terms = loan_terms({'loan_amount': loan_amount, 'duration': duration, 'payment_plan': payment_plan,
+                        'interest_rate': interest_rate, 'interest_method': interest_method},
+                       start=datetime.date.today())
+    if terms is None:
+        return 0.0
+    schedule = compute_schedules(*([value] for value in terms))
+    return float(schedule['amount'].sum())
+
+
+def build_schedules(loans):
+    """
+    Computes the schedules of many loan documents in one vectorized batch.
+
+    Returns (installments, loan_updates): installment documents ready for the
+    'installments' collection, and per loan _id the fields the schedule
+    determines on the loan itself. Loans without usable terms are left out.
+    """
+    scheduled = []
+    columns = []
+    for loan in loans:
+        terms = loan_terms(loan)
+        if terms is not None:
+            scheduled.append(loan)
+            columns.append(terms)
+    if not scheduled:
+        return [], {}
+
+    schedule = compute_schedules(*zip(*columns))
+    loan_ids = [loan['_id'] for loan in scheduled]
+    due = schedule['due'].astype('datetime64[s]').tolist()
+    numbers = schedule['number'].tolist()
+    principal = schedule['principal'].tolist()
+    interest = schedule['interest'].tolist()
+    amount = schedule['amount'].tolist()
+    balance = schedule['balance'].tolist()
+
+    installments = [{
+        'loan_id': loan_ids[i],
+        'number': numbers[row],
+        'due_date': due[row],
+        'principal': principal[row],
+        'interest': interest[row],
+        'amount': amount[row],
+        'balance': balance[row],
+    } for row, i in enumerate(schedule['loan'].tolist())]
+
+    totals = np.bincount(schedule['loan'], weights=schedule['amount'], minlength=len(scheduled))
+    last = np.append(np.flatnonzero(schedule['number'] == 1)[1:], len(numbers)) - 1
+    loan_updates = {loan_ids[i]: {
+        'term_months': int(columns[i][2]),
+        'return_amount': round(float(totals[i]), 2),
+        'final_completion_date': due[last[i]],
+    } for i in range(len(scheduled))}
+    return installments, loan_updates
+
+
+def recompute_schedules(loan_ids=None, batch_size=RECOMPUTE_BATCH_SIZE):
+    """
+    Rebuilds and stores the schedules of the given loans, or of every approved
+    loan when loan_ids is None. Loans that are still pending or were rejected
+    are skipped. Returns {loan _id: loan fields set} for the loans scheduled.
+    """
+    query = {'status': {'$in': SCHEDULED_STATUSES}}
+    if loan_ids is not None:
+        variants = [v for lid in loan_ids for v in database.loan_id_variants(lid)]
+        query['_id'] = {'$in': variants}
+
+    scheduled = {}
+    cursor = database.db['loans'].find(query, SCHEDULE_PROJECTION).batch_size(batch_size)
+    with cursor:
+        while True:
+            batch = list(islice(cursor, batch_size))
+            if not batch:
+                break
+            installments, loan_updates = build_schedules(batch)
+            # Loans whose terms no longer produce a schedule lose their old one too
+            if database.replace_installments([loan['_id'] for loan in batch], installments, loan_updates) is None:
+                raise RuntimeError("Failed to store installment schedules.")
+            scheduled.update(loan_updates)
+    return scheduled
+
+
+def approve_loan(loan_id, approved_on=None):
+    """
+    Marks a loan Approved from approved_on (default today), stores its schedule
+    and points next_payment at the first installment. Returns the first due
+    date, or None when the loan's terms could not be scheduled.
+    """
+    approved_on = approved_on or datetime.datetime.combine(datetime.date.today(), datetime.time())
+    database.update_loan_details(loan_id, {"status": "Approved", "approved_date": approved_on})
+    # The raw document, so the schedule is keyed by the loan's ObjectId
+    loan = database.db['loans'].find_one({'_id': {'$in': database.loan_id_variants(loan_id)}}, SCHEDULE_PROJECTION)
+    installments, loan_updates = build_schedules([loan] if loan else [])
+    if not installments:
+        return None
+
+    first_due = installments[0]['due_date']
+    loan_updates[loan['_id']]['next_payment'] = first_due
+    if database.replace_installments([loan['_id']], installments, loan_updates) is None:
+        raise RuntimeError("Failed to store the installment schedule.")
+    return first_due
+
+
+def next_due_date(installments, total_paid):
+    """Due date of the first installment not yet covered by total_paid, or None when all are."""
+    if not installments:
+        return None
+    covered = np.cumsum([inst.get('amount', 0) for inst in installments])
+    index = int(np.searchsorted(covered, float(total_paid or 0) + 0.005, side='right'))
+    return installments[index]['due_date'] if index < len(installments) else None
+
+
+def refresh_next_payments(loan_ids):
+    """
+    Points next_payment on each loan at its first installment not yet covered
+    by total_paid (cleared once all are). Reads the loans and their schedules
+    in one query each and writes the changes in one bulk_write. Loans without
+    a schedule keep their next_payment. Returns the number of loans updated.
+    """
+    loan_ids = list(loan_ids)
+    if not loan_ids:
+        return 0
+    loans = {loan['_id']: loan for loan in database.db['loans'].find(
+        {'_id': {'$in': loan_ids}}, {'total_paid': 1, 'next_payment': 1})}
+    schedules = {}
+    cursor = (database.db[database.INSTALLMENT_COLLECTION]
+              .find({'loan_id': {'$in': list(loans)}}, {'loan_id': 1, 'number': 1, 'due_date': 1, 'amount': 1})
+              .sort([('loan_id', 1), ('number', 1)]))
+    for installment in cursor:
+        schedules.setdefault(installment['loan_id'], []).append(installment)
+
+    ops = []
+    for loan_id, installments in schedules.items():
+        due = next_due_date(installments, loans[loan_id].get('total_paid'))
+        if due != loans[loan_id].get('next_payment'):
+            update = {'$set': {'next_payment': due}} if due else {'$unset': {'next_payment': ''}}
+            ops.append(UpdateOne({'_id': loan_id}, update))
+    if ops:
+        database.db['loans'].bulk_write(ops, ordered=False)
+        for loan_id in schedules:
+            database.loan_cache.invalidate(loan_id)
+    return len(ops)
@@ -0,0 +1,326 @@
+"""
+Mobile Money and bank statement reconciliation.
+
+    python db_admin.py statement momo_march.csv --method "Mobile Money"
+    (or Import Statement on the Statement Reconciliation screen)
+
+A statement (CSV or XLSX with a header row, see STATEMENT_COLUMNS for the
+names recognised) is matched line by line against the active loans. The
+loans are loaded once and indexed in dictionaries by loan number, by NIN and
+by payer (phone or account numbers learned from earlier manual matches), so
+each line costs a few hash lookups however large the book is. A line is
+matched to a loan when
+
+  * its reference names a loan number (LOAN-YYYY-XXXX), or
+  * it names a NIN, or comes from a known payer, and exactly one of that
+    customer's active loans fits: a customer with a single active loan
+    always fits; otherwise the amount has to be within AMOUNT_TOLERANCE of
+    the loan's installment and the date within DATE_TOLERANCE_DAYS of its
+    next payment,
+
+and the amount is no more than the loan's remaining_balance, the same balance
+post_payments() closes the loan on. Matched lines are posted
+in batches through database.post_payments(), which also updates balances,
+and next_payment is moved on with schedule_engine.refresh_next_payments().
+Every other line is queued in the review collection with the reason and the
+candidate loans. Each line carries the key stmt:<transaction id>, so loading
+the same statement again posts and queues nothing twice.
+"""
+import datetime
+import re
+import time
+from collections import Counter, defaultdict
+
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+
+import bulk_import
+import database
+import loan_rules
+import schedule_engine
+
+BATCH_SIZE = 5000
+# Relative difference allowed between a line and a loan's installment amount
+AMOUNT_TOLERANCE = 0.02
+DATE_TOLERANCE_DAYS = 10
+# Paying this much over the balance still counts as paying it off (rounding, fees)
+OVERPAYMENT_TOLERANCE = 1.0
+PAYMENT_METHODS = ['Mobile Money', 'Bank Transfer']
+
+REVIEW_OPEN = "Open"
+REVIEW_POSTED = "Posted"
+REVIEW_DISMISSED = "Dismissed"
+
+# Canonical field -> header names used by the MoMo and bank exports we receive
+STATEMENT_COLUMNS = {
+    'transaction_id': ('transaction_id', 'txn_id', 'transaction', 'receipt', 'receipt_no', 'id'),
+    'date': ('date', 'transaction_date', 'value_date', 'completion_time', 'posting_date'),
+    'amount': ('amount', 'credit', 'paid_in', 'credit_amount'),
+    'payer': ('phone', 'msisdn', 'phone_number', 'sender', 'from', 'account', 'account_number'),
+    'name': ('name', 'sender_name', 'payer_name'),
+    'nin': ('nin', 'nin_number', 'national_id'),
+    'reference': ('reference', 'narrative', 'description', 'details', 'memo'),
+}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y')
+LOAN_PATTERN = re.compile(r"LOAN-\d{4}-[0-9A-Z]{4,}", re.IGNORECASE)
+DIGITS_PATTERN = re.compile(r"\d{8,}")
+
+LOAN_PROJECTION = {'loan_id': 1, 'nin_number': 1, 'customer_name': 1, 'loan_amount': 1, 'total_paid': 1,
+                   'remaining_balance': 1, 'return_amount': 1, 'term_months': 1, 'duration': 1,
+                   'payment_plan': 1, 'next_payment': 1}
+
+
+def payer_key(value):
+    """Phone and account numbers compared on their last 9 digits (+250 78... == 078...)."""
+    digits = re.sub(r"\D", "", str(value or ''))
+    return digits[-9:] if len(digits) >= 9 else None
+
+
+def parse_statement_date(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return database.parse_date(value)
+    text = str(value or '').strip()[:10]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+def read_statement(path):
+    """Yields statement lines as dicts with the STATEMENT_COLUMNS fields plus 'line', 'key' and 'error'."""
+    occurrences = Counter()
+    columns = None
+    for number, row in bulk_import.read_rows(path):
+        if columns is None:
+            columns = {field: next((name for name in names if name in row), None)
+                       for field, names in STATEMENT_COLUMNS.items()}
+            missing = [f for f in ('date', 'amount') if columns[f] is None]
+            if missing:
+                raise ValueError(f"{path} has no {' or '.join(missing)} column.")
+        line = {field: bulk_import.cell_text(row, column) if column else ''
+                for field, column in columns.items()}
+        txn = line['transaction_id'] or bulk_import.content_key(row, list(row), occurrences)
+        line.update(line=number, key=f"stmt:{txn}", error=None)
+        try:
+            line['amount'] = loan_rules.parse_amount(line['amount'])
+        except loan_rules.ValidationError as e:
+            line['error'] = str(e)
+        line['date'] = parse_statement_date(row[columns['date']]) if row.get(columns['date']) else None
+        if line['date'] is None and not line['error']:
+            line['error'] = "Unreadable date."
+        yield line
+
+
+class StatementMatcher:
+    """Hash indexes over the active loans, and the matching rules described in the module docstring."""
+
+    def __init__(self, loans, payers=None):
+        self.by_number = {}
+        self.by_nin = defaultdict(list)
+        self.payers = payers or {}
+        for loan in loans:
+            # What post_payments() counts down to the Fully Paid close-out
+            balance = loan.get('remaining_balance')
+            if balance is None:
+                balance = float(loan.get('loan_amount') or 0) - float(loan.get('total_paid') or 0)
+            loan['_owed'] = float(balance)
+            loan['_installment'] = self._installment(loan)
+            self.by_number[str(loan.get('loan_id', '')).upper()] = loan
+            self.by_nin[str(loan.get('nin_number', '')).strip()].append(loan)
+
+    @classmethod
+    def load(cls):
+        loans = database.db['loans'].find({'status': {'$in': database.REPAYING_STATUSES},
+                                           'is_deleted': database.NOT_DELETED}, LOAN_PROJECTION)
+        payers = {row['_id']: row['nin_number'] for row in database.db[database.PAYER_COLLECTION].find()}
+        return cls(loans, payers)
+
+    @staticmethod
+    def _installment(loan):
+        months = loan.get('term_months') or schedule_engine.parse_term_months(loan.get('duration'))
+        if not months or not loan.get('return_amount'):
+            return None
+        count = round(months * schedule_engine.WEEKS_PER_YEAR / 12) if schedule_engine.is_weekly(loan.get('payment_plan')) else months
+        return float(loan['return_amount']) / max(count, 1)
+
+    def _fits(self, loan, line):
+        installment = loan['_installment']
+        if installment is None or abs(line['amount'] - installment) > installment * AMOUNT_TOLERANCE:
+            return False
+        due = loan.get('next_payment')
+        return not isinstance(due, datetime.datetime) or abs((line['date'] - due).days) <= DATE_TOLERANCE_DAYS
+
+    def match(self, line):
+        """Returns (loan, None, []) for a match, or (None, reason, candidate loan numbers) otherwise."""
+        numbers = {n.upper() for n in LOAN_PATTERN.findall(line['reference'])}
+        if numbers:
+            loans = [self.by_number[n] for n in numbers if n in self.by_number]
+            if len(loans) != 1:
+                reason = "Reference names several loans." if loans else f"{', '.join(sorted(numbers))} is not an active loan."
+                return None, reason, sorted(numbers)
+            return self._check_balance(loans[0], line)
+
+        nins = {line['nin']} if line['nin'] else set(DIGITS_PATTERN.findall(line['reference']))
+        nins = {nin for nin in nins if nin in self.by_nin}
+        payer = payer_key(line['payer'])
+        if not nins and payer in self.payers:
+            nins = {self.payers[payer]} & set(self.by_nin)
+        candidates = [loan for nin in nins for loan in self.by_nin[nin]]
+        if not candidates:
+            return None, "No loan number, NIN or known payer on this line.", []
+        if len(candidates) > 1:
+            fitting = [loan for loan in candidates if self._fits(loan, line)]
+            if len(fitting) != 1:
+                return None, "Several active loans could take this payment.", [c.get('loan_id') for c in candidates]
+            candidates = fitting
+        return self._check_balance(candidates[0], line)
+
+    @staticmethod
+    def _check_balance(loan, line):
+        if line['amount'] > loan['_owed'] + OVERPAYMENT_TOLERANCE:
+            return None, f"Amount is more than the {max(loan['_owed'], 0):,.2f} still owed.", [loan.get('loan_id')]
+        # Later lines of the same statement see the balance this one leaves
+        loan['_owed'] -= line['amount']
+        return loan, None, []
+
+
+def _payment(line, loan, method, received_by):
+    return {
+        'loan_id': loan['_id'],
+        'customer_name': loan.get('customer_name'),
+        'payment_amount': line['amount'],
+        'payment_date': database.format_date(line['date']),
+        'next_payment_date': None,
+        'payment_method': method,
+        'received_by': received_by,
+        'statement_reference': line['reference'] or line['transaction_id'],
+        'import_key': line['key'],
+    }
+
+
+def _post(payments):
+    result = database.post_payments(payments)
+    if result is None:
+        raise RuntimeError("Failed to post payments.")
+    posted, present, loan_ids = result
+    schedule_engine.refresh_next_payments(loan_ids)
+    return posted, present
+
+
+def _queue(items):
+    """
+    Adds review items and returns how many are new; lines already queued (or
+    resolved) on an earlier run are left alone.
+    """
+    if not items:
+        return 0
+    result = database.db[database.STATEMENT_REVIEW_COLLECTION].bulk_write(
+        [UpdateOne({'_id': item['_id']}, {'$setOnInsert': item}, upsert=True) for item in items], ordered=False)
+    return result.upserted_count
+
+
+def reconcile_statement(path, method=PAYMENT_METHODS[0], received_by="Statement Import",
+                        batch_size=BATCH_SIZE, progress=None):
+    """
+    Matches, posts and queues every line of a statement file. Returns
+    {'lines', 'posted', 'skipped', 'queued', 'seconds'}; skipped lines were
+    posted, queued or dismissed by an earlier run.
+    progress(lines done) is called after each batch.
+    """
+    started = time.perf_counter()
+    matcher = StatementMatcher.load()
+    totals = {'lines': 0, 'posted': 0, 'skipped': 0, 'queued': 0}
+    queued_at = datetime.datetime.now()
+
+    def flush(batch):
+        keys = [line['key'] for line in batch]
+        # Lines posted or resolved by an earlier run are not matched again
+        done = {p['import_key'] for p in database.db['payments'].find({'import_key': {'$in': keys}}, {'import_key': 1})}
+        done.update(r['_id'] for r in database.db[database.STATEMENT_REVIEW_COLLECTION].find(
+            {'_id': {'$in': keys}, 'status': {'$ne': REVIEW_OPEN}}, {'_id': 1}))
+
+        payments, review = [], []
+        for line in batch:
+            if line['key'] in done:
+                totals['skipped'] += 1
+                continue
+            loan, reason, candidates = (None, line['error'], []) if line['error'] else matcher.match(line)
+            if loan is not None:
+                payments.append(_payment(line, loan, method, received_by))
+                continue
+            review.append({
+                '_id': line['key'], 'status': REVIEW_OPEN, 'reason': reason, 'candidates': candidates,
+                'statement': path, 'line': line['line'], 'date': line['date'],
+                'amount': line['amount'] if not isinstance(line['amount'], str) else None,
+                'payer': line['payer'], 'name': line['name'], 'nin': line['nin'],
+                'reference': line['reference'], 'transaction_id': line['transaction_id'],
+                'payment_method': method, 'queued_at': queued_at,
+            })
+        if payments:
+            posted, present = _post(payments)
+            totals['posted'] += posted
+            totals['skipped'] += present
+        queued = _queue(review)
+        totals['queued'] += queued
+        totals['skipped'] += len(review) - queued
+        totals['lines'] += len(batch)
+        if progress:
+            progress(totals['lines'])
+
+    batch = []
+    for line in read_statement(path):
+        batch.append(line)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    totals['seconds'] = time.perf_counter() - started
+    return totals
+
+
+# --- REVIEW QUEUE ---
+
+def get_review_items(status=REVIEW_OPEN, limit=500):
+    return list(database.db[database.STATEMENT_REVIEW_COLLECTION]
+                .find({'status': status}).sort([('date', 1), ('line', 1)]).limit(limit))
+
+
+def resolve_review_item(key, loan_ref, user):
+    """
+    Posts a queued line to the loan given by number or _id and remembers the
+    payer, so the customer's next payments from that number match on their
+    own. Returns the loan document.
+    """
+    item = database.db[database.STATEMENT_REVIEW_COLLECTION].find_one({'_id': key, 'status': REVIEW_OPEN})
+    if item is None:
+        raise ValueError("This line has already been resolved.")
+    if not item.get('amount') or not item.get('date'):
+        raise ValueError("This line has no usable amount or date; dismiss it instead.")
+    loan_ref = str(loan_ref or '').strip()
+    query = {'_id': ObjectId(loan_ref)} if database.is_valid_object_id(loan_ref) else {'loan_id': loan_ref.upper()}
+    loan = database.db['loans'].find_one(dict(query, is_deleted=database.NOT_DELETED), LOAN_PROJECTION)
+    if loan is None:
+        raise ValueError(f"Loan '{loan_ref}' was not found.")
+
+    line = {'amount': item['amount'], 'date': item['date'], 'reference': item.get('reference', ''),
+            'transaction_id': item.get('transaction_id', ''), 'key': key}
+    _post([_payment(line, loan, item.get('payment_method', PAYMENT_METHODS[0]), user)])
+    database.db[database.STATEMENT_REVIEW_COLLECTION].update_one({'_id': key}, {'$set': {
+        'status': REVIEW_POSTED, 'loan_id': loan['_id'], 'resolved_by': user,
+        'resolved_at': datetime.datetime.now()}})
+    payer = payer_key(item.get('payer'))
+    if payer and loan.get('nin_number'):
+        database.db[database.PAYER_COLLECTION].update_one(
+            {'_id': payer}, {'$set': {'nin_number': loan['nin_number'], 'learned_at': datetime.datetime.now()}},
+            upsert=True)
+    return loan
+
+
+def dismiss_review_item(key, user):
+    """Marks a queued line as not a loan payment; later imports of the statement skip it."""
+    database.db[database.STATEMENT_REVIEW_COLLECTION].update_one(
+        {'_id': key, 'status': REVIEW_OPEN},
+        {'$set': {'status': REVIEW_DISMISSED, 'resolved_by': user, 'resolved_at': datetime.datetime.now()}})
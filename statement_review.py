@@ -0,0 +1,239 @@
+from tkinter import *
+from tkinter import ttk, messagebox, filedialog, simpledialog
+import database
+import statement_reconciler
+
+# THEME COLORS
+PRIMARY_GREEN = "#2ecc71"
+PRIMARY_BLUE = "#2980b9"
+BG_LIGHT = "#f4f7f6"
+DARK_TEXT = "#2c3e50"
+WHITE = "#ffffff"
+DANGER_RED = "#c0392b"    # Matches dashboard logout red
+HOVER_RED = "#e74c3c"
+
+
+class StatementReviewFrame(Frame):
+    """Imports Mobile Money / bank statements and lets tellers resolve the lines that did not match a loan."""
+
+    def __init__(self, parent, controller):
+        super().__init__(parent, bg=BG_LIGHT)
+        self.controller = controller
+
+        controller.title(f"Statement Reconciliation - Logged in as: {controller.current_user_name}")
+        controller.geometry("1250x800")
+
+        # HEADER
+        header = Frame(self, bg=PRIMARY_GREEN, height=100)
+        header.pack(fill="x", side="top")
+        header.pack_propagate(False)
+
+        Label(header, text="STATEMENT RECONCILIATION", font=("Segoe UI", 24, "bold"),
+              fg=WHITE, bg=PRIMARY_GREEN).pack(pady=(25, 0))
+
+        # FOOTER SECTION (packed before the content so it keeps its space at the bottom)
+        footer = Frame(self, bg=BG_LIGHT)
+        footer.pack(side="bottom", fill="x", pady=(20, 40))
+
+        # MAIN CONTENT
+        main_frame = Frame(self, bg=BG_LIGHT, padx=40, pady=20)
+        main_frame.pack(fill="both", expand=True)
+
+        actions_bar = Frame(main_frame, bg=BG_LIGHT)
+        actions_bar.pack(fill="x", pady=(0, 10))
+
+        self.method_var = StringVar(value=statement_reconciler.PAYMENT_METHODS[0])
+        ttk.Combobox(actions_bar, textvariable=self.method_var, values=statement_reconciler.PAYMENT_METHODS,
+                     width=14, state="readonly").pack(side="left", padx=5)
+
+        self.import_btn = Button(actions_bar, text="📥 Import Statement", bg=PRIMARY_GREEN, fg=WHITE,
+                                 font=("Segoe UI", 10, "bold"), bd=0, padx=20, pady=8,
+                                 cursor="hand2", command=self.import_statement)
+        self.import_btn.pack(side="left", padx=5)
+
+        Button(actions_bar, text="↻ Refresh List", bg=DARK_TEXT, fg=WHITE,
+               font=("Segoe UI", 10, "bold"), bd=0, padx=20, pady=8,
+               cursor="hand2", command=self.refresh_table).pack(side="left", padx=5)
+
+        Button(actions_bar, text="✖ Dismiss Line", bg=DANGER_RED, fg=WHITE,
+               font=("Segoe UI", 10, "bold"), bd=0, padx=20, pady=8,
+               cursor="hand2", command=self.dismiss_line).pack(side="right", padx=5)
+
+        Button(actions_bar, text="✔ Post to Loan", bg=PRIMARY_BLUE, fg=WHITE,
+               font=("Segoe UI", 10, "bold"), bd=0, padx=20, pady=8,
+               cursor="hand2", command=self.post_line).pack(side="right", padx=5)
+
+        status_bar = Frame(main_frame, bg=BG_LIGHT)
+        status_bar.pack(fill="x", pady=(0, 10))
+        self.status_lbl = Label(status_bar, text="", font=("Segoe UI", 10), fg=DARK_TEXT, bg=BG_LIGHT, anchor="w")
+        self.status_lbl.pack(side="left")
+        self.count_lbl = Label(status_bar, text="", font=("Segoe UI", 10, "bold"), fg=DARK_TEXT, bg=BG_LIGHT)
+        self.count_lbl.pack(side="right")
+
+        # TREEVIEW TABLE
+        tree_frame = Frame(main_frame, bg=WHITE)
+        tree_frame.pack(fill="both", expand=True)
+
+        tree_scroll = Scrollbar(tree_frame)
+        tree_scroll.pack(side=RIGHT, fill=Y)
+
+        columns = ("Date", "Amount", "Payer", "Name", "Reference", "Reason", "Candidates")
+        self.review_tree = ttk.Treeview(tree_frame, columns=columns, show="headings", yscrollcommand=tree_scroll.set)
+        tree_scroll.config(command=self.review_tree.yview)
+
+        widths = {"Date": 90, "Amount": 100, "Payer": 120, "Name": 150, "Reference": 220, "Reason": 260, "Candidates": 180}
+        for col in columns:
+            self.review_tree.heading(col, text=col)
+            self.review_tree.column(col, width=widths[col], anchor="center" if col in ("Date", "Amount") else "w")
+
+        self.review_tree.pack(fill="both", expand=True)
+
+        btn_container = Frame(footer, bg=BG_LIGHT)
+        btn_container.pack()
+
+        back_btn = Button(
+            btn_container,
+            text="🔙 BACK TO DASHBOARD",
+            font=("Segoe UI", 13, "bold"),
+            bg=PRIMARY_BLUE,
+            fg=WHITE,
+            activebackground="#3498db",
+            activeforeground=WHITE,
+            width=25,
+            height=2,
+            bd=0,
+            cursor="hand2",
+            command=self.back_to_dashboard
+        )
+        back_btn.pack(side="left", padx=20)
+
+        self.logout_btn = Button(
+            btn_container,
+            text="🛑 LOGOUT SYSTEM",
+            font=("Segoe UI", 13, "bold"),
+            bg=DANGER_RED,
+            fg=WHITE,
+            activebackground=HOVER_RED,
+            activeforeground=WHITE,
+            width=25,
+            height=2,
+            bd=0,
+            cursor="hand2",
+            command=self.handle_logout
+        )
+        self.logout_btn.pack(side="left", padx=20)
+
+        self.logout_btn.bind("<Enter>", lambda e: self.logout_btn.config(background=HOVER_RED))
+        self.logout_btn.bind("<Leave>", lambda e: self.logout_btn.config(background=DANGER_RED))
+
+        if database.db is not None:
+            self.refresh_table()
+        else:
+            messagebox.showerror("Database Error", "Not connected to database.")
+
+    # --- NAVIGATION FUNCTIONS
+    def back_to_dashboard(self):
+        self.controller.show_frame("Dashboard")
+
+    def handle_logout(self):
+        confirm = messagebox.askyesno("Confirm Logout", "Are you sure you want to sign out?")
+        if confirm:
+            self.controller.logout("User signed out from Statement Reconciliation")
+
+    # --- STATEMENT IMPORT
+    def import_statement(self):
+        path = filedialog.askopenfilename(title="Select Statement",
+                                          filetypes=[("Statements", "*.csv *.xlsx"), ("All Files", "*.*")])
+        if not path:
+            return
+        method = self.method_var.get()
+        self.import_btn.config(state=DISABLED)
+        self.status_lbl.config(text="Matching statement lines...")
+        self.controller.tasks.submit(
+            statement_reconciler.reconcile_statement, path, method, self.controller.current_user_name,
+            on_progress=lambda done: self.status_lbl.config(text=f"Matched {done:,} lines..."),
+            on_done=lambda totals: self._on_imported(path, method, totals),
+            on_error=self._on_import_failed, owner=self)
+
+    def _on_imported(self, path, method, totals):
+        self.import_btn.config(state=NORMAL)
+        summary = (f"{totals['lines']:,} lines: {totals['posted']:,} posted, {totals['queued']:,} queued for review, "
+                   f"{totals['skipped']:,} already handled ({totals['seconds']:.1f}s)")
+        self.status_lbl.config(text=summary)
+        database.log_activity(self.controller.current_user_name, "Statement Import", f"{method} statement {path}: {summary}")
+        self.refresh_table()
+
+    def _on_import_failed(self, e):
+        self.import_btn.config(state=NORMAL)
+        self.status_lbl.config(text="")
+        messagebox.showerror("Import Error", f"Failed to import statement: {e}")
+
+    # --- REVIEW QUEUE
+    def refresh_table(self):
+        self.controller.tasks.submit(statement_reconciler.get_review_items, on_done=self._show_items, owner=self)
+
+    def _show_items(self, items):
+        for item in self.review_tree.get_children():
+            self.review_tree.delete(item)
+
+        for item in items:
+            amount = item.get('amount')
+            self.review_tree.insert("", "end", iid=item['_id'], values=(
+                database.format_date(item.get('date')),
+                f"{amount:,.2f}" if amount else "N/A",
+                item.get('payer', ''),
+                item.get('name', ''),
+                item.get('reference', ''),
+                item.get('reason', ''),
+                ", ".join(str(c) for c in item.get('candidates') or [])
+            ))
+        self.count_lbl.config(text=f"Lines awaiting review: {len(items)}")
+
+    def _selected_key(self):
+        selected = self.review_tree.selection()
+        if not selected:
+            messagebox.showwarning("Selection Required", "Please select a statement line.")
+            return None
+        return selected[0]
+
+    def post_line(self):
+        key = self._selected_key()
+        if key is None:
+            return
+        candidates = self.review_tree.item(key)['values'][6]
+        loan_ref = simpledialog.askstring("Post to Loan", "Loan number (LOAN-YYYY-XXXX) to post this payment to:",
+                                          initialvalue=str(candidates).split(",")[0].strip(), parent=self)
+        if not loan_ref:
+            return
+        user = self.controller.current_user_name
+
+        def posted(loan):
+            database.log_activity(user, "Statement Line Posted",
+                                  f"Posted statement line {key} to {loan.get('loan_id')} ({loan.get('customer_name')})")
+            self.refresh_table()
+
+        self.controller.tasks.submit(statement_reconciler.resolve_review_item, key, loan_ref, user,
+                                     on_done=posted, owner=self,
+                                     on_error=lambda e: messagebox.showerror("Post Error", str(e)))
+
+    def dismiss_line(self):
+        key = self._selected_key()
+        if key is None or not messagebox.askyesno("Dismiss Line", "Mark this line as not a loan repayment?"):
+            return
+        user = self.controller.current_user_name
+
+        def dismissed(_):
+            database.log_activity(user, "Statement Line Dismissed", f"Dismissed statement line {key}")
+            self.refresh_table()
+
+        self.controller.tasks.submit(statement_reconciler.dismiss_review_item, key, user,
+                                     on_done=dismissed, owner=self,
+                                     on_error=lambda e: messagebox.showerror("Error", f"Failed to dismiss line: {e}"))
+
+
+if __name__ == "__main__":
+    import sys
+    import main
+    role = sys.argv[1] if len(sys.argv) > 1 else "Staff"
+    user = sys.argv[2] if len(sys.argv) > 2 else "Guest"
+    main.run("StatementReview", role=role, user=user)
@@ -0,0 +1,188 @@
+"""
+Background task runner shared by every screen.
+
+Database queries, password checks and exports run on a small thread pool so
+the Tk main loop keeps painting while I/O is in flight. Worker threads never
+touch widgets: results, errors and progress updates are queued and handed to
+callbacks on the Tk thread by a root.after() poll loop.
+
+    self.controller.tasks.submit(database.get_loan_file, loan_id,
+                                 on_done=self.show_file, owner=self)
+"""
+import queue
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import messagebox, TclError
+
+# Worker threads; MongoDB and bcrypt release the GIL so a few are enough
+MAX_WORKERS = 4
+# How often the Tk thread drains finished results
+POLL_MS = 30
+
+
+class TaskHandle:
+    """A submitted task. cancel() drops its callbacks and signals cancel_event."""
+
+    def __init__(self, owner=None, busy=True):
+        self.owner = owner
+        self.busy = busy
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.done = False
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+        if self.future is not None:
+            self.future.cancel()
+
+
+class TaskRunner:
+    """Thread pool plus a Tk-thread dispatcher for task callbacks."""
+
+    def __init__(self, root, max_workers=MAX_WORKERS, poll_ms=POLL_MS):
+        self.root = root
+        self.poll_ms = poll_ms
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="task")
+        self._results = queue.Queue()
+        self._pending = set()
+        self._busy_count = 0
+        self._closed = False
+        self._poll_job = None
+
+    def submit(self, fn, *args, on_done=None, on_error=None, on_progress=None,
+               owner=None, busy=True, pass_cancel=False, **kwargs):
+        """
+        Runs fn(*args, **kwargs) on a worker thread and returns a TaskHandle.
+
+        on_done(result), on_error(exc) and on_progress(*values) are called on
+        the Tk thread. Without on_error the error is shown in a message box.
+        When on_progress is given fn receives a progress(*values) callable,
+        and with pass_cancel=True it receives the handle's cancel_event so
+        long jobs can stop early. Callbacks are skipped once the task is
+        cancelled or its owner widget has been destroyed. busy=True shows
+        the busy cursor on the main window until the task finishes.
+        """
+        handle = TaskHandle(owner, busy)
+        if self._closed:
+            handle.cancel()
+            return handle
+
+        callbacks = (on_done, on_error, on_progress)
+        if on_progress is not None:
+            kwargs['progress'] = lambda *values: self._results.put((handle, callbacks, 'progress', values))
+        if pass_cancel:
+            kwargs['cancel_event'] = handle.cancel_event
+
+        def work():
+            if handle.cancelled:
+                self._results.put((handle, callbacks, 'cancelled', None))
+                return
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                self._results.put((handle, callbacks, 'error', e))
+            else:
+                self._results.put((handle, callbacks, 'done', result))
+
+        def settled(future):
+            # A task cancelled before it started never runs work(); account for it here
+            if future.cancelled():
+                self._results.put((handle, callbacks, 'cancelled', None))
+
+        self._pending.add(handle)
+        if busy:
+            self._set_busy(+1)
+        handle.future = self._executor.submit(work)
+        handle.future.add_done_callback(settled)
+        self._schedule_poll()
+        return handle
+
+    def cancel_owner(self, owner):
+        """Cancels every pending task submitted for owner (e.g. a screen being closed)."""
+        for handle in list(self._pending):
+            if handle.owner is owner:
+                handle.cancel()
+
+    def shutdown(self):
+        self._closed = True
+        for handle in list(self._pending):
+            handle.cancel()
+        self._executor.shutdown(wait=False)
+
+    # --- Tk-thread side ---
+
+    def _schedule_poll(self):
+        if self._poll_job is None and not self._closed:
+            self._poll_job = self.root.after(self.poll_ms, self._poll)
+
+    def _poll(self):
+        self._poll_job = None
+        try:
+            while True:
+                handle, callbacks, kind, value = self._results.get_nowait()
+                self._dispatch(handle, callbacks, kind, value)
+        except queue.Empty:
+            pass
+        if self._pending:
+            self._schedule_poll()
+
+    def _dispatch(self, handle, callbacks, kind, value):
+        on_done, on_error, on_progress = callbacks
+        if kind == 'progress':
+            if on_progress and self._wanted(handle):
+                self._call(on_progress, *value)
+            return
+
+        if handle.done:
+            return
+        handle.done = True
+        self._pending.discard(handle)
+        if handle.busy:
+            self._set_busy(-1)
+
+        if not self._wanted(handle) or kind == 'cancelled':
+            return
+        if kind == 'done':
+            if on_done:
+                self._call(on_done, value)
+        elif on_error:
+            self._call(on_error, value)
+        else:
+            self.report_error(value)
+
+    def _wanted(self, handle):
+        if handle.cancelled:
+            return False
+        owner = handle.owner
+        if owner is not None:
+            try:
+                return bool(owner.winfo_exists())
+            except TclError:
+                return False
+        return True
+
+    def _call(self, callback, *values):
+        try:
+            callback(*values)
+        except Exception as e:
+            self.report_error(e)
+
+    def report_error(self, exc):
+        """Default error route: log the traceback and tell the user."""
+        traceback.print_exception(type(exc), exc, exc.__traceback__)
+        try:
+            messagebox.showerror("Error", f"The operation failed: {exc}", parent=self.root)
+        except TclError:
+            pass
+
+    def _set_busy(self, delta):
+        self._busy_count += delta
+        try:
+            self.root.config(cursor="watch" if self._busy_count > 0 else "")
+        except TclError:
+            pass
@@ -0,0 +1,95 @@
+"""
+On-disk thumbnail cache for collateral photo previews.
+
+Thumbnails are keyed by a hash of the photo's contents plus its size and
+modification time, so a photo that is edited or replaced under the same name
+gets a new thumbnail. JPEGs are decoded with Image.draft(), which lets the
+decoder downscale by up to 8x while reading instead of decoding the full
+camera resolution first. The cache directory is trimmed back to
+THUMBNAIL_CACHE_MAX_BYTES by evicting the least recently used files.
+
+load_thumbnail() does file I/O and decoding, so callers run it on the task
+runner and turn the returned image into a PhotoImage on the Tk thread.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+
+from PIL import Image, ImageOps
+
+THUMBNAIL_CACHE_DIR = "thumbnail_cache"
+THUMBNAIL_CACHE_MAX_BYTES = 50 * 1024 * 1024
+THUMBNAIL_SIZE = (200, 180)
+# Bump when the way thumbnails are produced changes, to ignore old cache files
+CACHE_FORMAT = 1
+
+_evict_lock = threading.Lock()
+
+
+def cache_key(path, size=THUMBNAIL_SIZE):
+    """Hash of the file contents, its size and mtime, and the thumbnail size."""
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{CACHE_FORMAT}:{size[0]}x{size[1]}:{stat.st_size}:{stat.st_mtime_ns}:".encode())
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _decode(path, size):
+    img = Image.open(path)
+    # JPEG only: picks a DCT scale so at most ~2x the target is ever decoded
+    img.draft('RGB', (size[0] * 2, size[1] * 2))
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail(size)
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+    return img
+
+
+def load_thumbnail(path, size=THUMBNAIL_SIZE, cache_dir=THUMBNAIL_CACHE_DIR):
+    """Returns a PIL image of `path` scaled to fit `size`, from the cache when possible."""
+    cached = os.path.join(cache_dir, cache_key(path, size) + ".png")
+    try:
+        img = Image.open(cached)
+        img.load()
+        os.utime(cached)  # recently used; eviction goes by modification time
+        return img
+    except (OSError, ValueError):
+        pass
+
+    img = _decode(path, size)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write under a temporary name so a concurrent reader never sees half a file
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=cache_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            img.save(f, format='PNG')
+        os.replace(tmp, cached)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return img  # caching is best effort
+    evict(cache_dir)
+    return img
+
+
+def evict(cache_dir=THUMBNAIL_CACHE_DIR, max_bytes=THUMBNAIL_CACHE_MAX_BYTES):
+    """Removes the least recently used cache files until the cache fits in max_bytes."""
+    with _evict_lock:
+        try:
+            entries = [e for e in os.scandir(cache_dir) if e.is_file() and not e.name.endswith(".tmp")]
+        except OSError:
+            return
+        stats = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in entries]
+        total = sum(size for _, size, _ in stats)
+        for _, size, entry_path in sorted(stats):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(entry_path)
+                total -= size
+            except OSError:
+                pass
@@ -1,59 +1,43 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sys
-import subprocess
 from datetime import datetime
-from bson.objectid import ObjectId
-import os
 
 #  Import Database Functions 
 # Added log_activity to tracking changes
-from database import get_loan_by_id, get_payments_by_loan, get_total_paid_for_loan, db, log_activity
-
-# SESSION PERSISTENCE
-try:
-    LOAN_ID_ARG = sys.argv[1]
-    CURRENT_USER_ROLE = sys.argv[2]
-    CURRENT_USER_NAME = sys.argv[3]
-except IndexError:
-    # Fallback for manual testing
-    LOAN_ID_ARG = None
-    CURRENT_USER_ROLE = "Staff"
-    CURRENT_USER_NAME = "Guest"
-
-class ViewLoanDetailsPage:
-    def __init__(self, master, loan_id):
-        self.master = master
+from database import get_loan_file, update_loan_details, log_activity, parse_date, format_date
+import schedule_engine
+
+class ViewLoanDetailsPage(ttk.Frame):
+    def __init__(self, parent, controller, loan_id=None):
+        super().__init__(parent)
+        self.controller = controller
         self.loan_id = loan_id
         
         # New State Variables
         self.is_edit_mode = False
         self.edit_entries = {} 
 
-        self.master.title(f"Loan Details - {loan_id}")
-        self.master.geometry("1000x700")
-        self.master.configure(bg="#f7f9fa")
+        controller.title(f"Loan Details - {loan_id}")
+        controller.geometry("1000x700")
 
-        #  ICON UPDATE (Replacing the leaf) 
-        try:
-            icon_path = "bu logo.png"
-            if os.path.exists(icon_path):
-                img = tk.PhotoImage(file=icon_path)
-                self.master.iconphoto(False, img)
-        except Exception as e:
-            print(f"Icon could not be loaded: {e}")
-
-        self.frame = ttk.Frame(self.master, padding="20 20 20 5")
+        self.frame = ttk.Frame(self, padding="20 20 20 5")
         self.frame.pack(fill='both', expand=True)
 
-        # 1. Fetch Data
-        self.loan_data = self._fetch_loan_details(self.loan_id)
+        # 1. Fetch Data (loan, payments and totals in one round trip, off the Tk thread)
+        self.loan_data = None
+        self.loading_label = ttk.Label(self.frame, text="Loading loan file...", font=('Arial', 12))
+        self.loading_label.pack(pady=50)
+        controller.tasks.submit(get_loan_file, self.loan_id, on_done=self._build,
+                                on_error=self._on_fetch_failed, owner=self)
+
+    def _build(self, loan_file):
+        """Builds the page once the loan file has arrived."""
+        self.loading_label.destroy()
+        self._apply_loan_file(loan_file)
         
         if not self.loan_data:
             self._show_not_found()
             return
-            
-        self._refresh_calculations()
 
         # 2. Build UI
         self._create_styles()
@@ -61,12 +45,21 @@ class ViewLoanDetailsPage:
         self._create_summary_panel()
         self._create_notebook()
 
-    def _refresh_calculations(self):
-        """Calculates current financial standing based on database data."""
-        self.payment_history = self._fetch_payment_history(self.loan_id)
+    def _on_fetch_failed(self, e):
+        self.loading_label.destroy()
+        messagebox.showerror("Database Error", f"Could not load the loan file: {e}")
+        self._show_not_found()
+
+    def _apply_loan_file(self, loan_file):
+        """Takes the loan, payments and current financial standing from a fetched loan file."""
+        if not loan_file:
+            return
+        self.loan_data = loan_file['loan']
+        self.payment_history = loan_file['payments']
+        self.payment_count = loan_file['payment_count']
         self.loan_amount = float(self.loan_data.get('loan_amount', 0.00))
-        self.total_paid = get_total_paid_for_loan(self.loan_id)
-        self.remaining_balance = self.loan_amount - self.total_paid
+        self.total_paid = loan_file['total_paid']
+        self.remaining_balance = loan_file['remaining_balance']
 
     def _create_styles(self):
         style = ttk.Style()
@@ -81,15 +74,6 @@ class ViewLoanDetailsPage:
         style.configure('Action.TButton', font=('Arial', 11, 'bold'), background='#f39c12', foreground='white')
         style.map('Action.TButton', background=[('active', '#e67e22')])
 
-    def _fetch_loan_details(self, loan_id):
-        try:
-            return get_loan_by_id(loan_id)
-        except:
-            return None
-
-    def _fetch_payment_history(self, loan_id):
-        return get_payments_by_loan(loan_id)
-
     def _create_header_and_back_button(self):
         header_frame = ttk.Frame(self.frame)
         header_frame.pack(fill='x', pady=(0, 15))
@@ -123,31 +107,76 @@ class ViewLoanDetailsPage:
         try:
             customer_name = self.loan_data.get('customer_name', 'Unknown')
             updated_data = {
-                "loan_type": self.edit_entries['loan_type'].get(),
+                "loan_type": self.edit_entries['loan_type'].get().strip(),
                 "loan_amount": float(self.edit_entries['loan_amount'].get()),
-                "duration": self.edit_entries['duration'].get(),
+                "duration": self.edit_entries['duration'].get().strip(),
                 "interest_rate": float(self.edit_entries['interest_rate'].get()),
                 "next_payment": self.edit_entries['next_payment'].get()
             }
+            # Due dates are stored as dates; reject anything that is not YYYY-MM-DD
+            next_payment_str = updated_data.pop("next_payment").strip()
+            if next_payment_str not in ("", "N/A"):
+                next_payment = parse_date(next_payment_str)
+                if next_payment is None:
+                    messagebox.showerror("Error", "Next Payment Date must be in YYYY-MM-DD format.")
+                    return
+                updated_data["next_payment"] = next_payment
 
-            db.loans.update_one({"_id": ObjectId(self.loan_id)}, {"$set": updated_data})
-            
-            # LOG THE ACTIVITY
-            log_activity(
-                CURRENT_USER_NAME, 
-                "Update Loan", 
-                f"Updated details for {customer_name}'s loan (ID: {self.loan_id})"
-            )
-            
-            self.loan_data.update(updated_data)
-            self._refresh_calculations()
-            self._create_summary_panel() 
-            
-            messagebox.showinfo("Success", "Loan details updated successfully.")
         except ValueError:
             messagebox.showerror("Error", "Please enter valid numbers for Amount and Interest.")
-        except Exception as e:
-            messagebox.showerror("System Error", f"Could not update: {e}")
+            return
+
+        self.controller.tasks.submit(self._store_updates, updated_data,
+                                     on_done=lambda loan_file: self._on_updates_saved(loan_file, customer_name),
+                                     on_error=lambda e: messagebox.showerror("System Error", f"Could not update: {e}"),
+                                     owner=self)
+
+    def _store_updates(self, updated_data):
+        """Writes the edits and returns the refreshed loan file. Runs on a worker thread."""
+        if not update_loan_details(self.loan_id, updated_data):
+            raise RuntimeError("The loan could not be updated.")
+        # New terms mean a new installment schedule (approved loans only), and
+        # next_payment moves to the first unpaid installment of that schedule
+        if self._terms_changed(updated_data):
+            scheduled = schedule_engine.recompute_schedules([self.loan_id])
+            schedule_engine.refresh_next_payments(list(scheduled))
+        loan_file = get_loan_file(self.loan_id)
+        if loan_file is None:
+            raise RuntimeError("The loan was updated but could not be reloaded.")
+        return loan_file
+
+    def _terms_changed(self, updated_data):
+        """True when an edit changes a term the schedule is computed from, comparing values as stored."""
+        for field in schedule_engine.TERM_FIELDS:
+            if field not in updated_data:
+                continue
+            old, new = self.loan_data.get(field), updated_data[field]
+            if field == 'interest_rate' and old is None:
+                old = schedule_engine.DEFAULT_ANNUAL_RATE
+            if isinstance(new, float):
+                try:
+                    if abs(float(old) - new) < 0.005:
+                        continue
+                except (TypeError, ValueError):
+                    pass
+                return True
+            if str(old or '').strip() != str(new or '').strip():
+                return True
+        return False
+
+    def _on_updates_saved(self, loan_file, customer_name):
+        # LOG THE ACTIVITY
+        log_activity(
+            self.controller.current_user_name, 
+            "Update Loan", 
+            f"Updated details for {customer_name}'s loan (ID: {self.loan_id})"
+        )
+        
+        self._apply_loan_file(loan_file)
+        self._create_summary_panel() 
+        self._populate_loan_info_tab(self.loan_info_tab)
+        
+        messagebox.showinfo("Success", "Loan details updated successfully.")
 
     def _create_summary_panel(self):
         if hasattr(self, 'summary_container'):
@@ -200,6 +229,8 @@ class ViewLoanDetailsPage:
             ttk.Label(parent_frame, text=f"{label_text}:", style='InfoKey.TLabel').grid(row=i, column=0, sticky='w', padx=10, pady=8)
             
             value = self.loan_data.get(db_key, "N/A")
+            if db_key == "next_payment":
+                value = format_date(value)
             
             if self.is_edit_mode and can_edit:
                 ent = ttk.Entry(parent_frame, font=('Arial', 11), width=40)
@@ -224,6 +255,9 @@ class ViewLoanDetailsPage:
                     f"{payment.get('payment_amount', 0):,.2f}",
                     rec_str
                 ))
+        if self.payment_count > len(self.payment_history):
+            ttk.Label(parent_frame, text=f"Showing the latest {len(self.payment_history)} of {self.payment_count} payments.",
+                      font=('Arial', 9, 'italic')).pack(side=tk.BOTTOM, anchor='w', pady=(5, 0))
         self.payment_tree.pack(fill='both', expand=True)
 
     def _show_not_found(self):
@@ -231,20 +265,13 @@ class ViewLoanDetailsPage:
         ttk.Button(self.frame, text="Back", command=self.back_to_management).pack()
 
     def back_to_management(self):
-        try:
-            # Restart the management script
-            subprocess.Popen([sys.executable, "loan_management.py", CURRENT_USER_ROLE, CURRENT_USER_NAME])
-            self.master.destroy()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to return: {e}")
+        self.controller.show_frame("LoanManagement")
 
 if __name__ == "__main__":
-    if not LOAN_ID_ARG:
-        root = tk.Tk()
-        messagebox.showerror("Error", "No Loan ID provided.")
-        root.destroy()
-        sys.exit()
-
-    root = tk.Tk()
-    app = ViewLoanDetailsPage(root, LOAN_ID_ARG)
-    root.mainloop()
\ No newline at end of file
+    import sys
+    import main
+    if len(sys.argv) > 3:
+        main.run("LoanDetails", role=sys.argv[2], user=sys.argv[3], loan_id=sys.argv[1])
+    else:
+        # Fallback for manual testing: no loan selected, start from management
+        main.run("LoanManagement")